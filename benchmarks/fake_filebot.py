@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Benchmarks
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Local stand-in for the Filebot CLI.
+
+Sleeps for FAKE_FILEBOT_STARTUP seconds (default 1.0) once per process to
+stand in for JVM and Filebot start-up, then answers -rename commands with
+Filebot-style output. When run with -script, it reads JSON commands from
+stdin like mediahandler/extras/filebot-server.groovy.
+"""
+
+import os
+import sys
+import json
+import time
+
+
+def rename(args):
+    """Prints Filebot-style output for a -rename command.
+    """
+    src = args[args.index('-rename') + 1]
+    dst = args[args.index('--format') + 1]
+    episode = os.path.splitext(src)[0][-2:]
+    dst = dst.replace('{n}', 'Show').replace('{s}', '1')
+    print('Rename episodes using [TheTVDB]')
+    print('[COPY] From [{0}] to [{1}.mkv]'.format(
+        src, dst.replace('{e}', episode)))
+    print('Processed 1 files')
+
+
+def main():
+    """Runs a single command, or serves commands from stdin.
+    """
+    time.sleep(float(os.environ.get('FAKE_FILEBOT_STARTUP', '1.0')))
+
+    if '-script' not in sys.argv:
+        rename(sys.argv[1:])
+        return
+
+    for line in sys.stdin:
+        rename(json.loads(line))
+        print('@@MH-FILEBOT-DONE@@')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Benchmarks
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Compares per-episode latency of MHTv with and without the warm
+Filebot server, using benchmarks/fake_filebot.py as a local stand-in.
+
+Usage: python benchmarks/filebot_server.py [episodes] [startup seconds]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import mediahandler.types.tv as TV
+import mediahandler.util.notify as Notify
+import mediahandler.util.filebot as Filebot
+
+FAKE_FILEBOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fake_filebot.py')
+
+
+def run(episodes, server, folder):
+    """Adds each episode with a new MHTv object and returns the latency
+    of each add() call.
+    """
+    push = Notify.MHPush({'enabled': False, 'notify_name': ''}, True)
+    settings = {
+        'folder': folder,
+        'filebot': FAKE_FILEBOT,
+        'filebot_server': server,
+        'format': '{n}/Season {s}/{n}.S01E{e}',
+        'ignore_subs': False,
+        'log_file': None,
+    }
+
+    timings = []
+    for episode in episodes:
+        start = time.perf_counter()
+        (added, _) = TV.MHTv(settings, push).add(episode)
+        timings.append(time.perf_counter() - start)
+        assert len(added) == 1, added
+
+    return timings
+
+
+def main():
+    """Runs the benchmark in both modes and prints a summary.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    if len(sys.argv) > 2:
+        os.environ['FAKE_FILEBOT_STARTUP'] = sys.argv[2]
+
+    folder = tempfile.mkdtemp()
+    try:
+        episodes = []
+        for i in range(count):
+            episode = os.path.join(folder, 'show.s01e{0:02d}.mkv'.format(i))
+            open(episode, 'w').close()
+            episodes.append(episode)
+
+        for (label, server) in (('one-shot', False), ('server', True)):
+            timings = run(episodes, server, folder)
+            print('{0:>9}: {1} episodes, first {2:.3f}s, '
+                  'mean {3:.3f}s, total {4:.3f}s'.format(
+                      label, count, timings[0],
+                      sum(timings) / count, sum(timings)))
+    finally:
+        Filebot.stop_servers()
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Benchmarks
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Reports the import time of the addmedia CLI entry points with
+python -X importtime and checks it against a budget.
+
+Exits with status 1 if an entry point goes over its budget, or if it
+imports a heavy dependency which should be deferred.
+
+Usage: python benchmarks/import_time.py [budget ms] [runs]
+"""
+
+import sys
+import subprocess
+
+# Entry point modules to check
+ENTRY_POINTS = [
+    'mediahandler.handler',
+    'mediahandler.util.args',
+    'mediahandler.types.tv',
+    'mediahandler.types.movies',
+]
+
+# Modules which must only be imported by the code paths that use them
+DEFERRED = [
+    'requests',
+    'yaml',
+    'googleapiclient',
+    'mutagen',
+    'twisted',
+    'deluge',
+]
+
+
+def import_time(module):
+    """Imports a module in a fresh interpreter and returns its cumulative
+    import time in milliseconds and a dict of every module imported along
+    with it, by cumulative time.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.PIPE, check=True).stderr.decode('utf-8')
+
+    # Lines look like: "import time:  self [us] | cumulative | name"
+    imported = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        (_, cumulative, name) = line[len('import time:'):].split('|')
+
+        # Skip modules imported during interpreter start-up
+        if name.strip() == 'site' and not name.startswith('  '):
+            imported = {}
+            continue
+
+        imported[name.strip()] = int(cumulative) / 1000.0
+
+    return imported[module], imported
+
+
+def main():
+    """Checks each entry point and prints a report.
+    """
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    failed = False
+    for module in ENTRY_POINTS:
+
+        # Use the best of several runs to reduce noise
+        results = [import_time(module) for _ in range(runs)]
+        (best, imported) = min(results, key=lambda result: result[0])
+
+        # Look for deferred dependencies
+        heavy = sorted(set(
+            name.split('.')[0] for name in imported
+            if name.split('.')[0] in DEFERRED))
+
+        status = 'ok'
+        if best > budget or heavy:
+            status = 'FAIL'
+            failed = True
+
+        print('{0:<28} {1:8.1f} ms  (budget {2:.0f} ms)  {3}'.format(
+            module, best, budget, status))
+        if heavy:
+            print('    imports deferred modules: {0}'.format(
+                ', '.join(heavy)))
+
+        # Show the slowest imports
+        slowest = sorted(
+            (name for name in imported if name != module),
+            key=lambda name: imported[name], reverse=True)[:5]
+        for name in slowest:
+            print('    {0:<40} {1:8.1f} ms'.format(name, imported[name]))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Benchmarks
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Compares the time taken to clean a corpus of audiobook release names
+with the original per-call title cleaning, MHTitleCleaner.clean() and
+MHTitleCleaner.clean_many().
+
+Exits with status 1 if the cleaners disagree on any name.
+
+Usage: python benchmarks/title_cleaner.py [copies] [runs]
+"""
+
+import os
+import re
+import sys
+import time
+
+import mediahandler as mh
+import mediahandler.types.audiobooks as Books
+
+# Realistic audiobook release names
+CORPUS = [
+    'Yes Please iTunes Audiobook Unabridged',
+    'The Lovely Bones [A Novel] (Mp3) {TKP}',
+    'Jar City - A Novel - 2000',
+    'The   Goldfinch  ',
+    'Black Skies CPK MP3 ENG YIFY',
+    'Stephen King - 11.22.63 (Unabridged) [64kbps]',
+    'Harry.Potter.and.the.Philosophers.Stone.Audiobook.MP3',
+    'Gone Girl - Gillian Flynn (2012) [Audible] 128kbps M4B',
+    'Brandon Sanderson - The Way of Kings (Stormlight 1) - Kate Reading',
+    'Neil_Gaiman-American_Gods-10th_Anniversary-Unabridged-AUDIOBOOK',
+    'Outrage.An.Inspector.Erlendur.Novel.2011.MP3.64KBPS.VBR.[FLAWL3SS]',
+    'Voices (Arnaldur Indridason) Chapterized',
+    'The Hobbit ~ J.R.R. Tolkien ~ Rob Inglis (Abridged) [epub+mp3]',
+    'Dune - Frank Herbert (Audiobook) {2007} [MP3 VBR] - GRiMM',
+    'Ready Player One by Ernest Cline read by Wil Wheaton ((iTunes))',
+    'Sapiens_A_Brief_History_of_Humankind_Yuval_Noah_Harari_OGG',
+    'Project Hail Mary - Andy Weir [Audible AAX to MP3] (2021)',
+    'THE NAME OF THE WIND Patrick Rothfuss Unabridged TEAM',
+    '1984 George Orwell Audiobook ebook pdf mobi txt rtf',
+    'The Martian - Andy Weir - R.C. Bray - 2014 - 64kbps mono',
+]
+
+
+def clean_original(string, blacklist_file):
+    """The original title cleaning, which reads the blacklist and
+    compiles its regex on every call, and repeats each regex until the
+    string stops changing.
+    """
+
+    # Get blacklist items from file
+    with open(blacklist_file) as blacklist_io:
+        blacklist = [line.strip() for line in blacklist_io]
+
+    # Convert blacklist array to regex string
+    blacklist = "|".join(blacklist)
+    blacklist_regex = re.compile(blacklist, re.I)
+
+    # Remove blacklist words
+    count = 1
+    while count > 0:
+        (string, count) = re.subn(blacklist_regex, " ", string, 0)
+
+    # Setup order of regexes
+    regexes = [
+        r"[\(\[\{].*[\)\]\}]",
+        r"[^a-zA-Z ]",
+        r"[A-Z]{3,4}",
+        r"\s{2,10}",
+    ]
+
+    # Loop through regexes
+    for regex in regexes:
+        count = 1
+        while count > 0:
+            (string, count) = re.subn(regex, ' ', string)
+
+    # Remove trailing or start whitespace
+    count = 1
+    while count > 0:
+        (string, count) = re.subn(r'(^\s|\s$)', '', string)
+
+    return string
+
+
+def timed(func, runs):
+    """Returns the best time of several runs of a function, and its
+    result.
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    """Runs each cleaner over the corpus and prints a summary.
+    """
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    names = CORPUS * copies
+    blacklist_file = os.path.join(mh.__mediaextras__, 'blacklist.txt')
+    cleaner = Books.MHTitleCleaner(blacklist_file)
+
+    results = [
+        ('original', timed(lambda: [
+            clean_original(name, blacklist_file) for name in names], runs)),
+        ('clean', timed(lambda: [
+            cleaner.clean(name) for name in names], runs)),
+        ('clean_many', timed(lambda: cleaner.clean_many(names), runs)),
+    ]
+
+    # Check that all cleaners agree
+    expected = results[0][1][1]
+    failed = False
+    for (label, (_, cleaned)) in results[1:]:
+        for (name, want, got) in zip(names, expected, cleaned):
+            if want != got:
+                print('{0} differs for {1!r}: {2!r} != {3!r}'.format(
+                    label, name, got, want))
+                failed = True
+                break
+
+    base = results[0][1][0]
+    for (label, (elapsed, _)) in results:
+        print('{0:>10}: {1} names, {2:.2f} ms, {3:.2f} us/name, '
+              '{4:.1f}x'.format(label, len(names), elapsed * 1000,
+                                elapsed * 1000000 / len(names),
+                                base / elapsed))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
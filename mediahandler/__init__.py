@@ -29,7 +29,7 @@ Module contains:
 """
 
 import os
-from os.path import join, dirname
+from os.path import join, dirname, expanduser
 
 __version__ = '1.2'
 __author__ = 'Erin Morelli <me@erin.dev>'
@@ -59,6 +59,9 @@ __mediatypes__ = [
 # Set relative path to extras folder
 __mediaextras__ = join(dirname(__file__), 'extras')
 
+# Set path to folder for runtime data (queues, sockets, caches)
+__mediacache__ = join(expanduser('~'), '.cache', 'mediahandler')
+
 
 class MHObject(object):
     """Base object for the mediahandler module and submodules.
@@ -0,0 +1,115 @@
+// EM Media Handler - Filebot server script
+//
+// Keeps a single Filebot JVM running and processes commands sent on stdin,
+// one JSON array of Filebot CLI arguments per line. The output of each
+// command is followed by a line containing only the end-of-command marker.
+// The -r, --log and --log-file options apply to their own command only.
+//
+// Usage: filebot -script filebot-server.groovy
+
+import groovy.json.JsonSlurper
+import java.util.logging.FileHandler
+import java.util.logging.Formatter
+import java.util.logging.Level
+
+def marker = '@@MH-FILEBOT-DONE@@'
+def slurper = new JsonSlurper()
+def reader = new BufferedReader(new InputStreamReader(System.in, 'UTF-8'))
+
+// Expand folders into the files they contain, and their subfolders' files
+// if recursive
+def getFiles = { paths, recursive ->
+    paths.collectMany { path ->
+        def file = new File(path)
+        if (!file.isDirectory()) {
+            return [file]
+        }
+        recursive ? file.getFiles() : file.listFiles().findAll { it.isFile() }
+    }
+}
+
+// Log messages to a file, as the --log-file option does, until the
+// returned handler is closed
+def startLog = { path, level ->
+    def logger = binding.hasVariable('log') ? log : java.util.logging.Logger.getLogger('net.filebot')
+    def handler = new FileHandler(path, true)
+    handler.setFormatter([format: { record ->
+        new java.util.logging.SimpleFormatter().formatMessage(record) + System.lineSeparator()
+    }] as Formatter)
+    handler.setLevel(level)
+    logger.addHandler(handler)
+    return [logger, handler]
+}
+
+// Run a single set of Filebot CLI arguments
+def runCommand = { args ->
+    def opts = [strict: true, recursive: false, log: Level.INFO]
+    def files = []
+    def mode = null
+
+    for (int i = 0; i < args.size(); i++) {
+        switch (args[i]) {
+            case '-rename':
+                mode = 'rename'
+                files << args[++i]
+                break
+            case '-extract':
+                mode = 'extract'
+                files << args[++i]
+                break
+            case '--db':
+                opts.db = args[++i]
+                break
+            case '--format':
+                opts.format = args[++i]
+                break
+            case '--action':
+                opts.action = args[++i]
+                break
+            case '-non-strict':
+                opts.strict = false
+                break
+            case '-r':
+                opts.recursive = true
+                break
+            case '--log':
+                opts.log = Level.parse(args[++i].toUpperCase())
+                break
+            case '--log-file':
+                opts.logFile = args[++i]
+                break
+        }
+    }
+
+    def logging = opts.logFile ? startLog(opts.logFile, opts.log) : null
+    try {
+        if (mode == 'rename') {
+            rename(file: getFiles(files, opts.recursive), db: opts.db,
+                   format: opts.format, action: opts.action,
+                   strict: opts.strict)
+        } else if (mode == 'extract') {
+            files.each { path ->
+                def file = new File(path)
+                file.isDirectory() ? extract(folder: file) : extract(file: file)
+            }
+        } else {
+            println "Failure: unsupported command ${args}"
+        }
+    } finally {
+        if (logging != null) {
+            logging[0].removeHandler(logging[1])
+            logging[1].close()
+        }
+    }
+}
+
+def line
+while ((line = reader.readLine()) != null) {
+    try {
+        runCommand(slurper.parseText(line))
+    } catch (Throwable e) {
+        println "Failure: ${e.message}"
+    }
+    println marker
+    System.out.flush()
+}
@@ -27,17 +27,24 @@ Module contains:
     - |main()|
         Wrapper function for handling CLI input.
 
+    - |daemon()|
+        Wrapper function for running the resident daemon.
+
 """
 
 import re
 import sys
+import signal
 import logging
 from shutil import rmtree
-from os import path, listdir, remove
+from os import path, remove
 
 import mediahandler as mh
 import mediahandler.util.args as Args
+import mediahandler.util.cleanup as Cleanup
 import mediahandler.util.notify as Notify
+import mediahandler.util.daemon as Daemon
+import mediahandler.util.inventory as Inventory
 from mediahandler.util.config import make_config, parse_config
 
 
@@ -60,6 +67,10 @@ class MHandler(mh.MHObject):
             Main entry point containing the logic sequence for
             sending media files to the correct submodule processor.
 
+        - add_media_many()
+            Batch entry point which sends many media paths to
+            add_media() across a pool of worker processes.
+
         - extract_files()
             Wrapper function for accessing the
             mediahandler.util.extract module
@@ -90,6 +101,9 @@ class MHandler(mh.MHObject):
         # Placeholders members
         self.single_file = False
         self.extracted = None
+        self.inventory = None
+        self.hash = None
+        self.book_info = None
 
     def add_media(self, media, **kwargs):
         """Entry point function for adding media via the MHandler object.
@@ -125,8 +139,24 @@ class MHandler(mh.MHObject):
             - nopush
                 True/False. Disable push notifications. Overrides
                 the "enabled" config file setting.
+
+            - hash
+                String. Hash of the Deluge torrent the media came from.
+                The torrent is removed from Deluge once the media has
+                been added, if the Deluge "enabled" setting is on.
+
+            - book_info
+                Dict. Google Books information already looked up for an
+                audiobook, see add_media_many().
         """
 
+        # Reset per-job state
+        self.single_file = False
+        self.extracted = None
+        self.inventory = None
+        self.hash = None
+        self.book_info = None
+
         # Set object info from input
         self._parse_args_from_dict(media, **kwargs)
         logging.debug("Media: %s", self.media)
@@ -148,6 +178,109 @@ class MHandler(mh.MHObject):
 
         return new_files
 
+    def add_media_many(self, items, processes=None):
+        """Batch entry point for adding many media paths at once.
+
+        Items are sent to add_media() across a pool of worker processes,
+        each with its own MHandler object. A failed item does not stop
+        the others. Google Books information for all audiobook items is
+        looked up first, in batches, see _resolve_books().
+
+        Required argument:
+
+            - items
+                List of media paths, or of dicts containing a 'media' path
+                and any other add_media() arguments (type, query, single,
+                nopush) to use for that item.
+
+        Optional argument:
+
+            - processes
+                Int. Number of worker processes to use.
+                Defaults to the number of CPUs.
+
+        Returns a list of dicts, in the same order as the items, with the
+        item's 'media' path and either the 'added' results or the 'error'
+        which stopped it.
+        """
+
+        # Set up items
+        jobs = []
+        for item in items:
+            if not isinstance(item, dict):
+                item = {'media': item}
+            jobs.append(dict(item))
+        logging.info("Adding %s media items", len(jobs))
+
+        # Look up audiobooks up front
+        self._resolve_books(jobs)
+
+        # Import module
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Send to worker processes
+        configs = [self.config] * len(jobs)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_add_media_worker, configs, jobs))
+
+        # Send notifications left by the worker processes
+        self.push.flush(self.push.EXIT_TIMEOUT)
+
+        return results
+
+    def _resolve_books(self, jobs):
+        """Looks up Google Books information for all audiobook items in
+        add_media_many() at once, before they are sent to worker processes.
+
+        Each book found is added to its job as 'book_info', for the job's
+        add_media() call to use. Nothing is looked up if the audiobooks
+        type is disabled. Any problem here is left for the item's own
+        add_media() call to report.
+        """
+
+        if not self.audiobooks.enabled:
+            return
+
+        # Find audiobook items
+        items = []
+        book_jobs = []
+        for job in jobs:
+            kwargs = dict(job)
+            media = kwargs.pop('media')
+            kwargs.pop('hash', None)
+            kwargs.pop('book_info', None)
+            try:
+                args = Args.get_add_media_args(media, **kwargs)
+            except SystemExit:
+                continue
+            if args['stype'] == 'Audiobooks':
+                items.append((args['media'], args['query']))
+                book_jobs.append(job)
+
+        if not items:
+            return
+
+        # Import module
+        import mediahandler.types.audiobooks as Books
+
+        # Look up books without sending notifications
+        disabled = self.push.disable
+        self.push.disable = True
+        try:
+            books = Books.MHAudiobook(self.audiobooks, self.push)
+            results = books.resolve_many(items)
+        except (SystemExit, Exception):
+            logging.exception("Unable to look up audiobooks up front, "
+                              "looking each up on its own instead")
+            return
+        finally:
+            self.push.disable = disabled
+
+        # Pass each book found to its job
+        for (job, result) in zip(book_jobs, results):
+            if result is not None:
+                job['book_info'] = result
+
     def _parse_args_from_dict(self, media, **kwargs):
         """Validate arguments from the add_media() function via the CLI
         argparse object in the mediahandler.util.args module.
@@ -167,14 +300,17 @@ class MHandler(mh.MHObject):
 
         # Send args to parser for validation
         else:
+            torrent_hash = kwargs.pop('hash', None)
+            book_info = kwargs.pop('book_info', None)
             new_args = Args.get_add_media_args(media, **kwargs)
+            new_args['hash'] = torrent_hash
+            new_args['book_info'] = book_info
 
         # Update MHandler object
         self.set_settings(new_args)
 
-        # Update MHPush object, if necessary
-        if hasattr(self, 'no_push') and getattr(self, 'no_push'):
-            self.push = Notify.MHPush(self.notifications, self.no_push)
+        # Update MHPush object
+        self.push.disable = bool(getattr(self, 'no_push', False))
 
     def _file_handler(self, files):
         """A wrapper function for _add_media_files().
@@ -182,83 +318,113 @@ class MHandler(mh.MHObject):
             - Looks for and extracts zipped files
             - Sets single_file flag
             - Checks that media folder is not empty
-            - Sends media files to _add_media_files()
+            - Sends extracted and loose media files to _add_media_files()
+              in a single pass
             - Checks for success
         """
 
         logging.info("Starting files handler")
 
-        # Look for zipped file first
-        self._find_zipped(files)
+        # Scan files once for every stage
+        self.inventory = Inventory.MHInventory(files)
+
+        # Extract any zipped files and get the files to add
+        work = self._find_zipped(files)
 
         # Only set this flag for single files
-        if path.isfile(files):
+        if path.isfile(work):
             self.single_file = True
 
         # Make sure folders have files
-        elif not listdir(files):
+        elif not self.inventory.list(work):
             self.push.failure(
                 "No {0} files found for: {1}".format(self.stype, self.name))
 
         # Add files
-        results = self._add_media_files(files)
+        results = self._add_media_files(work)
 
         return self._check_success(files, results)
 
     def _find_zipped(self, files):
         """Looks for compressed file types and sends them to extract_files().
 
-        File types supported: .zip, .rar, .7z
+        File types supported: .zip, .rar, .7z, .tar (including .tar.gz,
+        .tgz, .tar.bz2, .tbz2, .tar.xz and .txz). Only the first volume
+        of a multi-volume set is extracted.
+
+        Returns the path to add media from: the extracted files for a
+        single compressed file, or the folder otherwise, since archives
+        in a folder are extracted alongside its loose media.
         """
 
         logging.info("Looking for zipped files")
-        file_string = files
 
-        # Override if folder
-        if not path.isfile(files):
-            file_string = '\n'.join(listdir(files))
+        # Use inventory of files, if scanned
+        self.inventory = Inventory.get_inventory(self.inventory, files)
+
+        # Look for zipped files
+        if path.isfile(files):
+            zipped = [self.inventory.get(files)]
+        else:
+            zipped = self.inventory.list(files)
+        if not [entry for entry in zipped if entry.kind == 'archive']:
+            return files
+
+        logging.debug("Zipped file type detected")
 
-        # Set up regex
-        flags = re.I | re.MULTILINE
-        regex = r"^(.*.(zip|rar|7z))$"
+        # Send to extractor
+        get_files = self.extract_files(files)
 
-        # Look for zipped files in file string
-        if re.search(regex, file_string, flags):
-            logging.debug("Zipped file type detected")
-            # Send to extractor
-            get_files = self.extract_files(files)
-            # Rescan files
-            self._file_handler(get_files)
+        # Add extracted files to inventory
+        for folder in self.extracted:
+            self.inventory.scan(folder)
+
+        # Use extracted files in place of a single zipped file
+        if path.isfile(files):
+            return get_files
+
+        return files
 
     def extract_files(self, raw):
         """Wrapper function for sending compressed files for extraction via
         the mediahandler.util.extract module.
 
-        Requires the Filebot application for extraction.
+        Zip and tar files are extracted in-process. Other compressed files
+        require the Filebot application for extraction, unless a native
+        handler is available for them.
+
+        Keeps track of every folder files were extracted to in the
+        'extracted' member, for clean up. Returns the first one.
         """
 
         logging.info("Extracting files from compressed file")
-        self.extracted = raw
 
         # Look for filebot
+        filebot = None
+        server = False
         if hasattr(self.tv, 'filebot'):
             filebot = self.tv.filebot
+            server = getattr(self.tv, 'filebot_server', False)
         elif hasattr(self.movies, 'filebot'):
             filebot = self.movies.filebot
-        if not filebot:
-            self.push.failure(
-                "Filebot required to extract: {0}".format(self.name))
+            server = getattr(self.movies, 'filebot_server', False)
 
         # Import extract module
         import mediahandler.util.extract as Extract
 
         # Send to handler
-        extracted = Extract.get_files(filebot, raw)
-        if extracted is None:
+        extracted = Extract.get_folders(filebot, raw, server)
+        if not extracted and not filebot:
+            self.push.failure(
+                "Filebot required to extract: {0}".format(self.name))
+        elif not extracted:
             self.push.failure(
                 "Unable to extract files: {0}".format(self.name))
 
-        return extracted
+        # Keep track of extracted files for clean up
+        self.extracted = extracted
+
+        return extracted[0]
 
     def _add_media_files(self, files):
         """Sends media files to the correct mediahandler.types submodule
@@ -280,6 +446,11 @@ class MHandler(mh.MHObject):
         # Check for custom search (Audiobooks)
         if hasattr(self, 'query') and self.query is not None:
             self.audiobooks.custom_search = self.query
+        elif hasattr(self.audiobooks, 'custom_search'):
+            del self.audiobooks.custom_search
+
+        # Check for book info looked up up front (Audiobooks)
+        self.audiobooks.resolved_info = self.book_info
 
         # Check that type is enabled
         if not getattr(self, use_type).enabled:
@@ -299,6 +470,7 @@ class MHandler(mh.MHObject):
 
         # Initiate class
         media = const(getattr(self, use_type), self.push)
+        media.inventory = self.inventory
         logging.debug("Configured media type: %s", media.type)
 
         return media.add(files)
@@ -313,7 +485,8 @@ class MHandler(mh.MHObject):
     def _check_success(self, files, results):
         """Checks and processes the output of _add_media_files().
 
-        Sends files to be removed (if enabled). Documents added and skipped
+        Starts removing the Deluge torrent in the background and sends
+        files to be removed (if enabled). Documents added and skipped
         files then sends information to mediahandler.util.notify module.
         """
 
@@ -332,16 +505,38 @@ class MHandler(mh.MHObject):
         if skipped_files:
             skip = True
 
+        # Remove torrent while the rest of the job finishes
+        self._remove_torrent()
+
         # Remove old files
         self._remove_files(files, skip)
 
         return self.push.success(added_files, skipped_files)
 
+    def _remove_torrent(self):
+        """Queues the job's torrent for removal from Deluge, if enabled.
+
+        Removal runs in a background thread, so the job does not wait on
+        Deluge. The process waits for it to finish before exiting.
+        """
+
+        if not self.hash or not self.deluge.enabled:
+            return
+
+        import mediahandler.util.torrent as Torrent
+
+        logging.info("Removing torrent from Deluge")
+        Torrent.get_client(vars(self.deluge)).remove([self.hash])
+
     def _remove_files(self, files, skip):
         """Removes left over files from processing.
 
-        Checks user's 'keep_files' and 'keep_if_skips' settings. Removes
-        any extracted files in addition to other left over files.
+        Checks user's 'keep_files' and 'keep_if_skips' settings. Files are
+        always kept when the media type's 'transfer' mode is 'symlink', as
+        the added files link back to them. Removes any extracted files in
+        addition to other left over files. When
+        'background_cleanup' is enabled, removal is queued for a
+        background worker instead, so the job does not wait on it.
         """
 
         keep = self.general.keep_files
@@ -355,16 +550,32 @@ class MHandler(mh.MHObject):
         if skip and keep_skips:
             return
 
+        # Exit if the added files are symlinks to these files
+        settings = getattr(self, str(getattr(self, 'stype', '')).lower(), None)
+        if getattr(settings, 'transfer', None) == 'symlink':
+            logging.debug("Keeping files linked to by symlink transfer")
+            return
+
         # Otherwise, remove
         if path.exists(files):
 
+            # Find extracted files
+            extracted = [folder for folder in self.extracted or []
+                         if path.isdir(folder)]
+
+            # Hand off to a background worker
+            if getattr(self.general, 'background_cleanup', False):
+                logging.debug("Queueing left over files for removal")
+                Cleanup.remove_later(extracted + [files])
+                return
+
             # Remove any extracted files
-            if self.extracted is not None:
+            for folder in extracted:
                 logging.debug("Removing extracted files folder")
-                rmtree(self.extracted)
+                rmtree(folder)
 
             # Remove a single file
-            if self.single_file:
+            if path.isfile(files):
                 logging.debug("Removing extra single file")
                 remove(files)
 
@@ -379,6 +590,46 @@ class MHandler(mh.MHObject):
         return '<MHandler {0}>'.format(self.__dict__)
 
 
+# Handler object used by add_media_many() worker processes, and the
+# config file it was set up with
+_WORKER_HANDLER = None
+_WORKER_CONFIG = None
+
+
+def _get_worker_handler(config):
+    """Returns the MHandler object for an add_media_many() worker process,
+    setting it up on first use.
+    """
+    global _WORKER_HANDLER, _WORKER_CONFIG
+
+    if _WORKER_HANDLER is None or _WORKER_CONFIG != config:
+        _WORKER_HANDLER = MHandler(config)
+        _WORKER_CONFIG = config
+
+    return _WORKER_HANDLER
+
+
+def _add_media_worker(config, item):
+    """Sends a single add_media_many() item to add_media() in a worker
+    process and returns its results.
+    """
+
+    media = item.pop('media')
+    result = {'media': media, 'added': None, 'error': None}
+
+    # Send to handler
+    try:
+        handler = _get_worker_handler(config)
+        result['added'] = handler.add_media(media, **item)
+    except SystemExit as exc:
+        result['error'] = str(exc)
+    except Exception as exc:
+        logging.exception("Unable to add media: %s", media)
+        result['error'] = '{0}: {1}'.format(type(exc).__name__, exc)
+
+    return result
+
+
 def main(is_deluge=False):
     """Wrapper function for passing CLI arguments to the MHandler
     add_media() function for processing.
@@ -392,11 +643,19 @@ def main(is_deluge=False):
     # Get arguments
     (config, args) = Args.get_arguments(is_deluge)
 
+    # Hand off to a running daemon, if there is one
+    if Daemon.send_job(config, args) is not None:
+        return None
+
     # Set up handler
     handler = MHandler(config)
 
     # Set up add media args
-    added = handler.add_media(validated=True, **args)
+    try:
+        added = handler.add_media(validated=True, **args)
+    finally:
+        # Leave an open digest for the next run to add to
+        handler.push.flush(handler.push.EXIT_TIMEOUT, leave_digest=True)
 
     # Return formatted list of added files
     return added
@@ -406,3 +665,44 @@ def deluge():
     """Wrapper function for the addmedia-deluge script.
     """
     return main(is_deluge=True)
+
+
+def daemon():
+    """Wrapper function for the addmedia-daemon script.
+
+    Keeps a single MHandler object warm and processes jobs sent by the
+    addmedia and addmedia-deluge scripts, and any new media found in the
+    watch folder, until it is stopped.
+    """
+
+    # Get arguments
+    config = Args.get_daemon_arguments()
+
+    # Set up handler & daemon
+    handler = MHandler(config)
+    server = Daemon.MHDaemon(handler)
+
+    # Stop cleanly on signals
+    signal.signal(signal.SIGTERM, server.stop)
+    signal.signal(signal.SIGINT, server.stop)
+
+    # Watch for new media, if enabled
+    watcher = None
+    if handler.watch.enabled:
+        if handler.watch.folder is None:
+            handler.push.failure("Folder required to watch for new media")
+
+        # Import watch module
+        import mediahandler.util.watch as Watch
+
+        watcher = Watch.MHWatcher(
+            handler.watch.folder, handler.watch.settle, server.queue)
+        watcher.start()
+
+    # Process jobs
+    try:
+        server.serve()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        handler.push.flush(handler.push.EXIT_TIMEOUT)
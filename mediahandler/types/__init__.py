@@ -37,10 +37,28 @@ Media Type Submodules:
 
 import os
 import logging
-from subprocess import Popen, PIPE
-from re import findall, search, sub, IGNORECASE
+from re import sub
 
 import mediahandler as mh
+import mediahandler.util.output as Output
+import mediahandler.util.filebot as Filebot
+import mediahandler.util.inventory as Inventory
+
+
+# Filebot actions for each video transfer mode
+TRANSFER_ACTIONS = {
+    'copy': 'copy',
+    'move': 'move',
+    'hardlink': 'hardlink',
+    'symlink': 'symlink',
+    'reflink': 'clone',
+    'clone': 'clone',
+    'auto': None,
+}
+
+# Labels Filebot uses for each action in its output
+FILEBOT_ACTIONS = ('MOVE|COPY|KEEPLINK|SYMLINK|HARDLINK|CLONE|DUPLICATE|'
+                   'TEST')
 
 
 class MHMediaType(mh.MHObject):
@@ -74,6 +92,7 @@ class MHMediaType(mh.MHObject):
 
         # Set up class members
         self.push = push
+        self.inventory = None
         self.dst_path = ''
         self.type = sub(r'^mh', '', type(self).__name__.lower())
 
@@ -110,12 +129,21 @@ class MHMediaType(mh.MHObject):
             self.push.failure(
                 "Filebot required to process {0} files".format(self.ptype))
 
+        # Check transfer mode
+        transfer = getattr(self, 'transfer', None) or 'copy'
+        if transfer not in TRANSFER_ACTIONS:
+            self.push.failure(
+                "Transfer mode not recognized for {0}: {1}".format(
+                    self.ptype, transfer))
+
         # Filebot
         cmd_info = self.MHSettings({
-            'action': 'copy',
+            'transfer': transfer,
+            'action': TRANSFER_ACTIONS[transfer] or 'copy',
             'db': '',
             'format': os.path.join(self.dst_path, self.format),
-            'flags': ['-r', '-non-strict']
+            'flags': ['-r', '-non-strict'],
+            'server': bool(getattr(self, 'filebot_server', False))
         })
         self.__dict__.update({'cmd': cmd_info})
 
@@ -129,8 +157,8 @@ class MHMediaType(mh.MHObject):
         })
         query.skip = r'({0}) \[(.*)\] because \[(.*)\] ({1})?already exists'.format(
             'Skipped|Failed to process', 'is an exact copy and ')
-        query.added = r'\[{0}\] ({1}) \[(.*)\] to \[(.*)\.{2}\]'.format(
-            self.cmd.action.upper(), 'From|Rename', query.file_types)
+        query.added = r'\[(?:{0})\] ({1}) \[(.*)\] to \[(.*)\.{2}\]'.format(
+            FILEBOT_ACTIONS, 'From|Rename', query.file_types)
         self.__dict__.update({'query': query})
 
     def add(self, file_path):
@@ -141,6 +169,10 @@ class MHMediaType(mh.MHObject):
 
         logging.info("Starting %s handler", self.type)
 
+        # Pick transfer action for these files
+        if self.cmd.transfer == 'auto':
+            self.cmd.action = self._get_auto_action(file_path)
+
         # Set up query
         m_cmd = [self.filebot,
                  '-rename', file_path,
@@ -163,55 +195,95 @@ class MHMediaType(mh.MHObject):
 
         return self._media_info(m_cmd, file_path)
 
+    def _get_auto_action(self, file_path):
+        """Returns the cheapest Filebot action which leaves the original
+        files in place, so torrents can keep seeding.
+
+        Files on the same device as the destination are hard linked, using
+        Filebot's 'duplicate' action, which copies instead if the file
+        system does not support hard links. Otherwise, files are copied.
+        """
+
+        try:
+            same_device = (os.stat(file_path).st_dev ==
+                           os.stat(self.dst_path).st_dev)
+        except OSError:
+            same_device = False
+
+        action = 'duplicate' if same_device else 'copy'
+        logging.debug("Using transfer action: %s", action)
+
+        return action
+
     def _media_info(self, cmd, file_path):
         """Makes request to Beets and Filebot.
 
-        Sends results to _process_output().
+        Parses the output line by line as it is produced, then sends the
+        results to _process_output().
         """
 
         logging.debug("Query: %s", cmd)
 
-        # Process query
-        query = Popen(cmd, stdout=PIPE, stderr=PIPE)
+        # Process query via a warm Filebot process, if enabled
+        if hasattr(self, 'cmd') and self.cmd.server:
+            lines = Filebot.iter_command(cmd, server=True)
+        else:
+            lines = Output.iter_lines(cmd)
+
+        # Parse output as it is produced
+        parser = self._get_parser()
+        for line in lines:
+
+            # Query was restarted
+            if line is None:
+                parser.reset()
+                continue
 
-        # Get output
-        (output, err) = query.communicate()
-        logging.debug("Query output: %s", output)
-        logging.debug("Query return errors: %s", err)
+            logging.debug("Query output: %s", line.rstrip())
+            parser.feed(line)
 
-        return self._process_output(output + err, file_path)
+        return self._process_output(parser, file_path)
+
+    def _get_parser(self):
+        """Returns a new MHOutputParser object for the query's added and
+        skipped patterns.
+        """
+        return Output.MHOutputParser([
+            ('added', self.query.added, self.query.added_i),
+            ('skipped', self.query.skip, self.query.skip_i),
+        ], self._on_output)
+
+    def _on_output(self, event, value):
+        """Logs added and skipped files as soon as they are parsed.
+        """
+        if event == 'added':
+            logging.info("File was added: %s", value)
+        else:
+            logging.warning("File was skipped: %s (%s)",
+                            os.path.basename(value),
+                            self.query.reason)
 
     def _process_output(self, output, file_path):
         """Parses response from _media_info() query.
 
+        Takes a MHOutputParser object which has already parsed the query
+        output, or the full output as str or bytes.
+
         Returns good results and any skipped files.
         """
 
         logging.info("Processing query output")
 
-        # Convert output to str, if needed
-        if not isinstance(output, str):
-            output = output.decode('utf-8')
-
-        # Look for content
-        added_data = findall(self.query.added, output, IGNORECASE)
-        skip_data = findall(self.query.skip, output, IGNORECASE)
-
-        # Check return
-        results = []
-        if added_data:
-            for added_item in added_data:
-                results.append(added_item[self.query.added_i])
-
-        # Get skipped results
-        skipped = []
-        if skip_data:
-            for skip_item in skip_data:
-                skip_item_name = os.path.basename(skip_item[self.query.skip_i])
-                skipped.append(skip_item_name)
-                logging.warning("File was skipped: %s (%s)",
-                                skip_item_name,
-                                self.query.reason)
+        # Parse full output, if needed
+        parser = output
+        if not isinstance(parser, Output.MHOutputParser):
+            parser = self._get_parser()
+            parser.feed_text(output)
+
+        # Get results
+        results = parser.results('added')
+        skipped = [os.path.basename(skip_item)
+                   for skip_item in parser.results('skipped')]
 
         # Return error if nothing found
         if not skipped and not results:
@@ -230,19 +302,14 @@ class MHMediaType(mh.MHObject):
         if os.path.isfile(file_path):
             return
 
-        # Look for bad files and remove them
-        regex = r'\.{0}$'.format(self.query.file_types)
-        for item in os.listdir(file_path):
-
-            item_path = os.path.join(file_path, item)
-
-            # If it's a folder, iterate again
-            if os.path.isdir(item_path):
-                self._remove_bad_files(item_path)
+        # Look for non-video files in all folders and remove them
+        self.inventory = Inventory.get_inventory(self.inventory, file_path)
+        for entry in self.inventory.list(file_path, recursive=True):
+            if entry.kind in ['folder', 'video', 'sample']:
+                continue
 
-            # Otherwise check for non-video files
-            elif not search(regex, item):
-                os.unlink(item_path)
+            os.unlink(entry.path)
+            self.inventory.discard(entry.path)
 
     def _match_error(self, name):
         """Returns a match error via the MHPush object.
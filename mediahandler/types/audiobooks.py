@@ -22,66 +22,505 @@ Module contains:
     - |MHAudiobook|
         Child class of MHMediaType for the audiobooks media type.
 
+    - |MHTitleCleaner|
+        Cleans audiobook titles from file names into search strings.
+
     - |get_book_info()|
-        Makes API request to Google Books and returns results.
+        Makes API request to Google Books and returns results, using a
+        local cache of previous lookups where possible.
+
+    - |get_book_info_many()|
+        Looks up many Google Books queries at once using batch requests,
+        and saves the results to the local lookup cache.
+
+    - |get_cover()|
+        Downloads a cover image into a shared local cache.
+
+    - |get_cleaner()|
+        Returns a shared MHTitleCleaner object.
+
+    - |link_file()|
+        Stages a file at a new path without copying its data.
+
+    - |plan_parts()|
+        Splits a list of file durations into balanced, contiguous parts.
 
 """
 
 import os
 import re
+import json
+from hashlib import sha1, sha256
 from re import search
 import logging
-from math import ceil
+import threading
+from time import time, sleep
 from shutil import copy, move
 from subprocess import Popen, PIPE
-from os import path, listdir, makedirs
-
-from googleapiclient.discovery import build
-from mutagen.mp3 import MP3
-from mutagen.ogg import OggFileType
+from os import path, makedirs
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import mediahandler as mh
+import mediahandler.util.inventory as Inventory
+from mediahandler.util.config import get_cache_path
+
+# Number of seconds to cache Google Books lookups with no results
+NEGATIVE_TTL = 3600
+
+# Google Books volume fields used by get_book_info()
+BOOK_FIELDS = ('items(id,volumeInfo(title,subtitle,authors,publishedDate,'
+               'categories,imageLinks/thumbnail))')
+
+# Number of Google Books queries to send in each batch request
+BATCH_SIZE = 40
+
+# Maximum number of Google Books queries to send per second
+BATCH_RATE = 10
+
+# Connect and read timeouts for cover image downloads, in seconds
+COVER_TIMEOUT = (10, 30)
+
+# Google Books API service objects, by API key
+_SERVICES = {}
+
+# Shared HTTP session for cover image downloads
+_COVER_SESSION = None
+
+# MHTitleCleaner objects, by blacklist file path
+_CLEANERS = {}
+
+
+class MHTitleCleaner(mh.MHObject):
+    """Cleans audiobook titles from file names into search strings.
+
+    Removes blacklisted words, anything in brackets, non-letters, runs of
+    3-4 capital letters (e.g. release group tags) and extra whitespace.
+    The blacklist is read and every regex is compiled once, when the
+    object is created, and each step only needs a single pass over the
+    string.
+
+    Required arguments:
+        - blacklist_file
+            Path to a file with one blacklisted word or regex per line.
+
+    Public methods:
+
+        - clean()
+            Cleans a single title.
 
-try:
-    from urllib.request import build_opener
-except ImportError:
-    from urllib2 import build_opener
+        - clean_many()
+            Cleans a list of titles at once.
+    """
+
+    def __init__(self, blacklist_file):
+        """Initializes the MHTitleCleaner object.
+        """
+
+        super(MHTitleCleaner, self).__init__()
+
+        # Get blacklist items from file
+        with open(blacklist_file) as blacklist_io:
+            blacklist = [line.strip() for line in blacklist_io]
+        blacklist = [item for item in blacklist if item]
+
+        # Remove blacklisted words before anything else, so that words
+        # with digits are matched, then brackets, then non-letters
+        self.remove = re.compile(
+            r"(?i:{0})|[\(\[\{{].*[\)\]\}}]|[^a-zA-Z \n]".format(
+                "|".join(blacklist)))
+
+        # Then remove capital letter tags from what is left
+        self.caps = re.compile(r"[A-Z]{3,4}")
+
+    def clean(self, string):
+        """Returns a cleaned title string.
+        """
+        return self.clean_many([string])[0]
+
+    def clean_many(self, strings):
+        """Returns a list of cleaned title strings.
+
+        The titles are cleaned together, as lines of a single string, so
+        each regex only runs once however many titles there are.
+        """
+
+        text = '\n'.join(string.replace('\n', ' ') for string in strings)
+
+        # Remove unwanted characters
+        text = self.remove.sub(' ', text)
+        text = self.caps.sub(' ', text)
 
-try:
-    XRANGE = xrange
-except NameError:
-    XRANGE = range
+        # Remove extra whitespace
+        return [' '.join(line.split()) for line in text.split('\n')]
 
+    def __repr__(self):
+        return '<MHTitleCleaner {0}>'.format(self.__dict__)
 
-def get_book_info(api_key, query):
+
+def get_cleaner(blacklist_file=None):
+    """Returns an MHTitleCleaner object for a blacklist file, created once
+    per process.
+
+    Optional arguments:
+            - blacklist_file
+                Path to the blacklist file. Defaults to the blacklist.txt
+                file in the mediahandler extras folder.
+    """
+
+    if blacklist_file is None:
+        blacklist_file = path.join(mh.__mediaextras__, 'blacklist.txt')
+
+    if blacklist_file not in _CLEANERS:
+        _CLEANERS[blacklist_file] = MHTitleCleaner(blacklist_file)
+
+    return _CLEANERS[blacklist_file]
+
+
+def _get_path_title(str_path):
+    """Returns the book title part of a media file path.
+    """
+    find_book = str_path.rsplit(os.path.sep)[1:]
+    return find_book[-1]
+
+
+def link_file(start_path, end_path):
+    """Stages a file at a new path without copying its data.
+
+    Tries a hard link, and falls back to copying the file if the paths are
+    on different filesystems or the filesystem does not support hard
+    links. Symbolic links are never used, as the new file must stay valid
+    after the original is removed.
+
+    Returns the method used: 'hardlink' or 'copy'.
+    """
+
+    # Replace anything left over from a previous run
+    if path.lexists(end_path):
+        os.remove(end_path)
+
+    # Try a hard link first
+    try:
+        os.link(start_path, end_path)
+        return 'hardlink'
+    except (AttributeError, NotImplementedError, OSError) as exc:
+        logging.debug("Unable to hardlink file: %s", exc)
+
+    # Otherwise, copy
+    copy(start_path, end_path)
+
+    return 'copy'
+
+
+def plan_parts(lengths, max_length):
+    """Splits a list of file durations into contiguous parts, keeping the
+    files in order.
+
+    Uses the fewest parts which keep each part within 'max_length', or
+    within the longest single file if that is longer, then places the part
+    boundaries so that the longest part is as short as possible.
+
+    Returns a list of (start, end) index pairs, one per part.
+    """
+
+    count = len(lengths)
+    if not count:
+        return []
+
+    # Find the fewest parts needed
+    cap = max([max_length] + list(lengths))
+    parts = 1
+    current = 0
+    for length in lengths:
+        if current and current + length > cap:
+            parts += 1
+            current = 0
+        current += length
+
+    # Sum durations up to each file
+    totals = [0]
+    for length in lengths:
+        totals.append(totals[-1] + length)
+
+    # Find the shortest longest part for the first i files in j parts,
+    # and where the last of those parts starts
+    best = [[float('inf')] * (count + 1) for _ in range(parts + 1)]
+    split = [[0] * (count + 1) for _ in range(parts + 1)]
+    best[0][0] = 0
+    for j in range(1, parts + 1):
+        for i in range(j, count + 1):
+            for start in range(i - 1, j - 2, -1):
+                last = totals[i] - totals[start]
+
+                # A longer last part cannot do better
+                if last >= best[j][i]:
+                    break
+
+                longest = max(best[j - 1][start], last)
+                if longest < best[j][i]:
+                    best[j][i] = longest
+                    split[j][i] = start
+
+    # Walk back through the part boundaries
+    bounds = []
+    end = count
+    for j in range(parts, 0, -1):
+        start = split[j][end]
+        bounds.insert(0, (start, end))
+        end = start
+
+    return bounds
+
+
+def _get_books_key(query):
+    """Normalises a Google Books query for use as a cache key, ignoring
+    case, punctuation and spacing.
+    """
+    return ' '.join(re.findall(r'\w+', query.lower()))
+
+
+def _read_books_cache():
+    """Returns a dict of cached Google Books lookups by query key.
+    """
+    try:
+        with open(get_cache_path('books.json')) as cache_io:
+            cache = json.load(cache_io)
+    except (IOError, OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _write_books_cache(cache, size):
+    """Saves the Google Books lookup cache, dropping the least recently
+    used lookups beyond 'size'.
+    """
+
+    # Drop least recently used lookups
+    if size and len(cache) > size:
+        keys = sorted(cache, key=lambda key: cache[key]['used'])
+        for key in keys[:len(cache) - size]:
+            del cache[key]
+
+    # Replace file in a single step
+    cache_file = get_cache_path('books.json')
+    tmp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+    try:
+        with open(tmp_file, 'w') as cache_io:
+            json.dump(cache, cache_io)
+        os.replace(tmp_file, cache_file)
+    except (IOError, OSError) as exc:
+        logging.debug("Unable to save Google Books cache: %s", exc)
+
+
+def _get_cached_books(cache, key, cache_ttl, now):
+    """Returns the cache entry for a query key if it has not expired, or
+    None otherwise.
+    """
+
+    entry = cache.get(key)
+    if entry is None:
+        return None
+
+    # Keep lookups with no results for a shorter time
+    ttl = cache_ttl
+    if entry['result'] is None:
+        ttl = min(cache_ttl, NEGATIVE_TTL)
+
+    if now - entry['time'] >= ttl:
+        return None
+
+    return entry
+
+
+def get_book_info(api_key, query, cache_ttl=0, cache_size=0):
     """Makes API request to Google Books.
 
+    Lookups are cached on disk by their normalised query for 'cache_ttl'
+    seconds, so repeated imports of the same book do not query Google
+    again. Lookups with no results are cached for up to an hour.
+
     Required arguments:
             - api_key
                 String. A valid Google API public access key.
 
             - query
                 String. Search string to submit to Google.
+
+    Optional arguments:
+            - cache_ttl
+                Number of seconds to use cached results for. Set to 0 to
+                bypass the cache.
+
+            - cache_size
+                Maximum number of lookups to cache. Set to 0 for no limit.
+
+    Returns a dict of book information, or None if no book was found.
+    """
+
+    # Bypass cache
+    if not cache_ttl:
+        return _query_books(api_key, query)
+
+    # Check cache
+    key = _get_books_key(query)
+    cache = _read_books_cache()
+    now = time()
+    entry = _get_cached_books(cache, key, cache_ttl, now)
+    if entry is not None:
+        logging.info("Using cached Google Books result")
+        entry['used'] = now
+        _write_books_cache(cache, cache_size)
+        return entry['result']
+
+    # Query Google and save result
+    result = _query_books(api_key, query)
+    cache = _read_books_cache()
+    cache[key] = {'time': now, 'used': now, 'result': result}
+    _write_books_cache(cache, cache_size)
+
+    return result
+
+
+def get_book_info_many(api_key, queries, cache_ttl, cache_size=0):
+    """Looks up many Google Books queries at once, and saves the results
+    to the lookup cache, if enabled, so that get_book_info() calls for the
+    same queries do not query Google again.
+
+    Queries are de-duplicated and any already cached are skipped. The rest
+    are sent in batch requests of up to BATCH_SIZE queries, at no more
+    than BATCH_RATE queries per second. Queries which fail, including
+    whole batches which fail for any reason, are left for get_book_info()
+    to retry.
+
+    Required arguments:
+            - api_key
+                String. A valid Google API public access key.
+
+            - queries
+                List of search strings to submit to Google.
+
+            - cache_ttl
+                Number of seconds to use cached results for. Set to 0 to
+                bypass the cache, so results are only returned.
+
+    Optional arguments:
+            - cache_size
+                Maximum number of lookups to cache. Set to 0 for no limit.
+
+    Returns a dict of the book information found for each query key.
+    """
+
+    # De-duplicate queries
+    keys = {}
+    for query in queries:
+        keys.setdefault(_get_books_key(query), query)
+
+    # Skip cached queries
+    cache = _read_books_cache() if cache_ttl else {}
+    now = time()
+    pending = [(key, query) for (key, query) in sorted(keys.items())
+               if _get_cached_books(cache, key, cache_ttl, now) is None]
+    logging.info("Querying Google Books for %s of %s books",
+                 len(pending), len(keys))
+
+    # Collect responses
+    results = {}
+
+    def _callback(key, response, exception):
+        if exception is not None:
+            logging.warning("Google Books lookup failed: %s", exception)
+            return
+        results[key] = _parse_books(response)
+
+    # Send batch requests
+    service = _get_books_service(api_key)
+    for start in range(0, len(pending), BATCH_SIZE):
+        started = time()
+        batch = service.new_batch_http_request(callback=_callback)
+        for (key, query) in pending[start:start + BATCH_SIZE]:
+            batch.add(_get_books_request(service, query), request_id=key)
+        try:
+            batch.execute()
+        except Exception as exc:
+            logging.warning("Google Books batch request failed: %s", exc)
+            break
+
+        # Limit rate
+        count = len(pending[start:start + BATCH_SIZE])
+        if start + BATCH_SIZE < len(pending):
+            sleep(max(0, count / float(BATCH_RATE) - (time() - started)))
+
+    # Save results
+    if results and cache_ttl:
+        cache = _read_books_cache()
+        for (key, result) in results.items():
+            cache[key] = {'time': now, 'used': now, 'result': result}
+        if cache_size:
+            cache_size = max(cache_size, len(keys))
+        _write_books_cache(cache, cache_size)
+
+    return results
+
+
+def _get_books_service(api_key):
+    """Returns a Google Books API service object, reused for the life of
+    the process.
+
+    The service is built from the discovery document bundled with the
+    Google API client, so no discovery request is made.
+    """
+
+    if api_key not in _SERVICES:
+
+        # Import module
+        from googleapiclient.discovery import build
+
+        # Connect to Google Books API
+        _SERVICES[api_key] = build(
+            'books', 'v1', developerKey=api_key, static_discovery=True)
+
+    return _SERVICES[api_key]
+
+
+def _query_books(api_key, query):
+    """Queries the Google Books API, and returns a dict of information
+    about the top result, or None if there were no results.
     """
 
     logging.info("Querying Google Books")
 
-    # Connect to Google Books API
-    service = build('books', 'v1', developerKey=api_key)
+    # Get Google Books API service
+    service = _get_books_service(api_key)
+
+    # Get response
+    response = _get_books_request(service, query).execute()
 
-    # Make API request
-    request = service.volumes().list(
+    return _parse_books(response)
+
+
+def _get_books_request(service, query):
+    """Returns a Google Books API request for a query, for only the top
+    result's fields.
+    """
+
+    return service.volumes().list(
         q=query,
         orderBy="relevance",
-        printType="books",
-        maxResults=5
+        printType="BOOKS",
+        maxResults=1,
+        fields=BOOK_FIELDS
     )
 
-    # Get response
-    response = request.execute()
+
+def _parse_books(response):
+    """Returns a dict of information about the top result in a Google
+    Books API response, or None if there were no results.
+    """
+
     logging.debug("Google response:\n%s", response)
 
     # Get the top response
+    new_book_info = None
     for book in response.get('items', []):
 
         # Get publication date
@@ -124,6 +563,85 @@ def get_book_info(api_key, query):
     return new_book_info
 
 
+def _get_cover_session():
+    """Returns an HTTP session for cover image downloads, reused for the
+    life of the process so connections are kept alive between covers.
+    """
+
+    global _COVER_SESSION
+
+    if _COVER_SESSION is None:
+
+        # Import module
+        import requests
+
+        _COVER_SESSION = requests.Session()
+        _COVER_SESSION.headers.update({'User-agent': 'Mozilla/5.0'})
+
+    return _COVER_SESSION
+
+
+def get_cover(img_url):
+    """Returns the path to a cover image in the shared cover cache,
+    downloading it first if needed.
+
+    Covers are stored once by the SHA-256 hash of their contents, and
+    linked to by the SHA-1 hash of their URL, with Google's page curl
+    effect removed. Each cover is downloaded at most once, and identical
+    covers found at different URLs are only stored once.
+
+    Required arguments:
+            - img_url
+                String. URL of the cover image.
+    """
+
+    # Clean up image url
+    no_curl = re.sub(r"(\&edge=curl)", "", img_url)
+    logging.debug("Cleaned cover url: %s", no_curl)
+
+    # Check for cached cover
+    cover_dir = get_cache_path('covers')
+    if not path.exists(cover_dir):
+        makedirs(cover_dir, exist_ok=True)
+    url_key = sha1(no_curl.encode('utf-8')).hexdigest()
+    url_path = path.join(cover_dir, 'url-{0}.jpg'.format(url_key))
+    if path.isfile(url_path):
+        logging.debug("Using cached cover image: %s", url_path)
+        return url_path
+
+    # Stream image to a temporary file
+    session = _get_cover_session()
+    tmp_path = '{0}.{1}.tmp'.format(url_path, os.getpid())
+    content_hash = sha256()
+    response = session.get(no_curl, stream=True, timeout=COVER_TIMEOUT)
+    try:
+        response.raise_for_status()
+        with open(tmp_path, 'wb') as output:
+            for chunk in response.iter_content(65536):
+                content_hash.update(chunk)
+                output.write(chunk)
+    except Exception:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        response.close()
+
+    # Store by contents, unless an identical cover is already stored
+    hash_path = path.join(
+        cover_dir, 'sha-{0}.jpg'.format(content_hash.hexdigest()))
+    if path.isfile(hash_path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, hash_path)
+
+    # Link url to contents
+    link_file(hash_path, url_path)
+    logging.debug("Cached cover image: %s", hash_path)
+
+    return url_path
+
+
 class MHAudiobook(mh.MHObject):
     """Child class of MHObject for the audiobooks media type.
 
@@ -138,6 +656,10 @@ class MHAudiobook(mh.MHObject):
         - |add()|
             Main wrapper function for adding audiobook files. Processes
             calls to the Google Books API and ABC chaptering tool.
+
+        - resolve_many()
+            Looks up Google Books information for many audiobooks at
+            once, ahead of adding them.
     """
 
     def __init__(self, settings, push):
@@ -161,17 +683,14 @@ class MHAudiobook(mh.MHObject):
         self.push = push
         self.orig_path = None
         self.file_type = None
+        self.inventory = None
         self.type = re.sub(r'^mh', '', type(self).__name__.lower())
 
         # Set up book settings
         self.set_settings({
-            'regex': {
-                "nc": r"\.(mp3|ogg|wav)$",
-                "c": r"\.(m4b)$",
-            },
             'audio': {
-                'MP3': MP3,
-                'OGG': OggFileType,
+                'MP3': ['mutagen.mp3', 'MP3'],
+                'OGG': ['mutagen.ogg', 'OggFileType'],
             },
         })
 
@@ -258,51 +777,20 @@ class MHAudiobook(mh.MHObject):
 
         Takes in a string parse from media file path and removes non-
         alphanumeric characters, extra whitespace, blacklisted words,
-        and other unwanted characters.
+        and other unwanted characters, see MHTitleCleaner.
         """
 
         logging.info("Cleaning up path string")
 
         # Get query from folder path
-        find_book = str_path.rsplit(os.path.sep)[1:]
-        string = find_book[-1]
+        string = _get_path_title(str_path)
         logging.debug("Initial string: %s", string)
 
         # Save original path for later
         self.orig_path = path.dirname(str_path)
 
-        # Get blacklist items from file
-        blacklist_file = path.join(mh.__mediaextras__, 'blacklist.txt')
-        with open(blacklist_file) as blacklist_io:
-            blacklist = [line.strip() for line in blacklist_io]
-
-        # Convert blacklist array to regex string
-        blacklist = "|".join(blacklist)
-        blacklist_regex = re.compile(blacklist, re.I)
-
-        # Remove blacklist words
-        count = 1
-        while count > 0:
-            (string, count) = re.subn(blacklist_regex, " ", string, 0)
-
-        # Setup order of regexes
-        regexes = [
-            r"[\(\[\{].*[\)\]\}]",
-            r"[^a-zA-Z ]",
-            r"[A-Z]{3,4}",
-            r"\s{2,10}",
-        ]
-
-        # Loop through regexes
-        for regex in regexes:
-            count = 1
-            while count > 0:
-                (string, count) = re.subn(regex, ' ', string)
-
-        # Remove trailing or start whitespace
-        count = 1
-        while count > 0:
-            (string, count) = re.subn(r'(^\s|\s$)', '', string)
+        # Remove unwanted words & characters
+        string = get_cleaner().clean(string)
 
         return string
 
@@ -312,9 +800,54 @@ class MHAudiobook(mh.MHObject):
         Converts resulting dict into object members.
         """
 
-        result = get_book_info(self.api_key, query)
+        # Use information already looked up by resolve_many()
+        if getattr(self, 'resolved_info', None) is not None:
+            self.book_info = self.resolved_info
+            return
+
+        result = get_book_info(self.api_key, query,
+                               getattr(self, 'cache_ttl', 0),
+                               getattr(self, 'cache_size', 0))
+        if result is None:
+            return self.push.failure(
+                "Unable to match {0} files: {1}".format(self.type, query))
         self.book_info = self.MHSettings(result)
 
+    def resolve_many(self, items):
+        """Looks up Google Books information for many audiobooks at once,
+        via get_book_info_many().
+
+        Search strings are built the same way as in add(), and results
+        are saved to the lookup cache, if enabled. Pass each result to
+        add_media() as 'book_info' so that adding the book later does not
+        query Google again.
+
+        Required arguments:
+            - items
+                List of (raw, query) tuples. 'raw' is a path to audiobook
+                files, and 'query' is a custom search string or None.
+
+        Returns a list of the book information found for each item, or
+        None for items which were not found.
+        """
+
+        # Clean all titles at once
+        titles = [_get_path_title(raw)
+                  for (raw, query) in items if query is None]
+        cleaned = iter(get_cleaner().clean_many(titles))
+
+        queries = []
+        for (raw, query) in items:
+            if query is None:
+                query = next(cleaned)
+            queries.append(query)
+
+        results = get_book_info_many(self.api_key, queries,
+                                     getattr(self, 'cache_ttl', 0),
+                                     getattr(self, 'cache_size', 0))
+
+        return [results.get(_get_books_key(query)) for query in queries]
+
     def _single_file(self, file_path, path_name):
         """Extra processing needed for single audiobook files.
 
@@ -350,7 +883,9 @@ class MHAudiobook(mh.MHObject):
         """Retrieves and saves cover image from Google results.
 
         Will use an existing cover image if it is in the same directory
-        as the main files and is named 'cover.jpg'.
+        as the main files and is named 'cover.jpg'. Otherwise, the image
+        is linked from the shared cover cache, see get_cover(). The book
+        is still added without a cover if the image cannot be saved.
         """
 
         logging.info("Saving audiobook cover image")
@@ -367,21 +902,12 @@ class MHAudiobook(mh.MHObject):
             # If so, return none
             return img_path
 
-        # Clean up image url
-        no_curl = re.sub(r"(\&edge=curl)", "", img_url)
-        logging.debug("Cleaned cover url: %s", no_curl)
-
-        # Set image request headers
-        opener = build_opener()
-        opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-
-        # Get image info from web & open
-        response = opener.open(no_curl)
-        opener.close()
-
-        # Write image to new cover file
-        with open(img_path, "wb") as output:
-            output.write(response.read())
+        # Link image from cover cache
+        try:
+            link_file(get_cover(img_url), img_path)
+        except OSError as exc:
+            logging.warning("Unable to save cover image: %s", exc)
+            return None
 
         # Add image to book info
         self.book_info.cover_image = img_path
@@ -395,6 +921,10 @@ class MHAudiobook(mh.MHObject):
         setting is disabled, will return non-chaptered files (.mp3, .ogg). Or
         if 'make_chapters' is enabled, will look for non-chaptered files and
         send them to be chapterized.
+
+        Files in subfolders, e.g. extracted from compressed files, are
+        included, except for part folders left by an earlier run. Non-
+        chaptered files are named by their path relative to 'file_dir'.
         """
 
         logging.info("Retrieving audiobook files")
@@ -405,23 +935,25 @@ class MHAudiobook(mh.MHObject):
         book_files = []
         file_list = []
 
-        # Get list of files
-        file_list = listdir(file_dir)
+        # Get list of files, including subfolders
+        self.inventory = Inventory.get_inventory(self.inventory, file_dir)
+        file_list = [
+            entry for entry in self.inventory.list(
+                file_dir, recursive=True, kinds=['chaptered', 'audio'])
+            if not re.match(r'Part \d+$', path.relpath(
+                entry.path, file_dir).split(os.sep)[0])]
 
         # loop through all the files in dir
-        for item in sorted(file_list):
+        for entry in file_list:
 
             # Look for file types we want
-            good_file = re.search(self.regex.c, item, re.I)
-            if good_file:
-                full_path = path.join(file_dir, item)
-                book_files.append(full_path)
+            if entry.kind == 'chaptered':
+                book_files.append(entry.path)
 
             # Look for file types we can chapterize
-            bad_file = re.search(self.regex.nc, item, re.I)
-            if bad_file:
-                self.file_type = bad_file.group(1)
-                to_chapterize.append(item)
+            else:
+                self.file_type = entry.ext
+                to_chapterize.append(path.relpath(entry.path, file_dir))
 
         # See if any files need chapterizing (if enabled)
         if make_chapters:
@@ -460,65 +992,136 @@ class MHAudiobook(mh.MHObject):
 
         Sends query to ABC application to convert files into chaptered
         audiobook files based on the 'chapter_length' setting.
+
+        Parts are encoded at the same time, one per available CPU core.
+        The created files are returned in part order. If any part fails,
+        the parts still running are stopped and the rest are not started.
         """
 
         logging.info("Chapterizing audiobook files")
-        new_files = []
 
         # Get chapter parts
         file_parts = self._get_chapters(file_path, file_array,
                                         self.file_type)
+        if not file_parts:
+            return True, []
+
+        # Size worker pool
+        workers = min(len(file_parts), os.cpu_count() or 1)
+        logging.debug("Chapterizing %s parts with %s workers",
+                      len(file_parts), workers)
+
+        # Track running queries so a failure can stop them
+        running = []
+        lock = threading.Lock()
+        cancelled = threading.Event()
 
         # Create m4b for each file part
-        for i, file_part in enumerate(file_parts):
-            part_path = path.join(file_path, 'Part {0}'.format(str(i+1)))
+        new_files = [None] * len(file_parts)
+        failure = None
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for i, file_part in enumerate(file_parts):
+                future = pool.submit(self._chapterize_part, file_path,
+                                     file_part, i, (running, lock, cancelled))
+                futures[future] = i
+
+            # Collect results in part order
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                (new_file_path, output) = future.result()
+                if new_file_path is not None:
+                    new_files[futures[future]] = new_file_path
+
+                # Skip parts not yet started after the first failure
+                elif output is not None:
+                    failure = output
+                    for other in futures:
+                        other.cancel()
+
+        if failure is not None:
+            return False, failure
+
+        return True, new_files
+
+    def _chapterize_part(self, file_path, file_part, part, state):
+        """Runs ABC on a single part folder, and renames the created file
+        with the part number.
+
+        If the part fails, any other parts still running are stopped.
 
-            # Define chapter query
-            b_cmd = [self.php, '-f', self.abc,
-                     file_part,  # Path to book files
-                     self.book_info.author.encode("utf8"),  # artist
-                     self.book_info.long_title.encode("utf8"),  # album
-                     self.book_info.short_title.encode("utf8"),  # title
-                     self.book_info.genre.encode("utf8"),  # genre
-                     self.book_info.year.encode("utf8"),  # year
-                     self.file_type]  # file type
-            logging.debug("ABC query:\n%s", b_cmd)
-
-            # Process query
+        Returns a tuple of the new file path, or None on failure, and the
+        ABC output, or None if the part was stopped.
+        """
+
+        (running, lock, cancelled) = state
+        part_path = path.join(file_path, 'Part {0}'.format(str(part+1)))
+
+        # Define chapter query
+        b_cmd = [self.php, '-f', self.abc,
+                 file_part,  # Path to book files
+                 self.book_info.author.encode("utf8"),  # artist
+                 self.book_info.long_title.encode("utf8"),  # album
+                 self.book_info.short_title.encode("utf8"),  # title
+                 self.book_info.genre.encode("utf8"),  # genre
+                 self.book_info.year.encode("utf8"),  # year
+                 self.file_type]  # file type
+        logging.debug("ABC query:\n%s", b_cmd)
+
+        # Process query, unless another part has failed
+        with lock:
+            if cancelled.is_set():
+                return None, None
             b_open = Popen(b_cmd, stdout=PIPE, stderr=PIPE)
+            running.append(b_open)
 
-            # Get output
-            (output, err) = b_open.communicate()
-            logging.debug("ABC output: %s", output)
-            logging.debug("ABC err: %s", err)
+        # Get output
+        (output, err) = b_open.communicate()
+        logging.debug("ABC output: %s", output)
+        logging.debug("ABC err: %s", err)
 
-            # Close process
-            b_open.terminate()
+        # Close process
+        b_open.terminate()
 
-            # Find file names in output
-            bfiles = search(r"Audiobook \'(.*)\.m4b\' created succsessfully!",
-                            output)
-            if bfiles is None:
-                return False, output
+        # Find file names in output
+        if not isinstance(output, str):
+            output = output.decode('utf-8', 'replace')
+        bfiles = search(r"Audiobook \'(.*)\.m4b\' created succsessfully!",
+                        output)
+        if bfiles is None:
+            with lock:
 
-            # Set full file path
-            created_file = path.join(
-                part_path, '{0}.m4b'.format(bfiles.group(1)))
-            new_file_path = path.join(file_path, '{0} - {1}.m4b'.format(
-                bfiles.group(1), str(i+1)))
+                # Ignore parts stopped by another failure
+                if cancelled.is_set():
+                    return None, None
 
-            # Rename file with part #
-            move(created_file, new_file_path)
-            logging.debug("New file path: %s", new_file_path)
+                # Stop all other parts
+                cancelled.set()
+                for other in running:
+                    if other.poll() is None:
+                        other.terminate()
 
-            # Add to array
-            new_files.append(new_file_path)
+            return None, output
 
-        return True, new_files
+        # Set full file path
+        created_file = path.join(
+            part_path, '{0}.m4b'.format(bfiles.group(1)))
+        new_file_path = path.join(file_path, '{0} - {1}.m4b'.format(
+            bfiles.group(1), str(part+1)))
+
+        # Rename file with part #
+        move(created_file, new_file_path)
+        logging.debug("New file path: %s", new_file_path)
+
+        return new_file_path, output
 
     def _get_chapters(self, file_path, file_array, file_type):
         """Breaks up non-chaptered files in to folders for ABC processing.
 
+        Files are linked into each folder rather than copied, see
+        link_file(), so staging does not duplicate any audio data.
+
         Returns an array of paths to folders. Each folder is for an audiobook
         chaptered file part based on the results of _calculate_chunks().
         """
@@ -538,16 +1141,18 @@ class MHAudiobook(mh.MHObject):
             if not path.exists(part_path):
                 makedirs(part_path)
 
-            # Move files for part into new path
+            # Link files for part into new path, flattening subfolders
             for get_chunk in chunk:
                 start_path = path.join(file_path, get_chunk)
-                end_path = path.join(part_path, get_chunk)
-                copy(start_path, end_path)
+                end_path = path.join(
+                    part_path, get_chunk.replace(os.sep, ' - '))
+                link_file(start_path, end_path)
 
-            # Copy over cover image
+            # Link cover image, if one was saved
             cover_start = path.join(file_path, 'cover.jpg')
             cover_end = path.join(part_path, 'cover.jpg')
-            copy(cover_start, cover_end)
+            if path.exists(cover_start):
+                link_file(cover_start, cover_end)
 
             # Add new part folder to array
             book_chunks.append(part_path)
@@ -558,47 +1163,35 @@ class MHAudiobook(mh.MHObject):
         """Calculates how many different chaptered file parts should be made
         by ABC based on the 'chapter_length' setting.
 
+        Parts are balanced by the duration of their files, see plan_parts(),
+        so that no part is much longer than the others.
+
         Returns an array of arrays containing the paths to the non-chaptered
         files for each new part.
         """
 
         # Defaults
         file_type = file_type.upper()
-        total_length = 0
-        book_parts = 0
+        lengths = []
+
+        # Import mutagen audio class for file type
+        (audio_mod, audio_class) = getattr(self.audio, file_type)
+        audio_type = getattr(import_module(audio_mod), audio_class)
 
-        # Sum all the file durations
+        # Get all the file durations
         for get_file in file_array:
             full_path = path.join(file_path, get_file)
-            audio_track = getattr(self.audio, file_type)(full_path)
-            total_length += audio_track.info.length
+            audio_track = audio_type(full_path)
+            lengths.append(audio_track.info.length)
             logging.debug("%s:  %s", get_file, audio_track.info.length)
-        logging.debug("Total book length: %s seconds", total_length)
-
-        # Check against defined max part length
-        if total_length <= self.max_length:
-            book_parts = 1
-            logging.debug("Parts: %s", book_parts)
-            chunks = [file_array]
-
-        # Determine how many parts should be made
-        else:
-            book_parts = int(ceil(total_length / self.max_length))
-            logging.debug("Parts: %s", book_parts)
-
-            # Count files
-            logging.debug("File count: %s", len(file_array))
-
-            # Calculate array chunk size
-            array_chunk = int(ceil(len(file_array) / book_parts))
-            logging.debug("Array chunks: %s", array_chunk)
-
-            # Create array chunks
-            if array_chunk > 0:
-                chunks = [file_array[x:x+array_chunk]
-                          for x in XRANGE(0, len(file_array), array_chunk)]
-            else:
-                chunks = [file_array]
+        logging.debug("Total book length: %s seconds", sum(lengths))
+
+        # Balance the parts by duration
+        bounds = plan_parts(lengths, self.max_length)
+        logging.debug("Parts: %s", len(bounds))
+        for (start, end) in bounds:
+            logging.debug("Part length: %s seconds", sum(lengths[start:end]))
+        chunks = [file_array[start:end] for (start, end) in bounds]
 
         return chunks
 
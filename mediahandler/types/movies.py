@@ -26,10 +26,11 @@ Module contains:
 
 import os
 import logging
-from re import escape, search
+from re import escape
 import ntpath
 
 import mediahandler.types
+import mediahandler.util.output as Output
 
 
 class MHMovie(mediahandler.types.MHMediaType):
@@ -92,13 +93,14 @@ class MHMovie(mediahandler.types.MHMediaType):
         mov_find = r'{0}{1}(.*\(\d{{4}}\))'.format(
             epath, escape(os.path.sep))
         logging.debug('Search query: %s', mov_find)
+        mov_find = Output.get_pattern(mov_find)
 
         # See what movies were added
         new_added_files = []
         for added_file in added_files:
 
             # Extract info
-            movie = search(mov_find, added_file)
+            movie = mov_find.search(added_file)
             if movie is None:
                 continue
 
@@ -26,9 +26,10 @@ Module contains:
 
 import os
 import logging
-from re import escape, search, sub, IGNORECASE
+from re import escape, sub, IGNORECASE
 
 import mediahandler.types
+import mediahandler.util.output as Output
 
 
 class MHTv(mediahandler.types.MHMediaType):
@@ -91,13 +92,14 @@ class MHTv(mediahandler.types.MHMediaType):
         tv_find = r'{path}{s}(.*){s}(.*){s}.*\.S\d{{2,4}}E(\d{{2,3}})'.format(
             path=epath, s=escape(os.path.sep))
         logging.debug("Search query: %s", tv_find)
+        tv_find = Output.get_pattern(tv_find, IGNORECASE)
 
         # See what TV files were added
         new_added_files = []
         for added_file in added_files:
 
             # Extract info
-            ep_info = search(tv_find, added_file, IGNORECASE)
+            ep_info = tv_find.search(added_file)
             if ep_info is None:
                 continue
 
@@ -25,17 +25,41 @@ Submodules:
     - |mediahandler.util.args|
         Retrieves and parses argument input from the CLI.
 
+    - |mediahandler.util.cleanup|
+        Removes left over files in a low-priority background process.
+
     - |mediahandler.util.config|
         Retrieves and parses user settings from the configuration
         file provided.
 
+    - |mediahandler.util.daemon|
+        Runs a resident daemon which processes queued add_media() jobs.
+
+    - |mediahandler.util.digest|
+        Buffers success notifications and sends them as a single digest.
+
     - |mediahandler.util.extract|
-        Uses Filebot to extract compressed files for processing.
+        Extracts compressed files for processing, in-process or via Filebot.
+
+    - |mediahandler.util.filebot|
+        Runs Filebot commands, optionally via a warm Filebot process.
+
+    - |mediahandler.util.inventory|
+        Scans and classifies media folder contents once per job.
 
     - |mediahandler.util.notify|
         Sends push notifications out via 3rd party services.
 
+    - |mediahandler.util.outbox|
+        Stores push notifications and delivers them in the background.
+
+    - |mediahandler.util.output|
+        Parses Filebot and Beets output line by line as it is produced.
+
     - |mediahandler.util.torrent|
         Removes torrents from Deluge upon completion.
 
+    - |mediahandler.util.watch|
+        Watches download folders and queues new media once it settles.
+
 """
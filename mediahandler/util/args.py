@@ -25,6 +25,8 @@ Module contains:
               Retrieves full parser object for CLI args.
           - |get_deluge_parser|
               Retrieves abbreviated parser for Deluge args.
+          - |get_daemon_parser|
+              Retrieves abbreviated parser for daemon args.
 
     - Custom argparse.Action validation objects
         - |MHMediaAction|
@@ -39,6 +41,8 @@ Module contains:
             Wrapper for the 'addmedia' CLI.
         - |get_deluge_arguments()|
             Wrapper for the 'addmedia-deluge' CLI.
+        - |get_daemon_arguments()|
+            Wrapper for the 'addmedia-daemon' CLI.
         - |get_add_media_args()|
             Wrapper for the mediahandler.handler.add_media() function.
 
@@ -51,7 +55,6 @@ from re import match, I
 
 import mediahandler as mh
 import mediahandler.util.config as Config
-import mediahandler.util.torrent as Torrent
 
 
 # Custom argparse validation
@@ -397,6 +400,47 @@ def get_deluge_parser():
     return parser
 
 
+def get_daemon_parser():
+    """Returns the custom MHParser object for mediahandler usage.
+
+    Sets up the MHParser object details and adds all of the arguments used
+    by the mediahandler CLI 'addmedia-daemon' script.
+    """
+
+    # Initialize daemon parser
+    parser = MHParser(
+        prog='addmedia-daemon',
+        formatter_class=argparse.RawTextHelpFormatter,
+        add_help=False,
+        usage='%(prog)s [--config CONFIG]',
+        epilog=(
+            'While the daemon is running, the addmedia and ' +
+            'addmedia-deluge scripts\nhand their jobs off to it ' +
+            'and return immediately.'),
+    )
+
+    # Create main options group
+    options = parser.add_argument_group('daemon options')
+
+    # Custom config file option
+    options.add_argument(
+        '-c', '--config', default=Config.make_config(),
+        help=(
+            'Set a custom config file path.\n' +
+            'Default: ~/.config/mediahandler/config.yml\n '),
+        action=MHFilesAction,
+    )
+
+    # Show help option
+    options.add_argument(
+        '-h', '--help',
+        help='Show this help message and exit\n ',
+        action='help'
+    )
+
+    return parser
+
+
 # Argument parser wrapper functions
 
 def get_deluge_arguments():
@@ -404,8 +448,9 @@ def get_deluge_arguments():
     get_deluge_parser() to validate them.
 
     Returns the full file path to the config file in use and a dict of
-    validated arguments from the MHParser object. Also removes the torrent
-    from Deluge, if the user's settings allow it.
+    validated arguments from the MHParser object, including the torrent
+    hash, which is used to remove the torrent from Deluge once the media
+    has been added.
     """
 
     # Retreive full parser
@@ -427,14 +472,25 @@ def get_deluge_arguments():
     # Remove config to return separately
     config = all_args.pop('config')
 
-    # Remove torrent
-    settings = Config.parse_config(config)['Deluge']
-    if settings['enabled']:
-        Torrent.remove_deluge_torrent(settings, new_args['hash'])
+    # Keep torrent hash for removal after the import
+    all_args['hash'] = new_args['hash']
 
     return config, all_args
 
 
+def get_daemon_arguments():
+    """Retrieves CLI arguments from the 'addmedia-daemon' script and uses
+    get_daemon_parser() to validate them.
+
+    Returns the full file path to the config file in use.
+    """
+
+    # Get validated args from parser
+    new_args = get_daemon_parser().parse_args().__dict__
+
+    return new_args['config']
+
+
 def get_arguments(deluge=False):
     """Retrieves CLI arguments from the 'addmedia' script and uses
     get_parser() to validate them.
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.cleanup
+
+Module contains:
+
+    - |MHCleanup|
+        Persistent queue of left over files and folders, removed by a
+        low-priority background worker process.
+
+    - |remove_later()|
+        Queues files and folders for removal and starts a worker.
+
+"""
+
+import os
+import sys
+import json
+import logging
+from time import time, sleep
+from shutil import which
+from subprocess import Popen, DEVNULL
+
+import mediahandler as mh
+from mediahandler.util.config import get_cache_path, LOG_FORMAT
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class MHCleanup(mh.MHObject):
+    """Persistent queue of left over files and folders to remove.
+
+    Each job's paths are stored as a JSON file in the queue folder, so
+    nothing is lost if the worker stops before it is done. The worker
+    runs as a separate process at idle CPU and disk priority, deletes
+    folders from the bottom up in small batches, and retries paths which
+    are still busy with an increasing delay. Only one worker removes
+    files at a time.
+
+    Required arguments:
+        - folder
+            Path to the queue folder.
+
+    Optional arguments:
+        - retries
+            Number of times to retry busy paths before giving up.
+        - backoff
+            Number of seconds to wait before the first retry. The wait
+            doubles with each retry.
+        - batch
+            Number of files to remove between pauses.
+
+    Public methods:
+
+        - put()
+            Adds a list of paths to the queue.
+
+        - start()
+            Starts a background worker process.
+
+        - run()
+            Removes everything in the queue, then returns.
+
+        - wait()
+            Waits for the background worker process to finish.
+    """
+
+    def __init__(self, folder, retries=5, backoff=2, batch=200):
+        """Initializes the MHCleanup object.
+        """
+
+        super(MHCleanup, self).__init__()
+
+        self.folder = folder
+        self.retries = retries
+        self.backoff = backoff
+        self.batch = batch
+        self.pause = 0.05
+        self.process = None
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    def put(self, paths):
+        """Adds a list of paths to the queue, to be removed in order.
+
+        Returns the name of the queue entry.
+        """
+
+        name = '{0:.6f}-{1}.json'.format(time(), os.getpid())
+        entry = {
+            'paths': [os.path.abspath(item) for item in paths],
+            'attempts': 0,
+            'due': 0,
+        }
+        self._write(name, entry)
+        logging.debug("Queued for removal: %s", entry['paths'])
+
+        return name
+
+    def _write(self, name, entry):
+        """Writes a queue entry, replacing it in a single step so the
+        worker never reads a partial entry.
+        """
+
+        entry_path = os.path.join(self.folder, name)
+        tmp_path = '{0}.tmp'.format(entry_path)
+        with open(tmp_path, 'w') as entry_io:
+            entry_io.write(json.dumps(entry))
+        os.replace(tmp_path, entry_path)
+
+    def _load(self):
+        """Returns a sorted list of (name, entry) tuples in the queue.
+        """
+
+        entries = []
+        for name in sorted(os.listdir(self.folder)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, name)) as entry_io:
+                    entries.append((name, json.loads(entry_io.read())))
+            except (OSError, ValueError):
+                logging.warning("Unable to read cleanup entry: %s", name)
+                self._discard(name)
+
+        return entries
+
+    def _discard(self, name):
+        """Removes an entry from the queue.
+        """
+        try:
+            os.remove(os.path.join(self.folder, name))
+        except OSError:
+            pass
+
+    def start(self):
+        """Starts a background worker process at idle CPU and disk
+        priority, where the system supports it.
+
+        The worker is started in its own session, so it keeps running
+        after this process exits. It logs to the same file, at the same
+        level, as this process, if logging to a file is enabled.
+        """
+
+        cmd = [sys.executable, '-m', 'mediahandler.util.cleanup', self.folder]
+
+        # Pass on log file settings
+        root = logging.getLogger()
+        for handler in root.handlers:
+            if isinstance(handler, logging.FileHandler):
+                cmd += [handler.baseFilename, str(root.level)]
+                break
+
+        # Lower priority
+        if which('nice'):
+            cmd = ['nice', '-n', '19'] + cmd
+        if which('ionice'):
+            cmd = ['ionice', '-c', '3'] + cmd
+
+        logging.debug("Starting cleanup worker")
+        self.process = Popen(
+            cmd, stdin=DEVNULL, stdout=DEVNULL, stderr=DEVNULL,
+            close_fds=True, start_new_session=True)
+
+        return self.process
+
+    def wait(self, timeout=None):
+        """Waits up to 'timeout' seconds for the background worker
+        process to finish.
+        """
+        if self.process is not None:
+            self.process.wait(timeout)
+
+    def run(self):
+        """Removes everything in the queue, waiting for any busy paths to
+        be retried, then returns.
+
+        Waits for any other worker to finish first.
+        """
+
+        with open(os.path.join(self.folder, '.lock'), 'a') as lock_io:
+            if fcntl is not None:
+                fcntl.flock(lock_io.fileno(), fcntl.LOCK_EX)
+
+            while True:
+                entries = self._load()
+                if not entries:
+                    break
+
+                # Wait for the next retry
+                now = time()
+                due = [(name, entry) for (name, entry) in entries
+                       if entry['due'] <= now]
+                if not due:
+                    sleep(min(entry['due'] for (_, entry) in entries) - now)
+                    continue
+
+                for (name, entry) in due:
+                    self._process(name, entry)
+
+    def _process(self, name, entry):
+        """Removes the paths in a queue entry, and schedules a retry for
+        any which could not be removed.
+        """
+
+        remaining = [item for item in entry['paths']
+                     if not self._remove(item)]
+
+        # Done
+        if not remaining:
+            self._discard(name)
+            return
+
+        # Give up
+        entry['attempts'] += 1
+        if entry['attempts'] > self.retries:
+            logging.error("Unable to remove: %s", ', '.join(remaining))
+            self._discard(name)
+            return
+
+        # Retry later
+        delay = self.backoff * 2 ** (entry['attempts'] - 1)
+        logging.debug("Retrying removal in %ss: %s", delay, remaining)
+        entry['paths'] = remaining
+        entry['due'] = time() + delay
+        self._write(name, entry)
+
+    def _remove(self, item):
+        """Removes a file or folder, pausing after every batch of files.
+
+        Returns True if nothing is left at the path.
+        """
+
+        # Remove a single file or link
+        if os.path.islink(item) or not os.path.isdir(item):
+            return self._try(os.remove, item)
+
+        # Remove folder contents from the bottom up
+        removed = 0
+        for (root, dirs, files) in os.walk(item, topdown=False):
+            for name in files + dirs:
+                child = os.path.join(root, name)
+                if os.path.isdir(child) and not os.path.islink(child):
+                    self._try(os.rmdir, child)
+                    continue
+                if self._try(os.remove, child):
+                    removed += 1
+                    if removed % self.batch == 0:
+                        sleep(self.pause)
+
+        return self._try(os.rmdir, item)
+
+    @staticmethod
+    def _try(func, item):
+        """Runs a removal function on a path.
+
+        Returns True if the path is gone, or False if it is busy or
+        otherwise could not be removed.
+        """
+
+        try:
+            func(item)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logging.debug("Unable to remove %s: %s", item, exc)
+            return False
+
+        return True
+
+    def __repr__(self):
+        return '<MHCleanup {0}>'.format(self.__dict__)
+
+
+def remove_later(paths):
+    """Queues a list of paths for removal, in order, and starts a
+    background worker process to remove them.
+
+    Returns the MHCleanup object.
+    """
+
+    cleanup = MHCleanup(get_cache_path('cleanup'))
+    cleanup.put(paths)
+    cleanup.start()
+
+    return cleanup
+
+
+def main(args):
+    """Entry point for the background worker process.
+
+    Required arguments:
+        - args
+            List of the queue folder path, optionally followed by the
+            log file path and log level to use.
+    """
+
+    # Set up logging, since the worker's output is discarded
+    if len(args) > 2:
+        logging.basicConfig(
+            filename=args[1], format=LOG_FORMAT, level=int(args[2]))
+
+    try:
+        MHCleanup(args[0]).run()
+    except Exception:
+        logging.exception("Cleanup worker stopped")
+        raise
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
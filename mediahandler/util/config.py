@@ -25,20 +25,25 @@ Module contains:
     - |parse_config()|
         Parses a yaml configuration file and returns a dict of the settings.
 
+    - |get_cache_path()|
+        Returns a path within the mediahandler cache folder.
+
 """
 
 import os
+import json
 import shutil
 import logging
-from importlib import import_module
+from copy import deepcopy
+from hashlib import sha1
+from importlib.util import find_spec
+from importlib.machinery import PathFinder
 
 import mediahandler as mh
 import mediahandler.util as Util
 
-try:
-    import yaml
-except ImportError:
-    pass
+# Compiled settings already loaded by this process, by config file path
+_CONFIG_MEMO = {}
 
 
 def make_config(new_file=None):
@@ -105,8 +110,22 @@ def parse_config(file_path):
     Uses settings.yml validation structure to build missing and default
     values. Sends values to the correct _get_valid_<type>() function
     for validation.
+
+    Compiled settings are cached on disk until one of the yaml files or
+    the $PATH changes, so repeat runs skip yaml parsing and the search
+    for required modules and applications.
     """
 
+    # Use compiled settings, if still valid
+    cache_key = _get_config_cache_key(file_path)
+    settings = _load_config_cache(file_path, cache_key)
+    if settings is not None:
+        if settings['Logging']['enabled']:
+            _init_logging(settings)
+            logging.info('Logging enabled')
+        logging.debug("Using compiled settings for %s", file_path)
+        return settings
+
     # Read yaml files
     parsed = _get_yaml(file_path)
     struct = _get_yaml(os.path.join(mh.__mediaextras__, 'settings.yml'))
@@ -173,7 +192,124 @@ def parse_config(file_path):
     # Check that appropriate modules are installed
     _check_modules(settings)
 
-    return settings
+    # Save compiled settings
+    _save_config_cache(file_path, cache_key, settings)
+
+    return deepcopy(settings)
+
+
+def get_cache_path(*paths):
+    """Returns a path within the mediahandler cache folder.
+
+    The cache folder is used for runtime data such as job queues and
+    sockets, and is created if it does not exist yet.
+    """
+
+    # Make sure the cache folder exists
+    if not os.path.exists(mh.__mediacache__):
+        os.makedirs(mh.__mediacache__, exist_ok=True)
+
+    return os.path.join(mh.__mediacache__, *paths)
+
+
+def _get_config_cache_key(file_path):
+    """Returns a key which changes whenever the compiled settings for a
+    configuration file may be out of date.
+
+    Made from the size and modification time of the configuration file,
+    settings.yml and require.yml, the $PATH and the mediahandler version.
+    """
+
+    key = [mh.__version__, os.environ.get('PATH', '')]
+
+    # Look at each yaml file
+    for yaml_file in [file_path,
+                      os.path.join(mh.__mediaextras__, 'settings.yml'),
+                      os.path.join(mh.__mediaextras__, 'require.yml')]:
+        stat = os.stat(yaml_file)
+        key.append('{0}:{1}:{2}'.format(
+            os.path.abspath(yaml_file), stat.st_mtime_ns, stat.st_size))
+
+    return sha1('\n'.join(key).encode('utf-8')).hexdigest()
+
+
+def _get_config_cache_file(file_path):
+    """Returns the path to the compiled settings file for a configuration
+    file.
+    """
+    name = sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return get_cache_path('config-{0}.json'.format(name[:10]))
+
+
+def _load_config_cache(file_path, cache_key):
+    """Returns a copy of the compiled settings for a configuration file, or
+    None if there are none or they are out of date.
+    """
+
+    file_path = os.path.abspath(file_path)
+
+    # Look in memory first
+    memo = _CONFIG_MEMO.get(file_path)
+    if memo is not None and memo[0] == cache_key:
+        return deepcopy(memo[1])
+
+    # Read compiled settings file
+    try:
+        with open(_get_config_cache_file(file_path)) as cache_io:
+            cache = json.load(cache_io)
+    except (IOError, ValueError):
+        return None
+
+    # Check compiled settings are current
+    if not isinstance(cache, dict) or cache.get('key') != cache_key:
+        return None
+
+    # Make sure applications found before are still installed
+    for app_path in cache.get('apps', []):
+        if not os.path.isfile(app_path):
+            return None
+
+    _CONFIG_MEMO[file_path] = (cache_key, cache['settings'])
+
+    return deepcopy(cache['settings'])
+
+
+def _save_config_cache(file_path, cache_key, settings):
+    """Saves the compiled settings for a configuration file.
+
+    Failing to save is not an error, the settings are simply compiled
+    again on the next run.
+    """
+
+    file_path = os.path.abspath(file_path)
+    _CONFIG_MEMO[file_path] = (cache_key, deepcopy(settings))
+
+    # Collect application paths found by _check_modules()
+    require = _get_yaml(os.path.join(mh.__mediaextras__, 'require.yml'))
+    apps = []
+    for section in require:
+        for app in require[section].get('apps', []):
+            app_path = settings[section].get(app['name'].lower())
+            if app_path is not None:
+                apps.append(app_path)
+
+    # Write compiled settings file atomically, readable only by the user
+    # since the settings include API keys and passwords
+    cache_file = _get_config_cache_file(file_path)
+    tmp_file = cache_file + '.tmp'
+    try:
+        cache_fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                           0o600)
+        with os.fdopen(cache_fd, 'w') as cache_io:
+            json.dump({
+                'key': cache_key,
+                'apps': sorted(set(apps)),
+                'settings': settings,
+            }, cache_io)
+        os.chmod(tmp_file, 0o600)
+        os.replace(tmp_file, cache_file)
+    except (IOError, OSError, TypeError) as exc:
+        logging.debug("Unable to save compiled settings: %s", exc)
 
 
 def _modify_config_for_windows(config_file):
@@ -186,6 +322,9 @@ def _modify_config_for_windows(config_file):
     form = config['TV']['format']
     config['TV']['format'] = os.path.join(*form.split('/')).replace('\'', '"')
 
+    # Import module
+    import yaml
+
     # Write changes to the file
     with open(config_file, 'w') as config_io:
         yaml.dump(config, config_io, indent=4, default_flow_style=False)
@@ -287,6 +426,9 @@ def _get_yaml(yaml_file):
     """Retrieves and parses a yaml file.
     """
 
+    # Import module
+    import yaml
+
     # Read yaml file
     with open(yaml_file) as yaml_io:
         yaml_contents = yaml_io.read()
@@ -297,6 +439,10 @@ def _get_yaml(yaml_file):
     return contents
 
 
+# Format of log file lines
+LOG_FORMAT = '%(asctime)s - %(filename)s - %(levelname)s - %(message)s'
+
+
 def _init_logging(settings):
     """Turns on logging for the mediahandler object.
 
@@ -323,18 +469,10 @@ def _init_logging(settings):
     # Config logging
     logging.basicConfig(
         filename=log_file,
-        format='%(asctime)s - %(filename)s - %(levelname)s - %(message)s',
+        format=LOG_FORMAT,
         level=log_level,
     )
 
-    # Enable deluge logging
-    if settings['Deluge']['enabled']:
-        from deluge import log
-        try:
-            log.setupLogger()
-        except AttributeError:
-            log.setup_logger()
-
 
 def _check_modules(settings):
     """Looks for modules and applications required by user-enabled options.
@@ -372,23 +510,31 @@ def _check_modules(settings):
 
 
 def _find_module(parent_mod, sub_mod):
-    """Attempts to load a python module.
+    """Looks for a python module without importing it, so checking for
+    heavy dependencies does not slow down start-up.
 
     Raises an ImportError if a python module and submodule is not installed
     on the user's system.
     """
 
     try:
-        # Attempt to import the module
-        import_module('{0}.{1}'.format(parent_mod, sub_mod))
+        # Locate the parent package
+        parent = find_spec(parent_mod)
+
+        # Locate the submodule within it
+        if parent is not None and parent.submodule_search_locations:
+            found = PathFinder.find_spec(
+                sub_mod, parent.submodule_search_locations)
+            if found is not None:
+                return True
 
-        return True
+    except (ImportError, ValueError):
+        pass
 
-    except ImportError:
-        # Otherwise raise an Import error
-        err_msg = 'Module {0}.{1} is not installed'.format(parent_mod, sub_mod)
+    # Otherwise raise an Import error
+    err_msg = 'Module {0}.{1} is not installed'.format(parent_mod, sub_mod)
 
-        raise ImportError(err_msg)
+    raise ImportError(err_msg)
 
 
 def _find_app(settings, app):
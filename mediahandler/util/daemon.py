@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.daemon
+
+Module contains:
+
+    - |MHDaemon|
+        A resident process which keeps a configured MHandler object warm
+        and processes add_media() jobs received over a local UNIX socket.
+
+    - |MHJobQueue|
+        A persistent first-in, first-out queue of add_media() jobs.
+
+    - |send_job()|
+        Hands a job off to a running daemon, if there is one.
+
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+from time import time
+from hashlib import sha1
+from collections import deque
+
+import mediahandler as mh
+from mediahandler.util.config import get_cache_path
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+
+def _get_config_key(config):
+    """Returns a short unique key for a configuration file path.
+    """
+    config_path = os.path.abspath(config).encode('utf-8')
+    return sha1(config_path).hexdigest()[:10]
+
+
+def get_socket_path(config):
+    """Returns the path to the UNIX socket of the daemon which uses the
+    provided configuration file.
+    """
+    key = _get_config_key(config)
+    return get_cache_path('addmedia-{0}.sock'.format(key))
+
+
+def get_queue_path(config):
+    """Returns the path to the job queue folder of the daemon which uses the
+    provided configuration file.
+    """
+    key = _get_config_key(config)
+    return get_cache_path('queue-{0}'.format(key))
+
+
+def send_job(config, args, timeout=5):
+    """Sends an add_media() job to a running daemon.
+
+    Required arguments:
+        - config
+            Path to the configuration file used by the daemon.
+        - args
+            Dict of validated add_media() arguments.
+
+    Returns the ID of the queued job, or None if no daemon is listening
+    for the configuration file or the job was not accepted.
+    """
+
+    # Check that UNIX sockets are supported
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    # Look for the daemon's socket
+    socket_path = get_socket_path(config)
+    if not os.path.exists(socket_path):
+        return None
+
+    # Send job to the daemon
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(args).encode('utf-8') + b'\n')
+        reply = client.makefile('rb').readline()
+    except (socket.error, socket.timeout) as exc:
+        logging.debug("Daemon not reachable: %s", exc)
+        return None
+    finally:
+        client.close()
+
+    # Decode reply
+    try:
+        reply = json.loads(reply.decode('utf-8'))
+    except ValueError:
+        return None
+
+    # Check that the job was queued
+    if reply.get('status') != 'queued':
+        logging.warning("Job rejected by daemon: %s", reply.get('error'))
+        return None
+
+    logging.info("Job queued by daemon: %s", reply['id'])
+
+    return reply['id']
+
+
+class MHJobQueue(object):
+    """A persistent first-in, first-out queue of add_media() jobs.
+
+    Each job is stored as a JSON file in the queue folder, so queued jobs
+    survive a restart of the daemon.
+
+    Required argument:
+        - folder
+            Path to the folder used to store queued jobs.
+    """
+
+    def __init__(self, folder):
+        """Initializes the MHJobQueue object and loads any jobs left over
+        from a previous run.
+        """
+
+        self.folder = folder
+        self.count = 0
+        self.cond = threading.Condition()
+
+        # Make sure queue folder exists
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        # Load pending jobs in order
+        self.jobs = deque(sorted(
+            job[:-5] for job in os.listdir(self.folder)
+            if job.endswith('.json')))
+        logging.debug("Loaded %s queued jobs", len(self.jobs))
+
+    def _get_job_path(self, job_id):
+        """Returns the file path of a queued job.
+        """
+        return os.path.join(self.folder, '{0}.json'.format(job_id))
+
+    def put(self, args):
+        """Adds a job to the queue and returns its ID.
+        """
+
+        with self.cond:
+            self.count += 1
+            job_id = '{0:020.6f}-{1:06d}'.format(time(), self.count)
+
+            # Write job to file atomically
+            job_path = self._get_job_path(job_id)
+            with open(job_path + '.tmp', 'w') as job_io:
+                json.dump(args, job_io)
+            os.rename(job_path + '.tmp', job_path)
+
+            # Wake up the worker
+            self.jobs.append(job_id)
+            self.cond.notify()
+
+        return job_id
+
+    def get(self, timeout=None):
+        """Returns the next job in the queue as a tuple of its ID and
+        arguments, waiting up to 'timeout' seconds for one to arrive.
+
+        Returns None if no job is available.
+        """
+
+        with self.cond:
+            while True:
+                if not self.jobs:
+                    self.cond.wait(timeout)
+                if not self.jobs:
+                    return None
+
+                job_id = self.jobs.popleft()
+
+                # Read job from file
+                try:
+                    with open(self._get_job_path(job_id)) as job_io:
+                        return job_id, json.load(job_io)
+                except (IOError, ValueError) as exc:
+                    logging.error("Unable to read job %s: %s", job_id, exc)
+                    self.done(job_id)
+
+    def done(self, job_id):
+        """Removes a finished job from the queue folder.
+        """
+        job_path = self._get_job_path(job_id)
+        if os.path.exists(job_path):
+            os.unlink(job_path)
+
+    def __len__(self):
+        return len(self.jobs)
+
+
+class _MHRequestHandler(socketserver.StreamRequestHandler):
+    """Reads a single job from a client connection and queues it.
+    """
+
+    def handle(self):
+        """Queues the job sent by the client and replies with its ID.
+        """
+
+        # Read job
+        try:
+            args = json.loads(self.rfile.readline().decode('utf-8'))
+            if not isinstance(args, dict):
+                raise ValueError('Job must be a JSON object')
+            job_id = self.server.queue.put(args)
+            reply = {'status': 'queued', 'id': job_id}
+            logging.info("Queued job %s: %s", job_id, args.get('media'))
+        except ValueError as exc:
+            reply = {'status': 'error', 'error': str(exc)}
+            logging.error("Invalid job received: %s", exc)
+
+        # Send reply
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class _MHSocketServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    """Threaded UNIX socket server which hands jobs to a MHJobQueue.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, queue):
+        self.queue = queue
+        socketserver.UnixStreamServer.__init__(
+            self, socket_path, _MHRequestHandler)
+
+
+class MHDaemon(mh.MHObject):
+    """A resident process which keeps a configured MHandler object warm
+    and processes add_media() jobs received over a local UNIX socket.
+
+    Configuration, notification sessions and imported media type modules
+    are only loaded once, when the daemon starts.
+
+    Required argument:
+        - handler
+            A configured MHandler object.
+
+    Public methods:
+
+        - serve()
+            Listens for jobs and processes them until stopped.
+
+        - stop()
+            Stops the daemon after the current job.
+
+        - run_next()
+            Processes the next job in the queue.
+    """
+
+    def __init__(self, handler):
+        """Initializes the MHDaemon object.
+        """
+
+        super(MHDaemon, self).__init__()
+
+        # Set up class members
+        self.handler = handler
+        self.socket_path = get_socket_path(handler.config)
+        self.queue = MHJobQueue(get_queue_path(handler.config))
+        self.server = None
+        self.running = False
+
+    def _check_socket(self):
+        """Makes sure no other daemon is using the socket and removes it
+        if it was left over from a previous run.
+        """
+
+        if not os.path.exists(self.socket_path):
+            return
+
+        # Check for a running daemon
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(self.socket_path)
+        except socket.error:
+            logging.debug("Removing stale socket: %s", self.socket_path)
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(
+                "Daemon already running: {0}".format(self.socket_path))
+        finally:
+            client.close()
+
+    def serve(self):
+        """Listens for jobs on the daemon's socket and processes them in
+        order until stop() is called.
+        """
+
+        logging.info("Starting daemon on %s", self.socket_path)
+
+        # Set up socket server
+        self._check_socket()
+        self.server = _MHSocketServer(self.socket_path, self.queue)
+
+        # Accept jobs in the background
+        listener = threading.Thread(target=self.server.serve_forever)
+        listener.daemon = True
+        listener.start()
+
+        # Process jobs until stopped
+        self.running = True
+        try:
+            while self.running:
+                self.run_next(timeout=1)
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logging.info("Daemon stopped")
+
+    def stop(self, *args):
+        """Stops the daemon after the current job has been processed.
+
+        Accepts and ignores extra arguments so it may be used as a
+        signal handler.
+        """
+        self.running = False
+
+    def run_next(self, timeout=None):
+        """Processes the next job in the queue via the MHandler object.
+
+        Returns the add_media() results, or None if no job was processed
+        or the job failed.
+        """
+
+        job = self.queue.get(timeout)
+        if job is None:
+            return None
+
+        (job_id, args) = job
+        logging.info("Starting job %s: %s", job_id, args.get('media'))
+
+        # Send to handler
+        result = None
+        try:
+            result = self.handler.add_media(validated=True, **args)
+        except SystemExit as exc:
+            logging.warning("Job %s failed: %s", job_id, exc)
+        except Exception:
+            logging.exception("Job %s raised an error", job_id)
+        finally:
+            self.queue.done(job_id)
+
+        return result
+
+    def __repr__(self):
+        return '<MHDaemon {0}>'.format(self.__dict__)
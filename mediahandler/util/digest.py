@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.digest
+
+Module contains:
+
+    - |MHDigest|
+        Buffers success notifications from any number of jobs and sends
+        them as a single digest message.
+
+    - |make_digest()|
+        Builds a digest message from lists of added and skipped files.
+
+"""
+
+import json
+import logging
+import threading
+from time import time
+from re import match
+
+import mediahandler as mh
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _format_range(numbers):
+    """Formats a list of numbers as ranges, e.g. '1-3, 5'.
+    """
+
+    ranges = []
+    for number in sorted(set(numbers)):
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+
+    return ', '.join(
+        str(start) if start == end else '{0}-{1}'.format(start, end)
+        for (start, end) in ranges)
+
+
+def make_digest(added, skipped):
+    """Builds a digest message from lists of added and skipped files.
+
+    TV episodes are grouped by show and season with their episode numbers
+    as ranges, e.g. "Show (Season 1, Episodes 1-3, 5)". Other media is
+    listed once each, in the order it was added.
+
+    Returns a tuple of the message text and title.
+    """
+
+    # Group TV episodes
+    lines = []
+    seasons = {}
+    for item in added:
+        episode = match(r'^(.*) \((Season \d+), Episode (\d+)\)$', item)
+        if episode is None:
+            if item not in lines:
+                lines.append(item)
+            continue
+
+        # Keep first position of each show and season
+        key = (episode.group(1), episode.group(2))
+        if key not in seasons:
+            seasons[key] = []
+            lines.append(key)
+        seasons[key].append(int(episode.group(3)))
+
+    # Format TV episodes
+    for (i, line) in enumerate(lines):
+        if not isinstance(line, tuple):
+            continue
+        episodes = seasons[line]
+        label = 'Episode' if len(set(episodes)) == 1 else 'Episodes'
+        lines[i] = '{0} ({1}, {2} {3})'.format(
+            line[0], line[1], label, _format_range(episodes))
+
+    # Set message
+    conn_text = ''
+    conn_title = 'Media Added'
+    if lines:
+        conn_text = '+ {0}\n'.format('\n+ '.join(lines))
+
+    # Set skipped message
+    skipped = [item for (i, item) in enumerate(skipped)
+               if item not in skipped[:i]]
+    if skipped:
+        skipped_msg = 'Skipped files:\n- {0}\n'.format('\n- '.join(skipped))
+        conn_text = '{0}\n{1}'.format(conn_text, skipped_msg).lstrip('\n')
+        conn_title = '{0} (with Skips)'.format(conn_title)
+
+    return conn_text, conn_title
+
+
+class MHDigest(mh.MHObject):
+    """Buffers success notifications from any number of jobs and sends
+    them as a single digest message once the digest window closes.
+
+    The buffer is kept in a locked file, so jobs in other processes are
+    added to the same digest. The process which opens the window sends
+    the digest when it closes. If it stops before then, the next process
+    to add to the buffer, or to leave it, once the window has closed
+    sends it instead.
+
+    The window's timer does not keep a process running, so a process
+    which exits before the window closes should call close() or leave()
+    first.
+
+    Required arguments:
+        - send
+            Function called as send(message, title) to send the digest.
+        - window
+            Number of seconds to buffer notifications for.
+        - path
+            Path to the buffer file.
+
+    Public methods:
+
+        - add()
+            Adds the results of a job to the digest.
+
+        - flush()
+            Sends the digest now.
+
+        - wait()
+            Waits for the digest window to close.
+
+        - close()
+            Sends the digest now, without waiting for the window to
+            close.
+
+        - leave()
+            Sends the digest now only if its window has closed, and
+            otherwise leaves it for the next process.
+    """
+
+    def __init__(self, send, window, path):
+        """Initializes the MHDigest object.
+        """
+
+        super(MHDigest, self).__init__()
+
+        self.send = send
+        self.window = window
+        self.path = path
+        self.timer = None
+
+    def _update(self, update):
+        """Applies an update function to the buffer while holding its lock,
+        and returns the update's result.
+        """
+
+        with open(self.path, 'a+') as buffer_io:
+            if fcntl is not None:
+                fcntl.flock(buffer_io.fileno(), fcntl.LOCK_EX)
+
+            # Read buffer
+            buffer_io.seek(0)
+            try:
+                buffer = json.loads(buffer_io.read())
+            except ValueError:
+                buffer = {'opened': None, 'events': []}
+
+            # Update buffer
+            result = update(buffer)
+
+            # Write buffer
+            buffer_io.seek(0)
+            buffer_io.truncate()
+            buffer_io.write(json.dumps(buffer))
+
+        return result
+
+    def add(self, added, skipped):
+        """Adds the results of a job to the digest.
+
+        Returns True if this process will send the digest.
+        """
+
+        def _add(buffer):
+            now = time()
+            opened = buffer['opened']
+
+            # Open a new window, or take over one left open by a process
+            # which stopped before sending it
+            if opened is None:
+                opened = buffer['opened'] = now
+            elif now - opened < self.window:
+                opened = None
+
+            buffer['events'].append({'added': added, 'skipped': skipped})
+            return opened
+
+        opened = self._update(_add)
+        logging.debug("Added results to digest")
+
+        # Send the digest when the window closes
+        if opened is not None:
+            delay = max(opened + self.window - time(), 0)
+            self.timer = threading.Timer(delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+        return opened is not None
+
+    def flush(self, expired=False):
+        """Sends the buffered results as a single digest message.
+
+        If 'expired' is True, only sends them if the digest window has
+        closed.
+
+        Returns the digest message text, or None if there was nothing
+        to send.
+        """
+
+        def _flush(buffer):
+            opened = buffer['opened']
+            if expired and opened is not None and (
+                    time() - opened < self.window):
+                return []
+
+            events = buffer['events']
+            buffer['opened'] = None
+            buffer['events'] = []
+            return events
+
+        events = self._update(_flush)
+        if not events:
+            return None
+
+        # Build digest
+        added = [item for event in events for item in event['added']]
+        skipped = [item for event in events for item in event['skipped']]
+        (conn_text, conn_title) = make_digest(added, skipped)
+        logging.info("Sending digest of %s jobs", len(events))
+
+        # Send digest
+        self.send(conn_text, conn_title)
+
+        return conn_text
+
+    def wait(self, timeout=None):
+        """Waits up to 'timeout' seconds for the digest to be sent.
+        """
+        if self.timer is not None:
+            self.timer.join(timeout)
+
+    def close(self):
+        """Stops waiting for the digest window to close and sends the
+        buffered results now, including those added by other processes.
+
+        Returns the digest message text, or None if there was nothing
+        to send.
+        """
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        return self.flush()
+
+    def leave(self):
+        """Stops waiting for the digest window to close, and sends the
+        buffered results now only if the window has already closed.
+
+        Otherwise they are left in the buffer, so jobs from the next
+        process are added to the same digest, and the first process to
+        add to or leave the buffer after the window closes sends it.
+
+        Returns the digest message text, or None if nothing was sent.
+        """
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        return self.flush(expired=True)
+
+    def __repr__(self):
+        return '<MHDigest {0}>'.format(self.__dict__)
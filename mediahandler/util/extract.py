@@ -19,25 +19,262 @@ Module: mediahandler.util.extract
 
 Module contains:
     - |get_files()|
-        extracts compressed files via Filebot.
+        Extracts compressed files, natively where possible and via
+        Filebot otherwise.
+
+    - |get_folders()|
+        Extracts each compressed file in a folder, natively where possible
+        and via Filebot otherwise, and returns all the output folders.
+
+    - |extract_archive()|
+        Extracts an archive in-process and returns the extracted paths.
+
+    - |register_handler()|
+        Registers an extraction handler for archive file extensions.
+
+    - |is_extra_volume()|
+        Checks whether a file is a second or later volume of a
+        multi-volume archive.
+
+    - |get_extract_folder()|
+        Returns the folder an archive is extracted to by default.
 
 """
 
+import os
+import shutil
 import logging
-from re import search
-from subprocess import Popen, PIPE
+from re import search, I
+
+import mediahandler.util.filebot as Filebot
+
+# Size of the chunks archive members are copied to disk in
+CHUNK_SIZE = 1024 * 1024
+
+# Extraction handlers, by file extension
+_HANDLERS = {}
 
 
-def get_files(filebot, file_name):
-    """Extracts compressed files via Filebot.
+def register_handler(extensions, handler):
+    """Registers an extraction handler for a list of file extensions.
 
     Required arguments:
-        - filebot
-            Path to valid Filebot application script.
-        - file_name
+        - extensions
+            List of lowercase file extensions, e.g. ['.tar.gz', '.tgz'].
+        - handler
+            Function called as handler(archive, folder), which extracts
+            the archive into the folder and returns a list of the
+            extracted file paths. Raises ImportError if a module it needs
+            is not installed.
+    """
+    for extension in extensions:
+        _HANDLERS[extension] = handler
+
+
+def _get_handler(file_name):
+    """Returns the extraction handler and extension for a file, using the
+    longest matching extension, or (None, None) if there is none.
+    """
+
+    name = file_name.lower()
+    for extension in sorted(_HANDLERS, key=len, reverse=True):
+        if name.endswith(extension):
+            return _HANDLERS[extension], extension
+
+    return None, None
+
+
+def is_extra_volume(file_name):
+    """Returns True if a file is a second or later volume of a
+    multi-volume archive, e.g. 'name.part02.rar', 'name.r00' or
+    'name.7z.002'. Only the first volume of a set needs extracting.
+    """
+
+    # Numbered volumes, where the first is 1
+    volume = search(
+        r'\.part(\d+)\.rar$|\.(?:7z|zip)\.(\d{3})$', file_name, I)
+    if volume is not None:
+        return int(volume.group(1) or volume.group(2)) != 1
+
+    # Old-style volumes which follow a .rar or .zip file
+    return search(r'\.(r\d{2,3}|z\d{2})$', file_name, I) is not None
+
+
+def get_extract_folder(archive):
+    """Returns the folder an archive is extracted to by default: a folder
+    next to the archive, named after it without its extension, as Filebot
+    does. Returns None if the file is not a supported archive.
+    """
+
+    extension = _get_handler(archive)[1]
+    if extension is None:
+        return None
+
+    return archive[:-len(extension)]
+
+
+def _get_member_path(folder, name):
+    """Returns the path an archive member should be extracted to, or None
+    if it would be written outside of the extraction folder.
+    """
+
+    member_path = os.path.realpath(os.path.join(folder, name))
+    if os.path.commonpath([os.path.realpath(folder), member_path]) != \
+            os.path.realpath(folder):
+        logging.warning("Skipping unsafe archive member: %s", name)
+        return None
+
+    return member_path
+
+
+def _write_member(source, member_path):
+    """Streams an archive member to disk in fixed-size chunks.
+    """
+
+    parent = os.path.dirname(member_path)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+
+    with open(member_path, 'wb') as target:
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+
+
+def _extract_zip(archive, folder):
+    """Extracts a zip archive with the zipfile module.
+    """
+
+    import zipfile
+
+    extracted = []
+    with zipfile.ZipFile(archive) as zip_file:
+        for member in zip_file.infolist():
+            member_path = _get_member_path(folder, member.filename)
+            if member_path is None or member.is_dir():
+                continue
+
+            # Copy member to disk
+            with zip_file.open(member) as source:
+                _write_member(source, member_path)
+            extracted.append(member_path)
+
+    return extracted
+
+
+def _extract_tar(archive, folder):
+    """Extracts a tar archive, compressed or not, with the tarfile module.
+
+    The archive is read as a stream, so members are never held in memory.
+    """
+
+    import tarfile
+
+    extracted = []
+    with tarfile.open(archive, 'r|*') as tar_file:
+        for member in tar_file:
+
+            # Only extract regular files
+            if not member.isfile():
+                continue
+            member_path = _get_member_path(folder, member.name)
+            if member_path is None:
+                continue
+
+            # Copy member to disk
+            _write_member(tar_file.extractfile(member), member_path)
+            extracted.append(member_path)
+
+    return extracted
+
+
+def _extract_rar(archive, folder):
+    """Extracts a rar archive with the optional rarfile module.
+    """
+
+    import rarfile
+
+    extracted = []
+    with rarfile.RarFile(archive) as rar_file:
+        for member in rar_file.infolist():
+            member_path = _get_member_path(folder, member.filename)
+            if member_path is None or member.is_dir():
+                continue
+
+            # Copy member to disk
+            with rar_file.open(member) as source:
+                _write_member(source, member_path)
+            extracted.append(member_path)
+
+    return extracted
+
+
+def _extract_7z(archive, folder):
+    """Extracts a 7z archive with the optional py7zr module.
+    """
+
+    import py7zr
+
+    with py7zr.SevenZipFile(archive) as seven_file:
+        names = [name for name in seven_file.getnames()
+                 if _get_member_path(folder, name) is not None]
+        seven_file.extract(path=folder, targets=names)
+
+    return [path for path in (os.path.join(folder, name) for name in names)
+            if os.path.isfile(path)]
+
+
+# Built-in handlers
+register_handler(['.zip'], _extract_zip)
+register_handler(['.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                  '.tar.xz', '.txz'], _extract_tar)
+register_handler(['.rar'], _extract_rar)
+register_handler(['.7z'], _extract_7z)
+
+
+def extract_archive(archive, folder=None):
+    """Extracts an archive in-process using its registered handler.
+
+    Required arguments:
+        - archive
             Path to valid compressed file for extraction.
+
+    Optional arguments:
+        - folder
+            Path to extract to. Defaults to a folder next to the archive,
+            named after it without its extension, as Filebot does.
+
+    Returns a tuple of the extraction folder and a list of the extracted
+    file paths, or None if the archive could not be extracted natively.
+    """
+
+    handler = _get_handler(archive)[0]
+    if handler is None:
+        return None
+
+    # Set extraction folder
+    if folder is None:
+        folder = get_extract_folder(archive)
+
+    # Extract files
+    try:
+        extracted = handler(archive, folder)
+    except ImportError as exc:
+        logging.debug("Native extraction unavailable: %s", exc)
+        return None
+    except Exception as exc:
+        logging.warning("Unable to extract %s natively: %s", archive, exc)
+        return None
+
+    logging.debug("Extracted files: %s", extracted)
+
+    return folder, extracted
+
+
+def _extract_filebot(filebot, file_name, server=False):
+    """Extracts a compressed file, or the compressed files in a folder,
+    via Filebot.
+
+    Returns the folder Filebot extracted to, or None if it failed.
     """
-    logging.info("Getting files from compressed folder")
 
     # Set up query
     m_cmd = [filebot,
@@ -45,11 +282,8 @@ def get_files(filebot, file_name):
              file_name]
     logging.debug("Query: %s", m_cmd)
 
-    # Process query
-    m_open = Popen(m_cmd, stdout=PIPE)
-
-    # Get output
-    (output, err) = m_open.communicate()
+    # Process query and get output
+    (output, err) = Filebot.run_command(m_cmd, server)
     logging.debug("Filebot output: %s", output)
     logging.debug("Filebot return errors: %s", err)
 
@@ -64,8 +298,94 @@ def get_files(filebot, file_name):
     if file_info is None:
         return None
 
+    return file_info.group(1)
+
+
+def get_folders(filebot, file_name, server=False):
+    """Extracts a compressed file, or each of the compressed files in a
+    folder.
+
+    Each archive is extracted in-process if possible, and via Filebot
+    otherwise, so one archive falling back to Filebot does not extract
+    the others again. A folder with no archives which can be extracted
+    in-process is sent to Filebot as a whole.
+
+    Required arguments:
+        - filebot
+            Path to valid Filebot application script, or None to only
+            use native extraction.
+        - file_name
+            Path to valid compressed file, or folder of compressed files,
+            for extraction.
+
+    Optional arguments:
+        - server
+            True/False. Run Filebot via a warm Filebot process.
+
+    Returns a list of the folders the archives were extracted to, or
+    None if any of them could not be extracted.
+    """
+
+    # Find archives, skipping extra volumes of multi-volume sets
+    archives = [file_name]
+    if os.path.isdir(file_name):
+        archives = [os.path.join(file_name, name)
+                    for name in sorted(os.listdir(file_name))
+                    if _get_handler(name)[0] is not None and
+                    not is_extra_volume(name)] or archives
+
+    # Extract archives
+    folders = []
+    for archive in archives:
+
+        # Try native extraction first
+        result = extract_archive(archive)
+        if result is not None:
+            folders.append(result[0])
+            continue
+
+        # Fall back to Filebot
+        if not filebot:
+            return None
+        folder = _extract_filebot(filebot, archive, server)
+        if folder is None:
+            return None
+        folders.append(folder)
+
+    logging.debug("Extracted to folders: %s", folders)
+
+    return folders
+
+
+def get_files(filebot, file_name, server=False):
+    """Extracts compressed files, see get_folders().
+
+    Zip and tar archives, and rar and 7z archives if the rarfile or py7zr
+    modules are installed, are extracted in-process. Anything else is
+    extracted via Filebot.
+
+    Required arguments:
+        - filebot
+            Path to valid Filebot application script, or None to only
+            use native extraction.
+        - file_name
+            Path to valid compressed file for extraction.
+
+    Optional arguments:
+        - server
+            True/False. Run Filebot via a warm Filebot process.
+
+    Returns the folder the first archive was extracted to, or None if
+    extraction failed.
+    """
+    logging.info("Getting files from compressed folder")
+
+    folders = get_folders(filebot, file_name, server)
+    if not folders:
+        return None
+
     # Set new files
-    new_files = file_info.group(1)
+    new_files = folders[0]
     logging.debug("Extracted files: %s", new_files)
 
     return new_files
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.filebot
+
+Module contains:
+
+    - |MHFilebot|
+        A long-lived Filebot process which runs commands sent to it
+        through a pipe, so each command avoids the JVM start-up.
+
+    - |run_command()|
+        Runs a Filebot command, via a warm MHFilebot process if
+        requested, or in a new process otherwise.
+
+    - |iter_command()|
+        Runs a Filebot command like run_command(), yielding its output
+        lines as they are produced.
+
+"""
+
+import json
+import atexit
+import logging
+import threading
+from os import path
+from subprocess import Popen, PIPE, STDOUT
+
+import mediahandler as mh
+import mediahandler.util.output as Output
+
+# Filebot script which reads commands from stdin
+SERVER_SCRIPT = path.join(mh.__mediaextras__, 'filebot-server.groovy')
+
+# Line printed by the server script after each command
+SERVER_MARKER = b'@@MH-FILEBOT-DONE@@'
+
+# Number of seconds the server may go without printing anything while
+# running a command before it is restarted
+SERVER_TIMEOUT = 600
+
+# Running servers, by Filebot path
+_SERVERS = {}
+_SERVERS_LOCK = threading.Lock()
+
+
+class MHFilebot(mh.MHObject):
+    """A long-lived Filebot process which runs commands sent to it
+    through a pipe.
+
+    Required argument:
+        - filebot
+            Path to valid Filebot application script.
+
+    Optional argument:
+        - timeout
+            Number of seconds the process may go without printing any
+            output while running a command. If it does, the process is
+            killed and the command fails, so it can be run in a new
+            process instead.
+
+    Public methods:
+
+        - run()
+            Runs a Filebot command and returns its output.
+
+        - stop()
+            Stops the Filebot process.
+    """
+
+    def __init__(self, filebot, timeout=SERVER_TIMEOUT):
+        """Initializes the MHFilebot object.
+
+        The Filebot process is started on the first call to run().
+        """
+
+        super(MHFilebot, self).__init__()
+
+        self.filebot = filebot
+        self.timeout = timeout
+        self.process = None
+        self.lock = threading.Lock()
+
+    def is_alive(self):
+        """Returns True if the Filebot process is running.
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def _start(self):
+        """Starts the Filebot process with the server script.
+        """
+
+        logging.info("Starting Filebot server")
+
+        self.process = Popen(
+            [self.filebot, '-script', SERVER_SCRIPT],
+            stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+
+    def run(self, cmd):
+        """Runs a Filebot command through the Filebot process.
+
+        Required argument:
+            - cmd
+                List of Filebot CLI arguments, in the same form as sent to
+                Popen, including the path to Filebot itself.
+
+        Returns the command's combined output as bytes, or None if the
+        Filebot process could not run it.
+        """
+
+        try:
+            return b''.join(self.stream(cmd))
+        except IOError:
+            return None
+
+    def stream(self, cmd):
+        """Runs a Filebot command through the Filebot process and yields
+        its output lines, as bytes, as they are produced.
+
+        Takes the same arguments as run(). Raises IOError if the Filebot
+        process stops before finishing the command, or is stopped because
+        it printed nothing for 'timeout' seconds.
+        """
+
+        with self.lock:
+
+            # Start the process, if needed
+            if not self.is_alive():
+                self._start()
+
+            # Send command
+            finished = False
+            watchdog = None
+            try:
+                request = json.dumps(cmd[1:]).encode('utf-8')
+                self.process.stdin.write(request + b'\n')
+                self.process.stdin.flush()
+
+                # Read output up to the end-of-command marker, killing the
+                # process if it stops printing, which ends the read
+                while True:
+                    watchdog = self._watch(self.process)
+                    line = self.process.stdout.readline()
+                    watchdog.cancel()
+                    if not line:
+                        break
+                    if line.strip() == SERVER_MARKER:
+                        finished = True
+                        return
+                    yield line
+
+            except (IOError, OSError) as exc:
+                logging.debug("Filebot server error: %s", exc)
+
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+
+                # Unread output would be mixed into the next command
+                if not finished:
+                    self._kill()
+
+            # The process died before finishing the command
+            logging.warning("Filebot server stopped unexpectedly")
+
+        raise IOError("Filebot server stopped unexpectedly")
+
+    def _watch(self, process):
+        """Starts a timer which kills a Filebot process if it is not
+        cancelled within 'timeout' seconds.
+        """
+
+        def _expire():
+            logging.warning("Filebot server timed out after %s seconds",
+                            self.timeout)
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+        watchdog = threading.Timer(self.timeout, _expire)
+        watchdog.daemon = True
+        watchdog.start()
+
+        return watchdog
+
+    def _kill(self):
+        """Kills the Filebot process without waiting for it to finish.
+        """
+        if self.is_alive():
+            self.process.kill()
+        if self.process is not None:
+            self.process.wait()
+        self.process = None
+
+    def stop(self):
+        """Stops the Filebot process.
+        """
+
+        with self.lock:
+            if not self.is_alive():
+                self.process = None
+                return
+
+            logging.info("Stopping Filebot server")
+
+            # Closing stdin ends the server script
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except Exception:
+                pass
+            self._kill()
+
+    def __repr__(self):
+        return '<MHFilebot {0}>'.format(self.__dict__)
+
+
+def get_server(filebot):
+    """Returns the shared MHFilebot object for a Filebot path.
+    """
+
+    with _SERVERS_LOCK:
+        if filebot not in _SERVERS:
+            _SERVERS[filebot] = MHFilebot(filebot)
+        return _SERVERS[filebot]
+
+
+@atexit.register
+def stop_servers():
+    """Stops all running MHFilebot processes.
+    """
+    with _SERVERS_LOCK:
+        for server in _SERVERS.values():
+            server.stop()
+
+
+def run_command(cmd, server=False):
+    """Runs a Filebot command.
+
+    Required argument:
+        - cmd
+            List of Filebot CLI arguments, including the path
+            to Filebot itself.
+
+    Optional argument:
+        - server
+            True/False. Run the command through a warm Filebot
+            process. Falls back to a new process if it fails.
+
+    Returns a tuple of the command's output and errors, as bytes.
+    """
+
+    # Try the warm Filebot process first
+    if server:
+        output = get_server(cmd[0]).run(cmd)
+        if output is not None:
+            return output, b''
+        logging.warning("Falling back to a new Filebot process")
+
+    # Run as a new process
+    query = Popen(cmd, stdout=PIPE, stderr=PIPE)
+
+    return query.communicate()
+
+
+def iter_command(cmd, server=False):
+    """Runs a Filebot command and yields its combined output and error
+    lines, as bytes, as they are produced.
+
+    Takes the same arguments as run_command(). If the warm Filebot process
+    stops part way through, yields None before running the command again
+    in a new process, so any output already read can be discarded.
+    """
+
+    # Try the warm Filebot process first
+    if server:
+        try:
+            for line in get_server(cmd[0]).stream(cmd):
+                yield line
+            return
+        except IOError:
+            logging.warning("Falling back to a new Filebot process")
+            yield None
+
+    # Run as a new process
+    for line in Output.iter_lines(cmd):
+        yield line
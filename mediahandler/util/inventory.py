@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.inventory
+
+Module contains:
+
+    - |MHInventory|
+        A single-scan inventory of the files in a media folder, with each
+        entry classified by file type.
+
+    - |MHEntry|
+        A single file or folder in an MHInventory.
+
+    - |get_kind()|
+        Classifies a file by its name.
+
+    - |get_inventory()|
+        Reuses an existing MHInventory object, or scans a new one.
+
+"""
+
+import os
+import logging
+from re import search, I
+from collections import namedtuple
+
+import mediahandler as mh
+
+# File kinds, checked in order
+KINDS = [
+    ('archive', r'\.(zip|rar|7z|tar|tar\.gz|tgz|tar\.bz2|tbz2|tar\.xz|txz|'
+                r'r\d{2,3}|z\d{2}|(7z|zip)\.\d{3})$'),
+    ('sample', r'(^|[\W_])sample([\W_].*)?\.(mkv|avi|m4v|mp4)$'),
+    ('video', r'\.(mkv|avi|m4v|mp4)$'),
+    ('subtitle', r'\.(srt|sub|idx|ass|ssa|smi|vtt)$'),
+    ('chaptered', r'\.(m4b)$'),
+    ('audio', r'\.(mp3|ogg|wav)$'),
+]
+
+# A single inventory entry
+MHEntry = namedtuple('MHEntry', [
+    'path',  # full path
+    'name',  # file or folder name
+    'kind',  # one of KINDS, 'folder' or 'other'
+    'ext',  # file extension, without the dot
+    'size',  # size in bytes
+    'mtime',  # modification time
+])
+
+
+def get_kind(name):
+    """Classifies a file by its name.
+
+    Returns a tuple of the file's kind, from KINDS or 'other', and its
+    extension without the dot.
+    """
+
+    for (kind, regex) in KINDS:
+        if search(regex, name, I):
+            break
+    else:
+        kind = 'other'
+
+    # Get extension
+    ext = os.path.splitext(name)[1][1:]
+
+    return kind, ext
+
+
+class MHInventory(mh.MHObject):
+    """A single-scan inventory of the files in a media file or folder.
+
+    The folder is walked once with os.scandir(), and each entry is
+    classified and stored with its stat info, so later stages can look up
+    folder contents without listing the folder again.
+
+    Required arguments:
+        - root
+            Path to a media file or folder.
+
+    Public methods:
+
+        - scan()
+            Adds a file or folder, and everything under it.
+
+        - list()
+            Returns the entries in a folder.
+
+        - discard()
+            Removes a path, and everything under it, from the inventory.
+
+        - covers()
+            Checks whether a path has been scanned.
+    """
+
+    def __init__(self, root):
+        """Initializes the MHInventory object and scans the root path.
+        """
+
+        super(MHInventory, self).__init__()
+
+        self.root = os.path.abspath(root)
+        self.entries = {}
+        self.children = {}
+        self.scan(self.root)
+
+    def scan(self, item):
+        """Adds a file or folder, and everything under it, to the
+        inventory. Anything already stored under it is replaced.
+        """
+
+        item = os.path.abspath(item)
+        self.discard(item)
+
+        # Add a single file
+        if not os.path.isdir(item):
+            try:
+                stat = os.stat(item)
+            except OSError:
+                return
+            self._add(item, stat, False)
+            return
+
+        # Walk the folder once
+        stat = os.stat(item)
+        self._add(item, stat, True)
+        pending = [item]
+        while pending:
+            folder = pending.pop()
+            try:
+                with os.scandir(folder) as scan:
+                    for dir_entry in scan:
+                        is_dir = dir_entry.is_dir()
+                        self._add(dir_entry.path, dir_entry.stat(), is_dir)
+                        if is_dir:
+                            pending.append(dir_entry.path)
+            except OSError as exc:
+                logging.warning("Unable to scan %s: %s", folder, exc)
+
+        logging.debug("Inventory of %s: %s entries", item, len(self.entries))
+
+    def _add(self, item, stat, is_dir):
+        """Classifies and stores a single entry.
+        """
+
+        name = os.path.basename(item)
+        if is_dir:
+            (kind, ext) = ('folder', '')
+        else:
+            (kind, ext) = get_kind(name)
+
+        self.entries[item] = MHEntry(
+            item, name, kind, ext, stat.st_size, stat.st_mtime)
+
+        # Add to parent folder
+        parent = os.path.dirname(item)
+        self.children.setdefault(parent, {})[name] = item
+        if is_dir:
+            self.children.setdefault(item, {})
+
+    def list(self, folder, recursive=False, kinds=None):
+        """Returns the entries in a folder, sorted by name.
+
+        Required arguments:
+            - folder
+                Path to a scanned folder.
+
+        Optional arguments:
+            - recursive
+                True/False. Include the entries of subfolders.
+            - kinds
+                List of kinds of entries to return. Defaults to all.
+        """
+
+        results = []
+        children = self.children.get(os.path.abspath(folder), {})
+        for name in sorted(children):
+            entry = self.entries[children[name]]
+            if kinds is None or entry.kind in kinds:
+                results.append(entry)
+            if recursive and entry.kind == 'folder':
+                results.extend(self.list(entry.path, True, kinds))
+
+        return results
+
+    def get(self, item):
+        """Returns the entry for a path, or None if it is not stored.
+        """
+        return self.entries.get(os.path.abspath(item))
+
+    def discard(self, item):
+        """Removes a path, and everything under it, from the inventory.
+        """
+
+        item = os.path.abspath(item)
+        if item not in self.entries:
+            return
+
+        # Remove children
+        for child in list(self.children.get(item, {}).values()):
+            self.discard(child)
+        self.children.pop(item, None)
+
+        # Remove from parent folder
+        del self.entries[item]
+        siblings = self.children.get(os.path.dirname(item), {})
+        siblings.pop(os.path.basename(item), None)
+
+    def covers(self, item):
+        """Returns True if a path has been scanned into the inventory.
+        """
+        return os.path.abspath(item) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return '<MHInventory {0}>'.format(self.root)
+
+
+def get_inventory(inventory, item):
+    """Returns the MHInventory object if it has already scanned a path, or
+    a new MHInventory object for the path otherwise.
+    """
+
+    if inventory is None or not inventory.covers(item):
+        inventory = MHInventory(item)
+
+    return inventory
@@ -25,15 +25,55 @@ Module contains:
 
 """
 
-import logging
+import os
 import sys
+import json
+import logging
+from time import time
 from json import dumps
-
-import requests
-from requests.exceptions import RequestException
+from hashlib import sha1
 
 import mediahandler as mh
 import mediahandler.util.args as Args
+from mediahandler.util.config import get_cache_path
+from mediahandler.util.outbox import MHOutbox
+from mediahandler.util.digest import MHDigest
+
+# Pushbullet error codes which mean the access token is no longer valid
+PUSHBULLET_AUTH_ERRORS = ['invalid_access_token']
+
+
+def _get_credentials_key(service, *credentials):
+    """Returns a hash identifying a set of service credentials, so the
+    credentials themselves are never written to disk.
+    """
+    key = '\n'.join([service] + [str(item) for item in credentials])
+    return sha1(key.encode('utf-8')).hexdigest()
+
+
+def _read_credentials_cache():
+    """Returns a dict of credential keys and the time they were last
+    successfully validated.
+    """
+    try:
+        with open(get_cache_path('credentials.json')) as cache_io:
+            cache = json.load(cache_io)
+    except (IOError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _write_credentials_cache(cache):
+    """Saves the dict of validated credential keys.
+    """
+    cache_file = get_cache_path('credentials.json')
+    tmp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+    try:
+        with open(tmp_file, 'w') as cache_io:
+            json.dump(cache, cache_io)
+        os.replace(tmp_file, cache_file)
+    except (IOError, OSError) as exc:
+        logging.debug("Unable to save credentials cache: %s", exc)
 
 
 class MHPush(mh.MHObject):
@@ -59,8 +99,21 @@ class MHPush(mh.MHObject):
         - |failure()|
             A wrapper for send_message() which sends a failure
             message and raises a SystemExit.
+
+        - |flush()|
+            Waits for queued notifications to be delivered.
     """
 
+    # 3rd party API base URLs
+    PUSHOVER_API = 'https://api.pushover.net/1'
+    PUSHBULLET_API = 'https://api.pushbullet.com/v2'
+
+    # Number of seconds to wait for a 3rd party API response
+    TIMEOUT = 10
+
+    # Number of seconds to wait for queued notifications before exiting
+    EXIT_TIMEOUT = 30
+
     def __init__(self, settings, disable=False):
         """Initializes the MHPush object.
 
@@ -83,6 +136,8 @@ class MHPush(mh.MHObject):
         # Set up vars
         self.disable = disable
         self.parser = Args.get_parser()
+        self.outbox = None
+        self.digest = None
 
         # If enabled, check credentials
         if self.enabled:
@@ -91,6 +146,10 @@ class MHPush(mh.MHObject):
     def send_message(self, conn_msg, msg_title=None):
         """Wrapper for sending push notifications via 3rd party services.
 
+        The message is added to the notification outbox and delivered in
+        the background, so the function returns without waiting for the
+        services to respond.
+
         The function will exit if the disable flag is set.
         """
 
@@ -109,13 +168,112 @@ class MHPush(mh.MHObject):
         if msg_title is not None:
             conn_title = '{0}: {1}'.format(conn_title, msg_title)
 
-        # Send to pushover
-        if hasattr(self.pushover, 'session'):
-            self._send_pushover(conn_msg, conn_title)
+        # Look for services to send to
+        services = [service for service in ['pushover', 'pushbullet']
+                    if hasattr(getattr(self, service), 'session')]
+        if not services:
+            return
+
+        # Send in the background
+        self._get_outbox().put(conn_msg, conn_title, services)
+
+    def _get_outbox(self):
+        """Returns the MHOutbox object, setting it up on first use, or
+        otherwise picking up messages left over by processes which have
+        stopped since.
+
+        Each set of credentials has its own outbox folder, so messages are
+        only ever delivered with the credentials they were queued with.
+        """
+
+        if self.outbox is not None:
+            self.outbox.load()
+            return self.outbox
+
+        key = _get_credentials_key(
+            'outbox', self.pushover.api_key, self.pushover.user_key,
+            self.pushbullet.token)
+        self.outbox = MHOutbox(
+            self._deliver, get_cache_path('outbox-{0}'.format(key[:10])))
+
+        return self.outbox
+
+    def flush(self, timeout=None, leave_digest=False):
+        """Sends any buffered digest now, then waits up to 'timeout'
+        seconds for queued notifications to be delivered.
+
+        If 'leave_digest' is True, a digest whose window has not closed
+        yet is left for the next process to add to and send instead.
+
+        Also picks up notifications left over by processes which have
+        stopped, such as add_media_many() worker processes. Call before
+        exiting, since notifications are sent by background threads which
+        do not keep the process running.
+
+        Returns True if there are no notifications left to send.
+        """
+
+        if not self.enabled or self.disable:
+            return True
+
+        # Send digest without waiting for its window to close
+        if self._use_digest():
+            if leave_digest:
+                self.digest.leave()
+            else:
+                self.digest.close()
+
+        return self._get_outbox().wait(timeout)
+
+    def _use_digest(self):
+        """Returns True if success notifications should be added to a
+        digest, and sets up the MHDigest object.
+        """
+
+        # Check that digests are enabled
+        window = getattr(self, 'digest_window', None)
+        if not window or not self.enabled or self.disable:
+            return False
+
+        # Set up digest, shared by jobs with the same notification settings
+        if self.digest is None:
+            key = _get_credentials_key(
+                'digest', self.notify_name,
+                self.pushover.api_key, self.pushover.user_key,
+                self.pushbullet.token)
+            self.digest = MHDigest(
+                self.send_message, window,
+                get_cache_path('digest-{0}.json'.format(key[:10])))
+
+        return True
+
+    def _deliver(self, service, conn_msg, conn_title):
+        """Delivers a message to a single service for the outbox.
+
+        Returns True if the message was accepted, False if it was rejected,
+        or None if the service could not be reached and the delivery should
+        be retried.
+        """
+
+        # Import module
+        from requests.exceptions import RequestException
 
-        # Send to pushbullet
-        if hasattr(self.pushbullet, 'session'):
-            self._send_pushbullet(conn_msg, conn_title)
+        # Send message
+        try:
+            if service == 'pushover':
+                resp = self._send_pushover(conn_msg, conn_title)
+                return resp.get('status') == 1
+            resp = self._send_pushbullet(conn_msg, conn_title)
+            return 'error' not in resp
+
+        # Network errors and invalid responses, e.g. server errors
+        except (RequestException, ValueError) as exc:
+            logging.warning("Unable to reach %s: %s", service, exc)
+            return None
+
+        # Credentials are no longer valid
+        except SystemExit:
+            return False
 
     def success(self, file_array, skipped=None):
         """Builds and sends a success notification.
@@ -161,8 +319,11 @@ class MHPush(mh.MHObject):
             logging.warning("No files or skips found to notify about")
             sys.exit("No files or skips found to notify about")
 
-        # Send message
-        self.send_message(conn_text, conn_title)
+        # Add to digest, if enabled, or send message
+        if self._use_digest():
+            self.digest.add(file_array, skipped or [])
+        else:
+            self.send_message(conn_text, conn_title)
 
         # Exit
         logging.warning(conn_text)
@@ -202,7 +363,7 @@ class MHPush(mh.MHObject):
         req = getattr(session, method.lower())
 
         # Make request
-        resp = req(url, data=params)
+        resp = req(url, data=params, timeout=self.TIMEOUT)
 
         # Get JSON request response
         conn_resp = resp.json()
@@ -220,21 +381,74 @@ class MHPush(mh.MHObject):
 
     def _validate_credentials(self):
         """Wrapper for validating API credentials for 3rd party services.
+
+        Credentials which were successfully validated less than 'cache_ttl'
+        seconds ago are not validated again.
         """
 
         # Pushover
         if self.pushover.api_key is not None:
-            self._validate_pushover()
+            self._setup_pushover()
+            if not self._is_validated('pushover'):
+                self._validate_pushover()
 
         # Pushbullet
         if self.pushbullet.token is not None:
-            self._validate_pushbullet()
+            self._setup_pushbullet()
+            if not self._is_validated('pushbullet'):
+                self._validate_pushbullet()
 
-    def _validate_pushover(self):
-        """Validates Pushover API credentials.
+    def _get_credentials(self, service):
+        """Returns the cache key for a service's credentials.
+        """
+        if service == 'pushover':
+            return _get_credentials_key(
+                service, self.pushover.api_key, self.pushover.user_key)
+        return _get_credentials_key(service, self.pushbullet.token)
+
+    def _is_validated(self, service):
+        """Returns True if the service's credentials were successfully
+        validated within the cache TTL.
         """
 
-        logging.debug("Validating Pushover credentials")
+        # Check that caching is enabled
+        cache_ttl = getattr(self, 'cache_ttl', None)
+        if not cache_ttl:
+            return False
+
+        # Look up last validation
+        validated = _read_credentials_cache().get(
+            self._get_credentials(service))
+        if validated is None or time() - validated >= cache_ttl:
+            return False
+
+        logging.debug("Using cached %s credentials validation", service)
+
+        return True
+
+    def _set_validated(self, service, valid=True):
+        """Records or forgets a successful validation of the service's
+        credentials.
+        """
+
+        # Check that caching is enabled
+        if not getattr(self, 'cache_ttl', None):
+            return
+
+        # Update cache
+        cache = _read_credentials_cache()
+        if valid:
+            cache[self._get_credentials(service)] = time()
+        else:
+            cache.pop(self._get_credentials(service), None)
+        _write_credentials_cache(cache)
+
+    def _setup_pushover(self):
+        """Sets up the Pushover API session.
+        """
+
+        # Import module
+        import requests
 
         # Set up request params
         self.pushover.url = {
@@ -248,11 +462,20 @@ class MHPush(mh.MHObject):
             'Content-type': 'application/x-www-form-urlencoded'
         })
 
+    def _validate_pushover(self):
+        """Validates Pushover API credentials.
+        """
+
+        logging.debug("Validating Pushover credentials")
+
+        # Import module
+        from requests.exceptions import RequestException
+
         # Make request
         try:
             resp = self._make_request(
                 self.pushover.session,
-                'https://api.pushover.net/1/users/validate.json',
+                '{0}/users/validate.json'.format(self.PUSHOVER_API),
                 'POST',
                 self.pushover.url
             )
@@ -269,27 +492,38 @@ class MHPush(mh.MHObject):
 
         # Return success
         logging.info("Pushover API credentials successfully validated")
+        self._set_validated('pushover')
 
         return True
 
-    def _validate_pushbullet(self):
-        """Validates Pushbullet API credentials.
+    def _setup_pushbullet(self):
+        """Sets up the Pushbullet API session.
         """
 
-        logging.debug("Validating Pushbullet credentials")
+        # Import module
+        import requests
 
-        # Create pushover session object with credentials
+        # Create pushbullet session object with credentials
         self.pushbullet.session = requests.Session()
         self.pushbullet.session.auth = (self.pushbullet.token, '')
         self.pushbullet.session.headers.update({
             'Content-Type': 'application/json'
         })
 
+    def _validate_pushbullet(self):
+        """Validates Pushbullet API credentials.
+        """
+
+        logging.debug("Validating Pushbullet credentials")
+
+        # Import module
+        from requests.exceptions import RequestException
+
         # Make request
         try:
             resp = self._make_request(
                 self.pushbullet.session,
-                'https://api.pushbullet.com/v2/users/me'
+                '{0}/users/me'.format(self.PUSHBULLET_API)
             )
         except RequestException as exc:
             error_msg = 'Pushbullet: {0}'.format(exc.response.reason)
@@ -304,6 +538,7 @@ class MHPush(mh.MHObject):
 
         # Return success
         logging.info("Pushbullet API credentials successfully validated")
+        self._set_validated('pushbullet')
 
         return True
 
@@ -316,17 +551,24 @@ class MHPush(mh.MHObject):
         logging.debug("Sending Pushover notification")
 
         # Add values to request URL & encode
-        self.pushover.url["title"] = conn_title
-        self.pushover.url["message"] = conn_msg
+        params = dict(self.pushover.url)
+        params["title"] = conn_title
+        params["message"] = conn_msg
 
         # Make request
         resp = self._make_request(
             self.pushover.session,
-            'https://api.pushover.net/1/messages.json',
+            '{0}/messages.json'.format(self.PUSHOVER_API),
             'POST',
-            self.pushover.url
+            params
         )
 
+        # Credentials may have been revoked since they were validated
+        if resp.get('token') == 'invalid' or resp.get('user') == 'invalid':
+            logging.warning("Pushover credentials rejected, validating again")
+            self._set_validated('pushover', False)
+            self._validate_pushover()
+
         return resp
 
     def _send_pushbullet(self, conn_msg, conn_title):
@@ -345,11 +587,19 @@ class MHPush(mh.MHObject):
         # Make request
         resp = self._make_request(
             self.pushbullet.session,
-            'https://api.pushbullet.com/v2/pushes',
+            '{0}/pushes'.format(self.PUSHBULLET_API),
             'POST',
             request_data,
         )
 
+        # Credentials may have been revoked since they were validated
+        error = resp.get('error')
+        if isinstance(error, dict) and \
+                error.get('code') in PUSHBULLET_AUTH_ERRORS:
+            logging.warning("Pushbullet token rejected, validating again")
+            self._set_validated('pushbullet', False)
+            self._validate_pushbullet()
+
         return resp
 
     def __repr__(self):
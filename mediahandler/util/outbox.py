@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.outbox
+
+Module contains:
+
+    - |MHOutbox|
+        A durable local outbox of push notifications, delivered by a
+        background sender thread with retries.
+
+"""
+
+import os
+import json
+import heapq
+import logging
+import threading
+from time import time
+
+import mediahandler as mh
+
+
+def _is_running(pid):
+    """Returns True if a process with the given ID is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class MHOutbox(mh.MHObject):
+    """A durable local outbox of push notifications.
+
+    Each message is stored as a JSON file in the outbox folder until it has
+    been delivered to every service, so messages survive a crash. Messages
+    are delivered by a background thread, which sends to all services at
+    once and retries failed deliveries with exponential backoff.
+
+    The sender thread does not keep a process running, so a process
+    should call wait() with a timeout before exiting. Messages left over
+    by a process which stopped before delivering them are sent by the
+    next outbox to start.
+
+    Required arguments:
+        - deliver
+            Function called as deliver(service, message, title). Returns
+            True if the message was delivered, False if the service
+            rejected it, or None if delivery should be retried.
+        - folder
+            Path to the folder used to store messages.
+
+    Optional arguments:
+        - retries
+            Int. Number of delivery attempts for each message.
+        - backoff
+            Number of seconds to wait before the first retry. Doubles
+            after each attempt.
+
+    Public methods:
+
+        - put()
+            Adds a message to the outbox.
+
+        - load()
+            Picks up messages left over by processes which have stopped.
+
+        - wait()
+            Waits for the outbox to empty.
+    """
+
+    def __init__(self, deliver, folder, retries=4, backoff=1):
+        """Initializes the MHOutbox object.
+        """
+
+        super(MHOutbox, self).__init__()
+
+        self.deliver = deliver
+        self.folder = folder
+        self.retries = retries
+        self.backoff = backoff
+        self.count = 0
+        self.pending = []
+        self.thread = None
+        self.cond = threading.Condition()
+
+        # Make sure outbox folder exists
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        # Pick up messages left over by earlier processes
+        self.load()
+
+    def _get_message_path(self, message_id):
+        """Returns the path of a message claimed by this process.
+        """
+        return os.path.join(
+            self.folder, '{0}.json.{1}'.format(message_id, os.getpid()))
+
+    def load(self):
+        """Claims unsent messages in the outbox folder, left over by
+        processes which have stopped, and starts sending them.
+
+        Messages already claimed by this process are skipped, so this may
+        be called again at any time.
+        """
+
+        for name in sorted(os.listdir(self.folder)):
+            parts = name.split('.json')
+            if len(parts) != 2:
+                continue
+
+            # Remove partial writes left by stopped processes
+            owner = parts[1].lstrip('.')
+            if owner.endswith('.tmp'):
+                owner = owner[:-len('.tmp')]
+                if owner.isdigit() and not _is_running(int(owner)):
+                    logging.debug("Removing partial notification: %s", name)
+                    try:
+                        os.remove(os.path.join(self.folder, name))
+                    except OSError:
+                        pass
+                continue
+
+            # Skip unknown files
+            if owner and not owner.isdigit():
+                logging.debug("Skipping unknown outbox file: %s", name)
+                continue
+
+            # Skip messages claimed by running processes
+            if owner and _is_running(int(owner)):
+                continue
+
+            # Claim message
+            message_id = parts[0]
+            try:
+                os.rename(os.path.join(self.folder, name),
+                          self._get_message_path(message_id))
+            except OSError:
+                continue
+
+            logging.debug("Found unsent notification: %s", message_id)
+            self._schedule(message_id, 0)
+
+    def put(self, message, title, services):
+        """Adds a message for the given services to the outbox and returns
+        its ID without waiting for it to be delivered.
+        """
+
+        with self.cond:
+            self.count += 1
+            message_id = '{0:020.6f}-{1:06d}'.format(time(), self.count)
+
+        # Save message
+        self._save(message_id, {
+            'message': message,
+            'title': title,
+            'services': list(services),
+            'attempts': 0,
+        })
+        logging.debug("Queued notification %s", message_id)
+
+        # Send in the background
+        self._schedule(message_id, 0)
+
+        return message_id
+
+    def _save(self, message_id, entry):
+        """Writes a message to its file atomically.
+        """
+        message_path = self._get_message_path(message_id)
+        with open(message_path + '.tmp', 'w') as message_io:
+            json.dump(entry, message_io)
+        os.replace(message_path + '.tmp', message_path)
+
+    def _schedule(self, message_id, delay):
+        """Schedules a delivery attempt and makes sure the sender thread
+        is running.
+        """
+
+        with self.cond:
+            heapq.heappush(self.pending, (time() + delay, message_id))
+            self.cond.notify()
+
+            # Start sender
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name='mediahandler-outbox')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def _run(self):
+        """Sends messages until the outbox is empty.
+        """
+
+        while True:
+            with self.cond:
+                if not self.pending:
+                    self.thread = None
+                    return
+
+                # Wait until the next message is due
+                (due, message_id) = self.pending[0]
+                if due > time():
+                    self.cond.wait(due - time())
+                    continue
+                heapq.heappop(self.pending)
+
+            try:
+                self._send(message_id)
+            except Exception:
+                logging.exception("Unable to send notification %s",
+                                  message_id)
+
+    def _send(self, message_id):
+        """Makes a delivery attempt for a message to each of its remaining
+        services, at the same time.
+        """
+
+        # Read message
+        message_path = self._get_message_path(message_id)
+        try:
+            with open(message_path) as message_io:
+                entry = json.load(message_io)
+        except (IOError, ValueError) as exc:
+            logging.error("Unable to read notification %s: %s",
+                          message_id, exc)
+            if os.path.exists(message_path):
+                os.unlink(message_path)
+            return
+
+        # Send to each service
+        from concurrent.futures import ThreadPoolExecutor
+        services = entry['services']
+        with ThreadPoolExecutor(max_workers=len(services) or 1) as pool:
+            results = list(pool.map(
+                lambda service: self._deliver(service, entry), services))
+
+        # Keep services which should be retried
+        entry['services'] = [
+            service for (service, result) in zip(services, results)
+            if result is None]
+        entry['attempts'] += 1
+
+        # Done
+        if not entry['services']:
+            os.unlink(message_path)
+            return
+
+        # Give up
+        if entry['attempts'] >= self.retries:
+            logging.error("Giving up on notification %s for %s",
+                          message_id, ', '.join(entry['services']))
+            os.unlink(message_path)
+            return
+
+        # Retry later
+        delay = self.backoff * 2 ** (entry['attempts'] - 1)
+        logging.warning("Retrying notification %s for %s in %s seconds",
+                        message_id, ', '.join(entry['services']), delay)
+        self._save(message_id, entry)
+        self._schedule(message_id, delay)
+
+    def _deliver(self, service, entry):
+        """Delivers a message to a single service.
+        """
+        try:
+            result = self.deliver(service, entry['message'], entry['title'])
+        except Exception as exc:
+            logging.warning("Unable to send %s notification: %s",
+                            service, exc)
+            return None
+        if result is False:
+            logging.error("Notification rejected by %s", service)
+        return result
+
+    def wait(self, timeout=None):
+        """Waits up to 'timeout' seconds for the outbox to empty.
+
+        Returns True if every message was sent.
+        """
+
+        with self.cond:
+            thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+        with self.cond:
+            return not self.pending and self.thread is None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __repr__(self):
+        return '<MHOutbox {0}>'.format(self.__dict__)
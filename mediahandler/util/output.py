@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.output
+
+Module contains:
+
+    - |MHOutputParser|
+        Incremental, line-oriented parser for Filebot and Beets output.
+
+    - |get_pattern()|
+        Compiles a regex once per process.
+
+    - |iter_lines()|
+        Runs a command and yields its output lines as they are produced.
+
+"""
+
+import re
+import logging
+from functools import lru_cache
+from subprocess import Popen, PIPE, STDOUT
+
+import mediahandler as mh
+
+
+@lru_cache(maxsize=None)
+def get_pattern(regex, flags=0):
+    """Returns a compiled regex, compiling each pattern only once.
+    """
+    return re.compile(regex, flags)
+
+
+def iter_lines(cmd):
+    """Runs a command and yields its combined output and error lines, as
+    bytes, as they are produced.
+    """
+
+    query = Popen(cmd, stdout=PIPE, stderr=STDOUT)
+    try:
+        for line in query.stdout:
+            yield line
+    finally:
+        query.stdout.close()
+        query.wait()
+
+
+class MHOutputParser(mh.MHObject):
+    """Incremental, line-oriented parser for Filebot and Beets output.
+
+    Lines are fed in as they are produced. Only the last few lines are
+    kept, enough for the longest multi-line pattern to match, so memory
+    use does not grow with the amount of output.
+
+    Required arguments:
+        - patterns
+            List of (event, regex, index) tuples. 'index' is the position
+            of the group to report, counting from 0.
+
+    Optional arguments:
+        - callback
+            Function called as callback(event, value) for each match, as
+            soon as it is found.
+
+    Public methods:
+
+        - feed()
+            Parses a single line of output.
+
+        - feed_text()
+            Parses a block of output.
+
+        - reset()
+            Discards all parsed output.
+
+        - results()
+            Returns the values found for an event.
+    """
+
+    def __init__(self, patterns, callback=None):
+        """Initializes the MHOutputParser object.
+        """
+
+        super(MHOutputParser, self).__init__()
+
+        self.patterns = [
+            (event, get_pattern(regex, re.IGNORECASE), index)
+            for (event, regex, index) in patterns]
+        self.callback = callback
+
+        # Number of lines the longest pattern can span
+        self.size = max(
+            [regex.count(r'\n') + 1 for (_, regex, _) in patterns] + [1])
+
+        self.window = []
+        self.found = {}
+        for (event, _, _) in patterns:
+            self.found[event] = []
+
+    def feed(self, line):
+        """Parses a single line of output, as str or bytes.
+        """
+
+        # Convert line to str, if needed
+        if not isinstance(line, str):
+            line = line.decode('utf-8', 'replace')
+        if not line.endswith('\n'):
+            line += '\n'
+
+        self.window.append(line)
+
+        # Report every match in the window
+        while self.window:
+            text = ''.join(self.window)
+            matches = [(regex.search(text), event, index)
+                       for (event, regex, index) in self.patterns]
+            matches = [match for match in matches if match[0] is not None]
+            if not matches:
+                break
+
+            # Use the first match
+            (match, event, index) = min(
+                matches, key=lambda match: match[0].start())
+            value = match.group(index + 1)
+            self.found[event].append(value)
+            if self.callback is not None:
+                self.callback(event, value)
+
+            # Drop the lines it was found in
+            end = match.end()
+            used = text[:end].count('\n')
+            if end == 0 or text[end - 1] != '\n':
+                used += 1
+            self.window = self.window[used:]
+
+        # Only keep enough lines for the longest pattern
+        if len(self.window) >= self.size:
+            self.window = self.window[len(self.window) - self.size + 1:]
+
+    def feed_text(self, text):
+        """Parses a block of output, as str or bytes.
+        """
+
+        # Convert text to str, if needed
+        if not isinstance(text, str):
+            text = text.decode('utf-8', 'replace')
+
+        for line in text.splitlines(True):
+            self.feed(line)
+
+    def reset(self):
+        """Discards all parsed output, e.g. when a query is restarted.
+        """
+        logging.debug("Discarding parsed output")
+        self.window = []
+        for event in self.found:
+            self.found[event] = []
+
+    def results(self, event):
+        """Returns the values found for an event, in the order found.
+        """
+        return list(self.found[event])
+
+    def __repr__(self):
+        return '<MHOutputParser {0}>'.format(self.__dict__)
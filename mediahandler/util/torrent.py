@@ -18,106 +18,288 @@
 Module: mediahandler.util.torrent
 
 Module contains:
+    - |MHDeluge|
+        A connection to the Deluge daemon which is kept open across
+        jobs and removes torrents in batches.
+
+    - |get_client()|
+        Returns the shared MHDeluge object for a set of Deluge settings.
+
     - |remove_deluge_torrent()|
         Removes a torrent from Deluge.
 
 """
 
+import atexit
 import logging
+import threading
 
+import mediahandler as mh
 
-def remove_deluge_torrent(settings, torrent_hash):
-    """Removes a torrent from Deluge.
+# Shared Deluge connections, by daemon and user
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+# Thread running the Twisted reactor
+_REACTOR_THREAD = None
+
+
+def _get_reactor():
+    """Returns the Twisted reactor, running in a background thread.
+
+    The reactor cannot be restarted once stopped, so it is started once
+    and left running for the life of the process.
+    """
+
+    global _REACTOR_THREAD
+
+    from twisted.internet import reactor
+
+    with _CLIENTS_LOCK:
+        if _REACTOR_THREAD is None:
+
+            # Enable deluge logging
+            from deluge import log
+            try:
+                log.setupLogger()
+            except AttributeError:
+                log.setup_logger()
+
+            # Start reactor
+            _REACTOR_THREAD = threading.Thread(
+                target=reactor.run,
+                kwargs={'installSignalHandlers': False},
+                name='mediahandler-reactor')
+            _REACTOR_THREAD.daemon = True
+            _REACTOR_THREAD.start()
+
+    return reactor
+
+
+class MHDeluge(mh.MHObject):
+    """A connection to the Deluge daemon which is kept open across jobs.
+
+    Torrents passed to remove() are removed by a background thread.
+    Torrents queued while a batch is being removed are sent together in
+    the next batch, and only the queued hashes are looked up, rather than
+    the full session state.
 
     Required arguments:
         - settings
             Dict or MHSettings object for Deluge info.
-        - torrent_hash
-            Valid hash of active torrent to be removed.
 
-    This is a Twisted Deferred object which hooks into the Deluge UI client.
-    For more information, visit:
+    Public methods:
+
+        - remove()
+            Queues torrents to be removed.
+
+        - wait()
+            Waits for queued torrents to be removed.
+
+        - disconnect()
+            Disconnects from the Deluge daemon.
+
+    This uses the Deluge UI client. For more information, visit:
     http://dev.deluge-torrent.org/wiki/Development/UiClient1.2
     """
 
-    logging.info("Removing torrent from Deluge")
+    def __init__(self, settings):
+        """Initializes the MHDeluge object.
 
-    # Import modules
-    from twisted.internet import reactor
-    from deluge.ui.client import client
-
-    # Connect to Deluge daemon
-    deluge = client.connect(
-        host=settings['host'],
-        port=settings['port'],
-        username=settings['user'],
-        password=settings['pass']
-    )
-
-    # We create a callback function to be called upon a successful connection
-    def on_connect_success(result):
-        """Connect success callback.
+        The connection is opened when the first batch is removed.
+        """
+
+        super(MHDeluge, self).__init__()
+
+        self.host = settings['host']
+        self.port = settings['port']
+        self.user = settings['user']
+        self.password = settings['pass']
+        self.client = None
+        self.pending = []
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def remove(self, torrent_hashes):
+        """Queues a list of torrent hashes to be removed, without waiting
+        for them to be removed.
+        """
+
+        with self.cond:
+            for torrent_hash in torrent_hashes:
+                if torrent_hash not in self.pending:
+                    self.pending.append(torrent_hash)
+
+            # Start remover
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name='mediahandler-deluge')
+                self.thread.start()
+
+    def _run(self):
+        """Removes queued torrents in batches until the queue is empty.
+        """
+
+        while True:
+            with self.cond:
+                batch = self.pending
+                self.pending = []
+                if not batch:
+                    self.thread = None
+                    self.cond.notify_all()
+                    return
+
+            try:
+                self._remove_batch(batch)
+            except Exception as exc:
+                logging.error("Unable to remove torrents: %s", exc)
+
+                # Reconnect for the next batch
+                self.disconnect()
+
+    def _connect(self, reactor):
+        """Connects to the Deluge daemon, if not already connected.
         """
 
+        from twisted.internet.threads import blockingCallFromThread
+        from deluge.ui.client import Client
+
+        if self.client is not None and self.client.connected():
+            return
+
+        logging.info("Connecting to Deluge")
+
+        self.client = Client()
+        result = blockingCallFromThread(
+            reactor, self.client.connect,
+            host=self.host, port=self.port,
+            username=self.user, password=self.password)
+
         logging.debug("Connection was successful: %s", result)
 
-        def on_remove_torrent(success):
-            """On remove callback.
-            """
-
-            if success:
-                logging.debug("Torrent remove successful")
-            else:
-                logging.warning("Torrent remove unsuccessful")
-
-            # Disconnect from the daemon & exit
-            client.disconnect()
-            reactor.stop()
-
-        def on_get_session_state(torrents):
-            """On session state callback.
-            """
-
-            # Look for completed torrent in list
-            found = False
-            for tor in torrents:
-                if tor == torrent_hash:
-
-                    # Set as found and call remove function
-                    logging.debug("Torrent found")
-                    found = True
-                    client.core.remove_torrent(
-                        torrent_hash,
-                        False).addCallback(
-                            on_remove_torrent)
-                    break
-
-            if not found:
-                logging.warning("Torrent not found")
-
-                # Disconnect from the daemon & exit
-                client.disconnect()
-                reactor.stop()
-
-        # Get list of current torrent hashes
-        client.core.get_session_state().addCallback(on_get_session_state)
-
-    # We add the callback to the Deferred object we got from connect()
-    deluge.addCallback(on_connect_success)
-
-    # To be called when an error is encountered
-    def on_connect_fail(result):
-        """Connect fail callback.
+    def _remove_batch(self, torrent_hashes):
+        """Removes a batch of torrents from Deluge.
+        """
+
+        from twisted.internet.threads import blockingCallFromThread
+
+        reactor = _get_reactor()
+        self._connect(reactor)
+        core = self.client.core
+
+        # Look up only the torrents in this batch
+        found = blockingCallFromThread(
+            reactor, core.get_torrents_status,
+            {'id': torrent_hashes}, ['hash'])
+        found = [tor for tor in torrent_hashes if tor in found]
+
+        for tor in torrent_hashes:
+            if tor not in found:
+                logging.warning("Torrent not found: %s", tor)
+        if not found:
+            return
+
+        logging.info("Removing %s torrent(s) from Deluge", len(found))
+
+        # Remove the batch in a single call
+        try:
+            errors = blockingCallFromThread(
+                reactor, core.remove_torrents, found, False)
+        except Exception as exc:
+            logging.debug("Batch remove unavailable: %s", exc)
+            errors = None
+
+        # Remove one at a time on older Deluge versions
+        if errors is None:
+            errors = []
+            for tor in found:
+                if not blockingCallFromThread(
+                        reactor, core.remove_torrent, tor, False):
+                    errors.append(tor)
+
+        if errors:
+            logging.warning("Torrent remove unsuccessful: %s", errors)
+        else:
+            logging.debug("Torrent remove successful")
+
+    def wait(self, timeout=None):
+        """Waits up to 'timeout' seconds for queued torrents to be removed.
+
+        Returns True if the queue is empty.
+        """
+
+        with self.cond:
+            self.cond.wait_for(lambda: self.thread is None, timeout)
+            return self.thread is None
+
+    def disconnect(self):
+        """Disconnects from the Deluge daemon.
         """
 
-        logging.error("Connection failed: %s", result)
+        client = self.client
+        self.client = None
+        if client is None or not client.connected():
+            return
+
+        from twisted.internet.threads import blockingCallFromThread
+
+        try:
+            blockingCallFromThread(_get_reactor(), client.disconnect)
+        except Exception as exc:
+            logging.debug("Deluge disconnect error: %s", exc)
+
+    def __repr__(self):
+        return '<MHDeluge {0}>'.format(self.__dict__)
+
 
-        # Disconnect from the daemon & exit
+def get_client(settings):
+    """Returns the shared MHDeluge object for a set of Deluge settings.
+    """
+
+    key = (settings['host'], settings['port'], settings['user'])
+
+    with _CLIENTS_LOCK:
+        if key not in _CLIENTS:
+            _CLIENTS[key] = MHDeluge(settings)
+        return _CLIENTS[key]
+
+
+@atexit.register
+def disconnect_clients():
+    """Disconnects all shared MHDeluge objects.
+    """
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+    for client in clients:
         client.disconnect()
-        reactor.stop()
 
-    # We add the callback (in this case it's an errback, for error)
-    deluge.addErrback(on_connect_fail)
 
-    # Run the twisted main loop to make everything go
-    reactor.run()
+def remove_deluge_torrent(settings, torrent_hash, timeout=None):
+    """Removes a torrent from Deluge.
+
+    Required arguments:
+        - settings
+            Dict or MHSettings object for Deluge info.
+        - torrent_hash
+            Valid hash of active torrent to be removed, or a list of
+            hashes to remove as a batch.
+
+    Optional arguments:
+        - timeout
+            Number of seconds to wait for the removal. Waits until it
+            is done by default.
+
+    Uses the shared MHDeluge connection from get_client().
+    """
+
+    logging.info("Removing torrent from Deluge")
+
+    # Allow a single hash or a list of hashes
+    if not isinstance(torrent_hash, list):
+        torrent_hash = [torrent_hash]
+
+    # Queue torrents and wait for them to be removed
+    client = get_client(settings)
+    client.remove(torrent_hash)
+
+    return client.wait(timeout)
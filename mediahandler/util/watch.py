@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""
+Module: mediahandler.util.watch
+
+Module contains:
+
+    - |MHWatcher|
+        Watches the <media type> folders of a download folder for file
+        system events and queues new items once they have settled.
+
+    - |MHSettleTracker|
+        Tracks changed items and reports those which have stopped
+        growing for a settle window.
+
+"""
+
+import os
+import logging
+import threading
+from time import time
+
+import mediahandler as mh
+import mediahandler.util.args as Args
+import mediahandler.util.extract as Extract
+
+
+def get_item_state(item):
+    """Returns a tuple of the number of files, total size and latest
+    modification time of a file or folder, or None if it no longer exists.
+    """
+
+    # Single file
+    if os.path.isfile(item):
+        try:
+            stat = os.stat(item)
+        except OSError:
+            return None
+        return 1, stat.st_size, stat.st_mtime
+
+    # Folder, or missing item
+    if not os.path.isdir(item):
+        return None
+
+    count = size = mtime = 0
+    for root, _, files in os.walk(item):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            count += 1
+            size += stat.st_size
+            mtime = max(mtime, stat.st_mtime)
+
+    return count, size, mtime
+
+
+class MHSettleTracker(object):
+    """Tracks items which have changed and reports those which have stopped
+    growing, i.e. whose size and modification time have not changed for
+    the settle window.
+
+    Only changed items are checked, so the cost does not grow with the
+    number of entries in the watched folders.
+
+    Required argument:
+        - settle
+            Number of seconds an item must stay unchanged.
+    """
+
+    def __init__(self, settle):
+        """Initializes the MHSettleTracker object.
+        """
+
+        self.settle = settle
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def touch(self, item, now=None):
+        """Marks an item as changed.
+        """
+
+        if now is None:
+            now = time()
+
+        with self.lock:
+            state = self.items.get(item, (None, now))[0]
+            self.items[item] = (state, now)
+
+    def ready(self, now=None):
+        """Returns a sorted list of tracked items which have settled, and
+        stops tracking them.
+
+        Items which no longer exist are dropped.
+        """
+
+        if now is None:
+            now = time()
+
+        settled = []
+        with self.lock:
+            for item, (state, changed) in list(self.items.items()):
+
+                # Wait for the settle window after the last event
+                if now - changed < self.settle:
+                    continue
+
+                # Compare with the state seen at the last check
+                new_state = get_item_state(item)
+                if new_state is None:
+                    del self.items[item]
+                elif new_state == state:
+                    del self.items[item]
+                    settled.append(item)
+                else:
+                    self.items[item] = (new_state, now)
+
+        return sorted(settled)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _MHEventHandler(object):
+    """Receives watchdog events and marks the top-level item they belong to
+    as changed.
+
+    Events for items which have already been queued are ignored, so the
+    daemon's own changes to them are not picked up as new media.
+    """
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        """Handles a single watchdog file system event.
+        """
+
+        src_item = self.watcher.get_item(event.src_path)
+        dest_item = None
+        if getattr(event, 'dest_path', None):
+            dest_item = self.watcher.get_item(event.dest_path)
+
+        # Forget queued items once they are removed
+        if event.event_type == 'deleted' and src_item == event.src_path:
+            self.watcher.release(src_item)
+            return
+
+        # Ignore changes to queued items, and files moved out of them
+        if self.watcher.is_queued(src_item):
+            if dest_item is not None and dest_item != src_item:
+                self.watcher.claim(dest_item)
+            return
+
+        for item in (src_item, dest_item):
+            if item is not None and not self.watcher.is_queued(item):
+                self.watcher.tracker.touch(item)
+
+
+class MHWatcher(mh.MHObject):
+    """Watches the <media type> folders of a download folder for file
+    system events and queues new items once they have settled.
+
+    Assumes directory structure: ::
+
+        <folder>/<media type>/<media name>
+
+    Requires the watchdog python module.
+
+    Once an item is queued, later changes to it are ignored until it is
+    removed, along with the folder a compressed item is extracted to and
+    anything moved out of it. This keeps the daemon's own changes, and
+    items kept after processing, from being queued again.
+
+    Required arguments:
+        - folder
+            Path to the folder which contains the <media type> folders.
+        - settle
+            Number of seconds an item must stop changing before it is
+            added.
+        - queue
+            MHJobQueue object which receives add_media() jobs.
+
+    Public methods:
+
+        - start()
+            Starts watching for file system events.
+
+        - stop()
+            Stops watching for file system events.
+
+        - check()
+            Queues any items which have settled.
+
+        - claim()
+            Ignores changes to an item.
+
+        - release()
+            Stops ignoring changes to an item.
+
+        - is_queued()
+            Checks whether changes to an item are ignored.
+    """
+
+    def __init__(self, folder, settle, queue):
+        """Initializes the MHWatcher object.
+        """
+
+        super(MHWatcher, self).__init__()
+
+        self.folder = os.path.abspath(folder)
+        self.queue = queue
+        self.tracker = MHSettleTracker(settle)
+        self.observer = None
+        self.stopped = threading.Event()
+        self.queued = set()
+        self.lock = threading.Lock()
+
+    def get_types(self):
+        """Returns the paths of the <media type> folders to watch.
+        """
+
+        return sorted(
+            os.path.join(self.folder, name)
+            for name in os.listdir(self.folder)
+            if name.lower() in mh.__mediatypes__ and
+            os.path.isdir(os.path.join(self.folder, name)))
+
+    def get_item(self, path):
+        """Returns the top-level media item a path belongs to, or None if
+        it is not inside a <media type> folder.
+        """
+
+        relpath = os.path.relpath(os.path.abspath(path), self.folder)
+        parts = relpath.split(os.path.sep)
+
+        # Need at least <media type>/<media name>
+        if len(parts) < 2 or parts[0] == os.pardir:
+            return None
+        if parts[0].lower() not in mh.__mediatypes__:
+            return None
+
+        # Skip hidden files, e.g. partial downloads
+        if parts[1].startswith('.'):
+            return None
+
+        return os.path.join(self.folder, parts[0], parts[1])
+
+    def claim(self, item):
+        """Ignores changes to an item until it is removed.
+        """
+        with self.lock:
+            self.queued.add(item)
+
+    def release(self, item):
+        """Stops ignoring changes to an item.
+        """
+        with self.lock:
+            self.queued.discard(item)
+
+    def is_queued(self, item):
+        """Returns True if changes to an item are being ignored.
+        """
+        with self.lock:
+            return item in self.queued
+
+    def check(self, now=None):
+        """Queues an add_media() job for each item which has settled.
+
+        Returns a list of the queued items.
+        """
+
+        queued = []
+        for item in self.tracker.ready(now):
+
+            # Skip items changed by a queued job
+            if self.is_queued(item):
+                continue
+
+            # Validate item as the CLI would
+            try:
+                args = Args.get_add_media_args(item)
+            except SystemExit as exc:
+                logging.warning("Skipping watched item %s: %s", item, exc)
+                continue
+
+            # Ignore the job's own changes to the item
+            self.claim(item)
+            extract_folder = Extract.get_extract_folder(item)
+            if extract_folder is not None and os.path.isfile(item):
+                self.claim(extract_folder)
+
+            logging.info("Watched item settled: %s", item)
+            args.pop('config', None)
+            self.queue.put(args)
+            queued.append(item)
+
+        return queued
+
+    def start(self):
+        """Starts watching the <media type> folders for file system events
+        and checking for settled items in the background.
+        """
+
+        from watchdog.observers import Observer
+
+        # Set up observer
+        self.observer = Observer()
+        handler = _MHEventHandler(self)
+        for folder in self.get_types():
+            logging.info("Watching folder: %s", folder)
+            self.observer.schedule(handler, folder, recursive=True)
+        self.observer.start()
+
+        # Check for settled items in the background
+        self.stopped.clear()
+        checker = threading.Thread(target=self._check_loop)
+        checker.daemon = True
+        checker.start()
+
+    def _check_loop(self):
+        """Checks for settled items every second until stopped.
+        """
+
+        while not self.stopped.wait(1):
+            try:
+                self.check()
+            except Exception:
+                logging.exception("Unable to check watched items")
+
+    def stop(self):
+        """Stops watching for file system events.
+        """
+
+        self.stopped.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+
+    def __repr__(self):
+        return '<MHWatcher {0}>'.format(self.__dict__)
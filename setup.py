@@ -39,6 +39,7 @@ setup(
     long_description=open('README.md').read(),
     test_suite='tests.testall.suite',
     include_package_data=True,
+    python_requires='>=3.6',
 
     packages=[
         'mediahandler',
@@ -49,14 +50,15 @@ setup(
     entry_points={
         'console_scripts': [
             'addmedia=mediahandler.handler:main',
-            'addmedia-deluge=mediahandler.handler:deluge'
+            'addmedia-deluge=mediahandler.handler:deluge',
+            'addmedia-daemon=mediahandler.handler:daemon'
         ]
     },
     scripts=_extra_scripts,
 
     install_requires=[
         'pyyaml',
-        'google-api-python-client',
+        'google-api-python-client>=2.0.0',
         'mutagen',
         'oauth2client<=3.0.0',
         'setuptools>=40.3.0',
@@ -72,6 +74,13 @@ setup(
             'twisted',
             'pyopenssl'
         ],
+        'watch': [
+            'watchdog'
+        ],
+        'extract': [
+            'rarfile',
+            'py7zr'
+        ],
     },
 
     tests_require=[
@@ -88,8 +97,8 @@ setup(
         'Environment :: MacOS X',
         'Environment :: Console',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
-        'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.6',
         'Operating System :: MacOS',
         'Operating System :: POSIX :: Linux',
     ],
@@ -90,6 +90,7 @@ class ArgsTests(unittest.TestCase):
         (config, args) = Args.get_arguments(True)
         expected = {
             'media': self.tmp_file,
+            'hash': 'hash',
             'name': file_name,
             'no_push': False,
             'single_track': False,
@@ -19,9 +19,11 @@
 import os
 import mock
 import shutil
+import requests
 
 import tests.common as common
 from tests.common import unittest
+from tests.common import tempfile
 from tests.common import MHTestSuite
 
 from tests.test_media import MediaObjectTests
@@ -44,9 +46,22 @@ class BookMediaObjectTests(MediaObjectTests):
         self.settings['api_key'] = common.get_google_api()
         self.settings['chapter_length'] = 8
         self.settings['make_chapters'] = False
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        # Build a new Google Books service for each test
+        self.services = mock.patch.dict(Books._SERVICES, clear=True)
+        self.services.start()
         # Make an object
         self.book = Books.MHAudiobook(self.settings, self.push)
 
+    def tearDown(self):
+        super(BookMediaObjectTests, self).tearDown()
+        self.services.stop()
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
 
 class BaseBookObjectTests(BookMediaObjectTests):
 
@@ -98,6 +113,43 @@ class BookCleanStringTests(BookMediaObjectTests):
         self.assertEqual(self.book._clean_string(string), expected)
 
 
+class TitleCleanerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.blacklist = os.path.join(self.folder, 'blacklist.txt')
+        with open(self.blacklist, 'w') as blacklist_io:
+            blacklist_io.write('mp3\nunabridged\n\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_clean(self):
+        cleaner = Books.MHTitleCleaner(self.blacklist)
+        self.assertEqual(
+            cleaner.clean('Voices_MP3 (2008)  Unabridged [64k] GRiMM CPK'),
+            'Voices GRiMM')
+        self.assertEqual(cleaner.clean('Outrage\nEnd'), 'Outrage End')
+        self.assertEqual(cleaner.clean(''), '')
+
+    def test_clean_many(self):
+        cleaner = Books.MHTitleCleaner(self.blacklist)
+        titles = ['Voices (MP3)', 'Jar City - 2000', '', 'The  Goldfinch ']
+        results = cleaner.clean_many(titles)
+        self.assertListEqual(
+            results, ['Voices', 'Jar City', '', 'The Goldfinch'])
+        self.assertListEqual(
+            results, [cleaner.clean(title) for title in titles])
+
+    def test_get_cleaner_once(self):
+        with mock.patch.dict(Books._CLEANERS, clear=True):
+            first = Books.get_cleaner(self.blacklist)
+            # Blacklist is not read again
+            os.remove(self.blacklist)
+            self.assertIs(Books.get_cleaner(self.blacklist), first)
+            self.assertIsInstance(Books.get_cleaner(), Books.MHTitleCleaner)
+
+
 class BookSaveCoverTests(BookMediaObjectTests):
 
     def setUp(self):
@@ -125,6 +177,94 @@ class BookSaveCoverTests(BookMediaObjectTests):
         self.assertEqual(result, expected)
         self.assertFalse(hasattr(self.book.book_info, 'cover_image'))
 
+    def test_save_cover_linked(self):
+        img_url = 'http://books.google.com/books/content?id=4lYZAwAAQBAJ&printsec=frontcover&img=1&zoom=1&edge=curl&source=gbs_api'
+        expected = os.path.join(self.folder, 'cover.jpg')
+        session = mock.MagicMock()
+        session.get.return_value.iter_content.return_value = [b'cover']
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=session):
+            result = self.book._save_cover(self.folder, img_url)
+        self.assertEqual(result, expected)
+        self.assertEqual(self.book.book_info.cover_image, expected)
+        self.assertTrue(os.path.samefile(result, Books.get_cover(img_url)))
+
+    def test_save_cover_cross_device(self):
+        img_url = 'http://books.google.com/books/content?id=4lYZAwAAQBAJ&printsec=frontcover&img=1&zoom=1&edge=curl&source=gbs_api'
+        expected = os.path.join(self.folder, 'cover.jpg')
+        session = mock.MagicMock()
+        session.get.return_value.iter_content.return_value = [b'cover']
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=session):
+            cached = Books.get_cover(img_url)
+            with mock.patch('os.link', side_effect=OSError('cross-device link')):
+                result = self.book._save_cover(self.folder, img_url)
+        self.assertEqual(result, expected)
+        self.assertFalse(os.path.islink(result))
+        with open(result, 'rb') as cover_io:
+            self.assertEqual(cover_io.read(), b'cover')
+        self.assertFalse(os.path.samefile(result, cached))
+
+    def test_save_cover_failed(self):
+        img_url = 'http://books.google.com/books/content?id=4lYZAwAAQBAJ&printsec=frontcover&img=1&zoom=1&edge=curl&source=gbs_api'
+        session = mock.MagicMock()
+        session.get.side_effect = requests.ConnectionError('offline')
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=session):
+            result = self.book._save_cover(self.folder, img_url)
+        self.assertIsNone(result)
+        self.assertFalse(hasattr(self.book.book_info, 'cover_image'))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, 'cover.jpg')))
+
+
+class CoverCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        self.url = 'http://books.google.com/books/content?id=4lYZAwAAQBAJ&printsec=frontcover&img=1&zoom=1&edge=curl&source=gbs_api'
+        # Fake HTTP session
+        self.session = mock.MagicMock()
+        self.session.get.return_value.iter_content.return_value = [
+            b'cover', b'image']
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def test_cover_downloaded_once(self):
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=self.session):
+            first = Books.get_cover(self.url)
+            second = Books.get_cover(self.url)
+        self.assertEqual(first, second)
+        self.session.get.assert_called_once_with(
+            self.url.replace('&edge=curl', ''), stream=True,
+            timeout=Books.COVER_TIMEOUT)
+        with open(first, 'rb') as cover_io:
+            self.assertEqual(cover_io.read(), b'coverimage')
+
+    def test_cover_same_contents(self):
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=self.session):
+            first = Books.get_cover(self.url)
+            second = Books.get_cover(self.url.replace('4lYZ', 'XXXX'))
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.samefile(first, second))
+        covers = os.listdir(os.path.join(self.cache, 'covers'))
+        self.assertEqual(
+            len([name for name in covers if name.startswith('sha-')]), 1)
+
+    def test_cover_failed(self):
+        self.session.get.return_value.raise_for_status.side_effect = \
+            IOError('404')
+        with mock.patch('mediahandler.types.audiobooks._get_cover_session',
+                        return_value=self.session):
+            self.assertRaises(IOError, Books.get_cover, self.url)
+        self.assertListEqual(
+            os.listdir(os.path.join(self.cache, 'covers')), [])
+
 
 class BookCalculateChunkTests(BookMediaObjectTests):
 
@@ -179,6 +319,143 @@ class BookCalculateChunkTests(BookMediaObjectTests):
         self.assertListEqual(result, expected)
 
 
+class PlanPartsTests(unittest.TestCase):
+
+    def test_plan_single(self):
+        self.assertListEqual(Books.plan_parts([], 10), [])
+        self.assertListEqual(Books.plan_parts([3, 4, 3], 10), [(0, 3)])
+
+    def test_plan_balanced(self):
+        # Splitting by file count would give parts of 14 and 4
+        lengths = [9, 1, 1, 3, 1, 1]
+        self.assertListEqual(
+            Books.plan_parts(lengths, 10), [(0, 1), (1, 6)])
+        lengths = [2, 2, 2, 2, 2, 2, 8, 2]
+        self.assertListEqual(
+            Books.plan_parts(lengths, 10), [(0, 5), (5, 7), (7, 8)])
+
+    def test_plan_within_max(self):
+        lengths = [4, 4, 4, 4, 4, 4, 4]
+        bounds = Books.plan_parts(lengths, 10)
+        self.assertEqual(len(bounds), 4)
+        for (start, end) in bounds:
+            self.assertLessEqual(sum(lengths[start:end]), 10)
+        self.assertEqual(bounds[0][0], 0)
+        self.assertEqual(bounds[-1][1], len(lengths))
+
+    def test_plan_long_file(self):
+        self.assertListEqual(
+            Books.plan_parts([3, 12, 3], 10), [(0, 1), (1, 2), (2, 3)])
+        self.assertListEqual(Books.plan_parts([12], 10), [(0, 1)])
+
+
+class ChapterizeFilesTests(BookMediaObjectTests):
+
+    def setUp(self):
+        super(ChapterizeFilesTests, self).setUp()
+        self.book.php = 'php'
+        self.book.abc = 'abc.php'
+        self.book.file_type = 'mp3'
+        self.book.book_info = mock.MagicMock()
+        self.parts = [os.path.join(self.folder, 'Part {0}'.format(i + 1))
+                      for i in range(4)]
+        self.started = []
+
+    def get_query(self, fail=None):
+        def _query(cmd, **kwargs):
+            part = cmd[3]
+            self.started.append(part)
+            query = mock.MagicMock()
+            query.poll.return_value = None
+            if part == fail:
+                query.communicate.return_value = (b'error', b'')
+            else:
+                name = os.path.basename(part)
+                query.communicate.return_value = (
+                    "Audiobook '{0}.m4b' created succsessfully!".format(
+                        name).encode('utf-8'), b'')
+            return query
+        return _query
+
+    @mock.patch('mediahandler.types.audiobooks.move')
+    def test_chapterize_in_order(self, move):
+        with mock.patch.object(self.book, '_get_chapters',
+                               return_value=self.parts):
+            with mock.patch('mediahandler.types.audiobooks.Popen',
+                            side_effect=self.get_query()):
+                (success, files) = self.book._chapterize_files(
+                    self.folder, [])
+        self.assertTrue(success)
+        self.assertListEqual(files, [
+            os.path.join(self.folder, 'Part {0} - {0}.m4b'.format(i + 1))
+            for i in range(4)])
+        self.assertEqual(move.call_count, 4)
+
+    @mock.patch('os.cpu_count', return_value=1)
+    @mock.patch('mediahandler.types.audiobooks.move')
+    def test_chapterize_failure(self, move, _):
+        with mock.patch.object(self.book, '_get_chapters',
+                               return_value=self.parts):
+            with mock.patch('mediahandler.types.audiobooks.Popen',
+                            side_effect=self.get_query(self.parts[1])):
+                (success, output) = self.book._chapterize_files(
+                    self.folder, [])
+        self.assertFalse(success)
+        self.assertEqual(output, 'error')
+        # Later parts are not started
+        self.assertListEqual(self.started, self.parts[:2])
+
+
+class SetBookInfoTests(BookMediaObjectTests):
+
+    @mock.patch('googleapiclient.discovery.build')
+    def test_service_reused(self, build):
+        build.return_value.volumes.return_value.list.return_value. \
+            execute.return_value = {'items': []}
+        Books.get_book_info('key', 'Voices Arnaldur')
+        Books.get_book_info('key', 'Outrage Arnaldur')
+        build.assert_called_once_with(
+            'books', 'v1', developerKey='key', static_discovery=True)
+        build.return_value.volumes.return_value.list.assert_called_with(
+            q='Outrage Arnaldur', orderBy='relevance', printType='BOOKS',
+            maxResults=1, fields=Books.BOOK_FIELDS)
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_set_book_info_no_results(self, query):
+        query.return_value = None
+        regex = r'Unable to match audiobook files: nothing'
+        self.assertRaisesRegexp(
+            SystemExit, regex, self.book.set_book_info, 'nothing')
+
+    @mock.patch('mediahandler.types.audiobooks.get_book_info_many')
+    def test_resolve_many(self, get_many):
+        get_many.return_value = {'voices arnaldur': {'short_title': 'Voices'}}
+        raw = os.path.join(self.folder, 'Voices [mp3]')
+        results = self.book.resolve_many(
+            [(raw, None), (raw, 'Voices Arnaldur')])
+        get_many.assert_called_once_with(
+            self.book.api_key, [self.book._clean_string(raw),
+                                'Voices Arnaldur'],
+            self.book.cache_ttl, self.book.cache_size)
+        self.assertListEqual(results, [None, {'short_title': 'Voices'}])
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_set_book_info_resolved(self, query):
+        self.book.resolved_info = self.book.MHSettings(
+            {'short_title': 'Voices'})
+        self.book.set_book_info('Voices Arnaldur')
+        self.assertEqual(self.book.book_info.short_title, 'Voices')
+        self.assertFalse(query.called)
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_set_book_info_cached(self, query):
+        query.return_value = {'short_title': 'Voices'}
+        self.book.set_book_info('Voices Arnaldur')
+        self.book.set_book_info('Voices Arnaldur')
+        self.assertEqual(self.book.book_info.short_title, 'Voices')
+        query.assert_called_once_with(self.book.api_key, 'Voices Arnaldur')
+
+
 class GetChaptersTests(BookMediaObjectTests):
 
     def make_cover(self):
@@ -227,6 +504,242 @@ class GetChaptersTests(BookMediaObjectTests):
         self.assertListEqual(result, expected)
 
 
+    def test_chapters_subfolders(self):
+        # Set up extracted subfolders
+        file_array = [os.path.join('CD1', '01.mp3'), os.path.join('CD2', '01.mp3')]
+        for get_file in file_array:
+            os.makedirs(os.path.join(self.folder, os.path.dirname(get_file)))
+            open(os.path.join(self.folder, get_file), 'w').close()
+        self.make_cover()
+        # Run test
+        with mock.patch.object(self.book, '_calculate_chunks',
+                               return_value=[file_array]):
+            result = self.book._get_chapters(self.folder, file_array, 'mp3')
+        # Check results
+        part = os.path.join(self.folder, 'Part 1')
+        self.assertListEqual(result, [part])
+        self.assertListEqual(sorted(os.listdir(part)), [
+            'CD1 - 01.mp3', 'CD2 - 01.mp3', 'cover.jpg'])
+
+
+    def test_chapters_no_cover(self):
+        file_array = ['01.mp3', '02.mp3']
+        for get_file in file_array:
+            open(os.path.join(self.folder, get_file), 'w').close()
+        # Cover download fails
+        self.book.book_info = self.book.MHSettings({})
+        with mock.patch('mediahandler.types.audiobooks.get_cover',
+                        side_effect=requests.ConnectionError('offline')):
+            self.assertIsNone(self.book._save_cover(
+                self.folder, 'http://books.google.com/cover'))
+        # Book is still staged, without a cover
+        with mock.patch.object(self.book, '_calculate_chunks',
+                               return_value=[file_array]):
+            result = self.book._get_chapters(self.folder, file_array, 'mp3')
+        part = os.path.join(self.folder, 'Part 1')
+        self.assertListEqual(result, [part])
+        self.assertListEqual(sorted(os.listdir(part)), file_array)
+
+
+class BooksRequestTests(unittest.TestCase):
+
+    @common.skipUnlessHasMod('googleapiclient', 'discovery')
+    def test_request_valid(self):
+        # Bundled discovery document validates parameters without network
+        with mock.patch.dict(Books._SERVICES, clear=True):
+            service = Books._get_books_service('key')
+        request = Books._get_books_request(service, 'Voices Arnaldur')
+        self.assertIn('printType=BOOKS', request.uri)
+        self.assertIn('maxResults=1', request.uri)
+
+
+class BookInfoCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        self.result = {'id': 'BDgMX4r2efUC', 'short_title': 'Voices'}
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_cache_hit(self, query):
+        query.return_value = self.result
+        result = Books.get_book_info('key', 'Voices Arnaldur', 60)
+        self.assertDictEqual(result, self.result)
+        # Same query, ignoring case and punctuation
+        result = Books.get_book_info('key', 'voices,  arnaldur!', 60)
+        self.assertDictEqual(result, self.result)
+        query.assert_called_once_with('key', 'Voices Arnaldur')
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_cache_bypass(self, query):
+        query.return_value = self.result
+        Books.get_book_info('key', 'Voices Arnaldur')
+        Books.get_book_info('key', 'Voices Arnaldur', 0)
+        self.assertEqual(query.call_count, 2)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.cache, 'books.json')))
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_cache_expired(self, query):
+        query.return_value = self.result
+        with mock.patch('mediahandler.types.audiobooks.time',
+                        return_value=1000):
+            Books.get_book_info('key', 'Voices Arnaldur', 60)
+        with mock.patch('mediahandler.types.audiobooks.time',
+                        return_value=1061):
+            Books.get_book_info('key', 'Voices Arnaldur', 60)
+        self.assertEqual(query.call_count, 2)
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_cache_no_results(self, query):
+        query.return_value = None
+        with mock.patch('mediahandler.types.audiobooks.time',
+                        return_value=1000):
+            self.assertIsNone(Books.get_book_info('key', 'nothing', 86400))
+            self.assertIsNone(Books.get_book_info('key', 'nothing', 86400))
+        self.assertEqual(query.call_count, 1)
+        # No results are kept for a shorter time
+        with mock.patch('mediahandler.types.audiobooks.time',
+                        return_value=1000 + Books.NEGATIVE_TTL):
+            Books.get_book_info('key', 'nothing', 86400)
+        self.assertEqual(query.call_count, 2)
+
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_cache_size(self, query):
+        query.side_effect = lambda key, query: {'id': query}
+        for (now, name) in enumerate(['a', 'b', 'a', 'c']):
+            with mock.patch('mediahandler.types.audiobooks.time',
+                            return_value=1000 + now):
+                Books.get_book_info('key', name, 60, 2)
+        # Least recently used lookup was dropped
+        self.assertEqual(query.call_count, 3)
+        self.assertListEqual(
+            sorted(Books._read_books_cache().keys()), ['a', 'c'])
+
+
+class BookInfoManyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        # Fake batch requests
+        self.batches = []
+        self.service = mock.MagicMock()
+        self.service.new_batch_http_request.side_effect = self.new_batch
+        self.service.volumes.return_value.list.side_effect = \
+            lambda **kwargs: kwargs['q']
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def new_batch(self, callback):
+        batch = mock.MagicMock()
+        requests = []
+        batch.add.side_effect = \
+            lambda request, request_id: requests.append((request_id, request))
+
+        def _execute():
+            for (request_id, query) in requests:
+                items = []
+                if query != 'nothing':
+                    items = [{'id': query, 'volumeInfo': {
+                        'title': query, 'authors': ['Author'],
+                        'publishedDate': '2008-09-02',
+                        'imageLinks': {'thumbnail': ''}}}]
+                callback(request_id, {'items': items}, None)
+
+        batch.execute.side_effect = _execute
+        self.batches.append(requests)
+        return batch
+
+    @mock.patch('mediahandler.types.audiobooks.BATCH_SIZE', 2)
+    @mock.patch('mediahandler.types.audiobooks.sleep')
+    @mock.patch('mediahandler.types.audiobooks._query_books')
+    def test_resolve_many(self, query, sleep):
+        queries = ['Voices', 'voices!', 'Outrage', 'Lovely Bones', 'nothing']
+        with mock.patch('mediahandler.types.audiobooks._get_books_service',
+                        return_value=self.service):
+            results = Books.get_book_info_many('key', queries, 60)
+        # Queries are de-duplicated and batched
+        self.assertListEqual(self.batches, [
+            [('lovely bones', 'Lovely Bones'), ('nothing', 'nothing')],
+            [('outrage', 'Outrage'), ('voices', 'Voices')]])
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(results['voices']['short_title'], 'Voices')
+        self.assertIsNone(results['nothing'])
+        # Later lookups use the cache
+        result = Books.get_book_info('key', 'VOICES', 60)
+        self.assertEqual(result['short_title'], 'Voices')
+        self.assertIsNone(Books.get_book_info('key', 'nothing', 60))
+        self.assertFalse(query.called)
+
+    def test_resolve_many_cached(self):
+        with mock.patch('mediahandler.types.audiobooks._query_books',
+                        return_value={'id': 'voices'}):
+            Books.get_book_info('key', 'Voices', 60)
+        with mock.patch('mediahandler.types.audiobooks._get_books_service',
+                        return_value=self.service):
+            results = Books.get_book_info_many('key', ['Voices', 'Outrage'], 60)
+        self.assertListEqual(self.batches, [[('outrage', 'Outrage')]])
+        self.assertListEqual(list(results.keys()), ['outrage'])
+
+    def test_resolve_many_transport_error(self):
+        # Errors other than HttpError, e.g. from httplib2, are not raised
+        def new_batch(callback):
+            batch = mock.MagicMock()
+            batch.execute.side_effect = ValueError('Unable to find the server')
+            return batch
+        self.service.new_batch_http_request.side_effect = new_batch
+        with mock.patch('mediahandler.types.audiobooks._get_books_service',
+                        return_value=self.service):
+            results = Books.get_book_info_many('key', ['Voices'], 60)
+        self.assertDictEqual(results, {})
+
+    def test_resolve_many_no_cache(self):
+        with mock.patch('mediahandler.types.audiobooks._get_books_service',
+                        return_value=self.service):
+            results = Books.get_book_info_many('key', ['Voices'], 0)
+        self.assertListEqual(self.batches, [[('voices', 'Voices')]])
+        self.assertEqual(results['voices']['short_title'], 'Voices')
+        # Results are not saved
+        self.assertDictEqual(Books._read_books_cache(), {})
+
+
+class LinkFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.start = common.make_tmp_file('.mp3', self.folder)
+        self.end = os.path.join(self.folder, 'Part 1.mp3')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_link_hardlink(self):
+        self.assertEqual(Books.link_file(self.start, self.end), 'hardlink')
+        self.assertTrue(os.path.samefile(self.start, self.end))
+        # Replaces a previous file
+        self.assertEqual(Books.link_file(self.start, self.end), 'hardlink')
+
+    @mock.patch('os.symlink')
+    @mock.patch('os.link', side_effect=OSError('cross-device link'))
+    def test_link_copy(self, _, symlink):
+        self.assertEqual(Books.link_file(self.start, self.end), 'copy')
+        self.assertFalse(symlink.called)
+        self.assertFalse(os.path.islink(self.end))
+        self.assertFalse(os.path.samefile(self.start, self.end))
+        # Copy outlives the original
+        os.remove(self.start)
+        self.assertTrue(os.path.isfile(self.end))
+
+
 # @unittest.skipUnless(sys.platform.startswith("linux"), "requires a Linux system")
 @unittest.skip("Too resource heavy right now")
 class AddBookTest(BookMediaObjectTests):
@@ -299,6 +812,20 @@ class GetFilesTests(BookMediaObjectTests):
         self.assertListEqual(sorted(expected), sorted(result))
         self.assertEqual(self.book.file_type, 'mp3')
 
+    def test_get_files_subfolders(self):
+        # Set up extracted subfolders, and a part folder from an earlier run
+        for name in ['CD1', 'CD2', 'Part 1']:
+            os.makedirs(os.path.join(self.folder, name))
+        for name in ['CD1', 'CD2', 'Part 1']:
+            open(os.path.join(self.folder, name, '01.mp3'), 'w').close()
+        # Set up test
+        expected = [os.path.join('CD1', '01.mp3'), os.path.join('CD2', '01.mp3')]
+        # Run test
+        (success, result) = self.book._get_files(self.folder, False)
+        # Check results
+        self.assertTrue(success)
+        self.assertListEqual(expected, result)
+
     @common.skipUnlessHasMod('mutagen', 'mp3')
     def test_get_files_bad_chaptered(self):
         # Set up folder
@@ -362,6 +889,8 @@ class MoveFilesBookTests(BookMediaObjectTests):
                     'imageLinks': {'thumbnail': ''}
                 }
             }]
+        # Rebuild the service built in setUp
+        Books._SERVICES.clear()
         self.book.set_book_info('The Lovely Bones Alice Sebold')
         # Make dummy file
         book_file = common.make_tmp_file('.m4b', self.folder)
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import shutil
+import logging
+
+import mock
+
+import tests.common as common
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.cleanup as Cleanup
+import mediahandler.util.config as Config
+
+
+class CleanupTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.queue = os.path.join(self.folder, 'queue')
+        self.cleanup = Cleanup.MHCleanup(self.queue, retries=2, backoff=0.01)
+        # Make a nested download folder
+        self.download = os.path.join(self.folder, 'download')
+        os.makedirs(os.path.join(self.download, 'Subs'))
+        for name in ['a.mkv', 'b.nfo', os.path.join('Subs', 'a.srt')]:
+            with open(os.path.join(self.download, name), 'w') as tmp_io:
+                tmp_io.write('tmp')
+        os.symlink(self.queue, os.path.join(self.download, 'link'))
+        self.single = common.make_tmp_file('.mkv', self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def get_queue(self):
+        return [name for name in os.listdir(self.queue)
+                if name.endswith('.json')]
+
+    def test_run_removes_paths(self):
+        self.cleanup.batch = 1
+        self.cleanup.put([self.download, self.single])
+        self.assertEqual(len(self.get_queue()), 1)
+        self.cleanup.run()
+        self.assertFalse(os.path.exists(self.download))
+        self.assertFalse(os.path.exists(self.single))
+        self.assertListEqual(self.get_queue(), [])
+        # Symlinked folders are not followed
+        self.assertTrue(os.path.isdir(self.queue))
+
+    def test_run_missing_path(self):
+        self.cleanup.put([os.path.join(self.folder, 'missing')])
+        self.cleanup.run()
+        self.assertListEqual(self.get_queue(), [])
+
+    def test_retry_busy_path(self):
+        self.cleanup.put([self.download])
+        with mock.patch.object(
+                self.cleanup, '_remove', side_effect=[False, True]) as remove:
+            self.cleanup.run()
+        self.assertEqual(remove.call_count, 2)
+        self.assertListEqual(self.get_queue(), [])
+
+    def test_give_up_busy_path(self):
+        self.cleanup.put([self.download])
+        with mock.patch.object(
+                self.cleanup, '_remove', return_value=False) as remove:
+            self.cleanup.run()
+        self.assertEqual(remove.call_count, 3)
+        self.assertListEqual(self.get_queue(), [])
+        self.assertTrue(os.path.exists(self.download))
+
+    def test_bad_entry(self):
+        with open(os.path.join(self.queue, 'bad.json'), 'w') as entry_io:
+            entry_io.write('{bad')
+        self.cleanup.run()
+        self.assertListEqual(self.get_queue(), [])
+
+    def test_background_worker(self):
+        self.cleanup.put([self.download, self.single])
+        self.cleanup.start()
+        self.cleanup.wait(30)
+        self.assertFalse(os.path.exists(self.download))
+        self.assertFalse(os.path.exists(self.single))
+        self.assertListEqual(self.get_queue(), [])
+
+    def test_worker_logging(self):
+        log_file = os.path.join(self.folder, 'mediahandler.log')
+        handler = logging.FileHandler(log_file)
+        root = logging.getLogger()
+        try:
+            with mock.patch.object(root, 'handlers', [handler]), \
+                    mock.patch.object(root, 'level', logging.DEBUG), \
+                    mock.patch('mediahandler.util.cleanup.Popen') as popen:
+                self.cleanup.start()
+        finally:
+            handler.close()
+        # Worker is told to log to the same file
+        cmd = popen.call_args[0][0]
+        self.assertListEqual(cmd[-3:], [self.queue, log_file, '10'])
+        # Worker sets up logging from its arguments
+        with mock.patch('logging.basicConfig') as config, \
+                mock.patch.object(Cleanup.MHCleanup, 'run') as run:
+            Cleanup.main(cmd[-3:])
+        config.assert_called_once_with(
+            filename=log_file, format=Config.LOG_FORMAT, level=10)
+        run.assert_called_once_with()
+
+    def test_remove_later(self):
+        with mock.patch('mediahandler.__mediacache__', self.folder):
+            with mock.patch.object(Cleanup.MHCleanup, 'start') as start:
+                cleanup = Cleanup.remove_later([self.single])
+        start.assert_called_once_with()
+        self.assertEqual(cleanup.folder, os.path.join(self.folder, 'cleanup'))
+        self.assertEqual(len(os.listdir(cleanup.folder)), 1)
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
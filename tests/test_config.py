@@ -21,6 +21,7 @@ import re
 import sys
 import shutil
 import yaml
+import mock
 
 import tests.common as common
 from tests.common import unittest
@@ -306,6 +307,8 @@ class MissingSectionConfigTest(unittest.TestCase):
         expected = {
             'enabled': False,
             'notify_name': None,
+            'cache_ttl': 86400,
+            'digest_window': 0,
             'pushover': {
                 'api_key': None,
                 'user_key': None,
@@ -443,6 +446,68 @@ class MakeConfigTests(unittest.TestCase):
         return getpwuid(os.stat(filename).st_uid).pw_uid
 
 
+class ConfigCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        old_conf = common.get_conf_file()
+        conf_dir = os.path.dirname(old_conf)
+        self.conf = os.path.join(conf_dir, 'temp_CCT.yml')
+        shutil.copy(old_conf, self.conf)
+        self.cache_file = Config._get_config_cache_file(self.conf)
+
+    def tearDown(self):
+        common.remove_file(self.conf)
+        if os.path.exists(self.cache_file):
+            common.remove_file(self.cache_file)
+        Config._CONFIG_MEMO.clear()
+
+    def parse_without_yaml(self):
+        with mock.patch.object(Config, '_get_yaml') as get_yaml:
+            settings = Config.parse_config(self.conf)
+        self.assertFalse(get_yaml.called)
+        return settings
+
+    def test_cache_used(self):
+        expected = Config.parse_config(self.conf)
+        self.assertTrue(os.path.exists(self.cache_file))
+        # From memory
+        self.assertDictEqual(self.parse_without_yaml(), expected)
+        # From disk
+        Config._CONFIG_MEMO.clear()
+        self.assertDictEqual(self.parse_without_yaml(), expected)
+
+    @unittest.skipIf(sys.platform.startswith("win"), "requires POSIX permissions")
+    def test_cache_private(self):
+        # Leftover partial write with open permissions
+        with open(self.cache_file + '.tmp', 'w'):
+            pass
+        os.chmod(self.cache_file + '.tmp', 0o644)
+        Config.parse_config(self.conf)
+        self.assertEqual(os.stat(self.cache_file).st_mode & 0o777, 0o600)
+
+    def test_cache_copy(self):
+        settings = Config.parse_config(self.conf)
+        settings['Deluge']['host'] = 'changed'
+        settings = Config.parse_config(self.conf)
+        self.assertEqual(settings['Deluge']['host'], '127.0.0.1')
+
+    def test_cache_config_changed(self):
+        Config.parse_config(self.conf)
+        with open(self.conf) as conf_file:
+            conf = yaml.load(conf_file.read(), Loader=yaml.SafeLoader)
+        conf['Deluge']['host'] = '10.0.0.1'
+        with open(self.conf, 'w') as conf_file:
+            yaml.dump(conf, conf_file, indent=4, default_flow_style=False)
+        settings = Config.parse_config(self.conf)
+        self.assertEqual(settings['Deluge']['host'], '10.0.0.1')
+
+    def test_cache_path_changed(self):
+        key = Config._get_config_cache_key(self.conf)
+        path = os.environ['PATH']
+        with mock.patch.dict(os.environ, {'PATH': path + os.pathsep + 'x'}):
+            self.assertNotEqual(Config._get_config_cache_key(self.conf), key)
+
+
 def suite():
     s = MHTestSuite()
     tests = unittest.TestLoader().loadTestsFromName(__name__)
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import time
+import shutil
+import socket
+import threading
+
+import mock
+
+import tests.common as common
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.daemon as Daemon
+
+
+class DummyHandler(object):
+
+    def __init__(self, config):
+        self.config = config
+        self.jobs = []
+
+    def add_media(self, media, **kwargs):
+        self.jobs.append(media)
+        if media == 'fail':
+            raise SystemExit('Unable to match files: fail')
+        return '+ {0}'.format(media)
+
+
+class JobQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def test_queue_order(self):
+        queue = Daemon.MHJobQueue(self.folder)
+        first = queue.put({'media': 'one'})
+        second = queue.put({'media': 'two'})
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.get(0), (first, {'media': 'one'}))
+        self.assertEqual(queue.get(0), (second, {'media': 'two'}))
+        self.assertIsNone(queue.get(0))
+
+    def test_queue_persists(self):
+        queue = Daemon.MHJobQueue(self.folder)
+        job_id = queue.put({'media': 'one'})
+        # Reload queue from disk
+        new_queue = Daemon.MHJobQueue(self.folder)
+        self.assertEqual(new_queue.get(0), (job_id, {'media': 'one'}))
+        # Finished jobs are removed
+        new_queue.done(job_id)
+        self.assertEqual(len(Daemon.MHJobQueue(self.folder)), 0)
+
+    def test_queue_bad_job(self):
+        with open(os.path.join(self.folder, 'bad.json'), 'w') as bad_io:
+            bad_io.write('{not json')
+        queue = Daemon.MHJobQueue(self.folder)
+        self.assertIsNone(queue.get(0))
+        self.assertListEqual(os.listdir(self.folder), [])
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'requires UNIX sockets')
+class DaemonTests(unittest.TestCase):
+
+    def setUp(self):
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        self.conf = common.temp_file('{0}.yml'.format(common.random_string()))
+        self.handler = DummyHandler(self.conf)
+        self.daemon = Daemon.MHDaemon(self.handler)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def test_cache_folder(self):
+        self.assertEqual(os.path.dirname(self.daemon.socket_path), self.cache)
+        self.assertEqual(
+            os.path.dirname(self.daemon.queue.folder), self.cache)
+
+    def test_no_daemon(self):
+        self.assertIsNone(Daemon.send_job(self.conf, {'media': 'one'}))
+
+    def test_run_jobs(self):
+        self.daemon.queue.put({'media': 'one'})
+        self.daemon.queue.put({'media': 'fail'})
+        self.assertEqual(self.daemon.run_next(0), '+ one')
+        self.assertIsNone(self.daemon.run_next(0))
+        self.assertListEqual(self.handler.jobs, ['one', 'fail'])
+        self.assertEqual(len(os.listdir(self.daemon.queue.folder)), 0)
+
+    def test_send_job(self):
+        # Start daemon in the background
+        thread = threading.Thread(target=self.daemon.serve)
+        thread.start()
+        for _ in range(50):
+            if os.path.exists(self.daemon.socket_path):
+                break
+            time.sleep(0.1)
+        # Send job
+        job_id = Daemon.send_job(self.conf, {'media': 'one'})
+        self.assertIsNotNone(job_id)
+        for _ in range(50):
+            if self.handler.jobs:
+                break
+            time.sleep(0.1)
+        # Stop daemon
+        self.daemon.stop()
+        thread.join()
+        self.assertListEqual(self.handler.jobs, ['one'])
+        self.assertFalse(os.path.exists(self.daemon.socket_path))
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
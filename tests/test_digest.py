@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import json
+import shutil
+
+import mock
+
+import tests.common as common
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.digest as Digest
+import mediahandler.util.notify as Notify
+
+
+class MakeDigestTests(unittest.TestCase):
+
+    def test_grouped_episodes(self):
+        added = [
+            "Grey's Anatomy (Season 10, Episode 3)",
+            'Movie (2010)',
+            "Grey's Anatomy (Season 10, Episode 1)",
+            "Grey's Anatomy (Season 10, Episode 2)",
+            "Grey's Anatomy (Season 10, Episode 5)",
+            "Grey's Anatomy (Season 11, Episode 1)",
+            'Movie (2010)',
+        ]
+        (text, title) = Digest.make_digest(added, [])
+        expected = '\n'.join([
+            "+ Grey's Anatomy (Season 10, Episodes 1-3, 5)",
+            '+ Movie (2010)',
+            "+ Grey's Anatomy (Season 11, Episode 1)",
+            ''])
+        self.assertEqual(text, expected)
+        self.assertEqual(title, 'Media Added')
+
+    def test_skips(self):
+        (text, title) = Digest.make_digest(['Movie (2010)'], ['a', 'a', 'b'])
+        self.assertEqual(text, '+ Movie (2010)\n\nSkipped files:\n- a\n- b\n')
+        self.assertEqual(title, 'Media Added (with Skips)')
+        (text, _) = Digest.make_digest([], ['a'])
+        self.assertEqual(text, 'Skipped files:\n- a\n')
+
+
+class DigestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'digest.json')
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def send(self, message, title):
+        self.sent.append((message, title))
+
+    def test_coalesce_jobs(self):
+        # Separate objects share the buffer, as separate processes would
+        first = Digest.MHDigest(self.send, 0.2, self.path)
+        second = Digest.MHDigest(self.send, 0.2, self.path)
+        self.assertTrue(first.add(['Show (Season 1, Episode 1)'], []))
+        self.assertFalse(second.add(['Show (Season 1, Episode 2)'], []))
+        self.assertListEqual(self.sent, [])
+        first.wait(5)
+        self.assertListEqual(self.sent, [
+            ('+ Show (Season 1, Episodes 1-2)\n', 'Media Added')])
+        # Nothing left to send
+        self.assertIsNone(second.flush())
+
+    def test_close(self):
+        digest = Digest.MHDigest(self.send, 60, self.path)
+        self.assertTrue(digest.add(['Movie (2010)'], []))
+        # Window does not keep the process running
+        self.assertTrue(digest.timer.daemon)
+        digest.close()
+        self.assertIsNone(digest.timer)
+        self.assertListEqual(self.sent, [('+ Movie (2010)\n', 'Media Added')])
+
+    def test_take_over_stale_window(self):
+        with open(self.path, 'w') as buffer_io:
+            json.dump({'opened': 1, 'events': [
+                {'added': ['Movie (2010)'], 'skipped': []}]}, buffer_io)
+        digest = Digest.MHDigest(self.send, 0.1, self.path)
+        self.assertTrue(digest.add(['Movie (2011)'], []))
+        digest.wait(5)
+        self.assertListEqual(self.sent, [
+            ('+ Movie (2010)\n+ Movie (2011)\n', 'Media Added')])
+
+
+    def test_leave_open_window(self):
+        digest = Digest.MHDigest(self.send, 60, self.path)
+        self.assertTrue(digest.add(['Movie (2010)'], []))
+        self.assertIsNone(digest.leave())
+        self.assertIsNone(digest.timer)
+        self.assertListEqual(self.sent, [])
+        # Next process adds to the same digest
+        digest = Digest.MHDigest(self.send, 60, self.path)
+        self.assertFalse(digest.add(['Movie (2011)'], []))
+        digest.close()
+        self.assertListEqual(self.sent, [
+            ('+ Movie (2010)\n+ Movie (2011)\n', 'Media Added')])
+
+    def test_leave_closed_window(self):
+        with open(self.path, 'w') as buffer_io:
+            json.dump({'opened': 1, 'events': [
+                {'added': ['Movie (2010)'], 'skipped': []}]}, buffer_io)
+        digest = Digest.MHDigest(self.send, 60, self.path)
+        self.assertEqual(digest.leave(), '+ Movie (2010)\n')
+        self.assertListEqual(self.sent, [('+ Movie (2010)\n', 'Media Added')])
+
+
+class PushDigestTests(unittest.TestCase):
+
+    def setUp(self):
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        # Push object without credentials to validate
+        self.push = Notify.MHPush({
+            'enabled': True,
+            'notify_name': 'test',
+            'digest_window': 0.1,
+            'pushover': {'api_key': None, 'user_key': None},
+            'pushbullet': {'token': None},
+        })
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def test_success_digest(self):
+        with mock.patch.object(self.push, 'send_message') as send:
+            self.push.success(['Show (Season 1, Episode 1)'])
+            self.push.success(['Show (Season 1, Episode 2)'])
+            self.assertFalse(send.called)
+            self.push.flush(5)
+        send.assert_called_once_with(
+            '+ Show (Season 1, Episodes 1-2)\n', 'Media Added')
+
+    def test_separate_runs(self):
+        config = {
+            'enabled': True,
+            'notify_name': 'test',
+            'digest_window': 60,
+            'pushover': {'api_key': None, 'user_key': None},
+            'pushbullet': {'token': None},
+        }
+        with mock.patch.object(Notify.MHPush, 'send_message') as send, \
+                mock.patch('mediahandler.util.digest.time') as now:
+            # First run leaves its digest open
+            now.return_value = 1000
+            first = Notify.MHPush(config)
+            first.success(['Show (Season 1, Episode 1)'])
+            self.assertTrue(first.flush(5, leave_digest=True))
+            self.assertFalse(send.called)
+            # Second run finishes after the window closes
+            now.return_value = 1061
+            second = Notify.MHPush(config)
+            second.success(['Show (Season 1, Episode 2)'])
+            self.assertTrue(second.flush(5, leave_digest=True))
+        send.assert_called_once_with(
+            '+ Show (Season 1, Episodes 1-2)\n', 'Media Added')
+
+    def test_failure_immediate(self):
+        with mock.patch.object(self.push, 'send_message') as send:
+            self.assertRaises(SystemExit, self.push.failure, 'error')
+        send.assert_called_once_with('error', 'Error Reported')
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
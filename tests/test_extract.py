@@ -17,7 +17,9 @@
 """Initialize module"""
 
 import os
+import mock
 import shutil
+import tarfile
 import zipfile as zf
 import contextlib
 
@@ -138,7 +140,7 @@ class ExtractGoodZipTests(unittest.TestCase):
         files = self.handler.extract_files(self.zip_name)
         self.assertEqual(files, self.folder)
         self.assertTrue(os.path.exists(files))
-        self.assertEqual(self.handler.extracted, self.zip_name)
+        self.assertEqual(self.handler.extracted, [self.folder])
 
     def test_good_handler_zip_movies(self):
         delattr(self.handler.tv, 'filebot')
@@ -146,14 +148,123 @@ class ExtractGoodZipTests(unittest.TestCase):
         files = self.handler.extract_files(self.zip_name)
         self.assertEqual(files, self.folder)
         self.assertTrue(os.path.exists(files))
-        self.assertEqual(self.handler.extracted, self.zip_name)
+        self.assertEqual(self.handler.extracted, [self.folder])
+
+    def test_good_handler_zip_extracted(self):
+        # Single zipped file is swapped for its extracted files
+        files = self.handler._find_zipped(self.zip_name)
+        self.assertEqual(files, self.folder)
 
     def test_good_handler_zip_found(self):
         # Run handler
         regex = r'Folder for TV not found: .*TV'
         self.assertRaisesRegexp(
             SystemExit, regex,
-            self.handler._find_zipped, self.zip_name)
+            self.handler._file_handler, self.zip_name)
+
+
+class ExtractNativeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        # Archive contents
+        self.one = os.path.join(self.folder, 'one.tmp')
+        with open(self.one, 'w') as one_file:
+            one_file.write('one')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_extract_tar(self):
+        archive = os.path.join(self.folder, 'test_ET.tar.gz')
+        with tarfile.open(archive, 'w:gz') as tar_file:
+            tar_file.add(self.one, 'sub/one.tmp')
+        (folder, files) = Extract.extract_archive(archive)
+        expected = os.path.join(self.folder, 'test_ET')
+        self.assertEqual(folder, expected)
+        self.assertListEqual(
+            files, [os.path.join(expected, 'sub', 'one.tmp')])
+        with open(files[0]) as one_file:
+            self.assertEqual(one_file.read(), 'one')
+
+    def test_extract_folder(self):
+        archive = os.path.join(self.folder, 'test_ET.zip')
+        with contextlib.closing(zf.ZipFile(archive, 'w')) as good_zip:
+            good_zip.write(self.one, 'one.tmp')
+        files = Extract.get_files(None, self.folder)
+        self.assertEqual(files, os.path.join(self.folder, 'test_ET'))
+        self.assertTrue(os.path.exists(os.path.join(files, 'one.tmp')))
+
+    def test_extract_folder_many(self):
+        for name in ['a.zip', 'b.zip']:
+            archive = os.path.join(self.folder, name)
+            with contextlib.closing(zf.ZipFile(archive, 'w')) as good_zip:
+                good_zip.write(self.one, 'one.tmp')
+        folders = Extract.get_folders(None, self.folder)
+        self.assertListEqual(folders, [
+            os.path.join(self.folder, 'a'), os.path.join(self.folder, 'b')])
+
+    def test_fallback_per_archive(self):
+        archive = os.path.join(self.folder, 'a.zip')
+        with contextlib.closing(zf.ZipFile(archive, 'w')) as good_zip:
+            good_zip.write(self.one, 'one.tmp')
+        bad_archive = os.path.join(self.folder, 'b.zip')
+        with open(bad_archive, 'w') as bad_zip:
+            bad_zip.write('bad')
+        with mock.patch.object(Extract, '_extract_filebot',
+                               return_value='filebot') as filebot:
+            folders = Extract.get_folders('filebot', self.folder)
+        # Only the archive which failed is sent to Filebot
+        filebot.assert_called_once_with('filebot', bad_archive, False)
+        self.assertListEqual(
+            folders, [os.path.join(self.folder, 'a'), 'filebot'])
+        # Without Filebot, the whole folder fails
+        self.assertIsNone(Extract.get_folders(None, self.folder))
+
+    def test_extra_volumes(self):
+        for name in ['a.part1.rar', 'a.part01.rar', 'a.rar', 'a.7z.001',
+                     'a.zip']:
+            self.assertFalse(Extract.is_extra_volume(name), name)
+        for name in ['a.part02.rar', 'a.part10.rar', 'a.r00', 'a.R01',
+                     'a.7z.002', 'a.z01']:
+            self.assertTrue(Extract.is_extra_volume(name), name)
+
+    def test_unsafe_members(self):
+        archive = os.path.join(self.folder, 'test_ET.zip')
+        with contextlib.closing(zf.ZipFile(archive, 'w')) as bad_zip:
+            bad_zip.write(self.one, '../escaped.tmp')
+            bad_zip.write(self.one, 'one.tmp')
+        (folder, files) = Extract.extract_archive(archive)
+        self.assertListEqual(files, [os.path.join(folder, 'one.tmp')])
+        self.assertFalse(
+            os.path.exists(os.path.join(self.folder, 'escaped.tmp')))
+
+    def test_missing_module_falls_back(self):
+        def handler(archive, folder):
+            raise ImportError('No module named rarfile')
+        archive = os.path.join(self.folder, 'test_ET.rar')
+        with open(archive, 'w') as rar_file:
+            rar_file.write('rar')
+        original = Extract._HANDLERS['.rar']
+        Extract.register_handler(['.rar'], handler)
+        try:
+            self.assertIsNone(Extract.extract_archive(archive))
+            self.assertIsNone(Extract.get_files(None, archive))
+        finally:
+            Extract.register_handler(['.rar'], original)
+
+    def test_register_handler(self):
+        def handler(archive, folder):
+            os.makedirs(folder)
+            return [folder]
+        archive = os.path.join(self.folder, 'test_ET.cbz')
+        open(archive, 'w').close()
+        Extract.register_handler(['.cbz'], handler)
+        try:
+            files = Extract.get_files(None, archive)
+        finally:
+            del Extract._HANDLERS['.cbz']
+        self.assertEqual(files, os.path.join(self.folder, 'test_ET'))
 
 
 def suite():
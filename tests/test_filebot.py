@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import sys
+import time
+import shutil
+
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.filebot as Filebot
+
+
+# Filebot stand-in which supports the server script's protocol
+FAKE_FILEBOT = '''#!{python}
+import sys, json, time
+if '-script' in sys.argv:
+    for line in sys.stdin:
+        args = json.loads(line)
+        if args[0] == 'die':
+            sys.exit(1)
+        if args[0] == 'hang':
+            time.sleep(60)
+        print('[COPY] From [{{0}}] to [server]'.format(args[1]))
+        if '--log-file' in args:
+            with open(args[args.index('--log-file') + 1], 'a') as log_io:
+                log_io.write('[COPY] From [{{0}}] to [log]'.format(args[1]))
+        print('@@MH-FILEBOT-DONE@@')
+        sys.stdout.flush()
+else:
+    print('[COPY] From [{{0}}] to [oneshot]'.format(sys.argv[2]))
+'''
+
+
+class FilebotServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filebot = os.path.join(self.folder, 'filebot')
+        with open(self.filebot, 'w') as filebot_io:
+            filebot_io.write(FAKE_FILEBOT.format(python=sys.executable))
+        os.chmod(self.filebot, 0o755)
+
+    def tearDown(self):
+        Filebot.get_server(self.filebot).stop()
+        del Filebot._SERVERS[self.filebot]
+        shutil.rmtree(self.folder)
+
+    def test_oneshot(self):
+        (output, err) = Filebot.run_command(
+            [self.filebot, '-rename', 'a.mkv'])
+        self.assertEqual(output.strip(), b'[COPY] From [a.mkv] to [oneshot]')
+        self.assertEqual(err, b'')
+
+    def test_server_reused(self):
+        (output, _) = Filebot.run_command(
+            [self.filebot, '-rename', 'a.mkv'], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [a.mkv] to [server]')
+        process = Filebot.get_server(self.filebot).process
+        (output, _) = Filebot.run_command(
+            [self.filebot, '-rename', 'b.mkv'], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [b.mkv] to [server]')
+        self.assertIs(Filebot.get_server(self.filebot).process, process)
+
+    def test_server_log_file(self):
+        log_file = os.path.join(self.folder, 'filebot.log')
+        (output, _) = Filebot.run_command(
+            [self.filebot, '-rename', 'a.mkv', '-r',
+             '--log', 'all', '--log-file', log_file], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [a.mkv] to [server]')
+        with open(log_file) as log_io:
+            self.assertEqual(log_io.read(), '[COPY] From [a.mkv] to [log]')
+
+    def test_server_fallback(self):
+        # Server dies on this command
+        (output, _) = Filebot.run_command(
+            [self.filebot, 'die', 'a.mkv'], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [a.mkv] to [oneshot]')
+        self.assertFalse(Filebot.get_server(self.filebot).is_alive())
+        # Server is restarted for the next command
+        (output, _) = Filebot.run_command(
+            [self.filebot, '-rename', 'b.mkv'], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [b.mkv] to [server]')
+
+    def test_server_timeout(self):
+        Filebot.get_server(self.filebot).timeout = 0.5
+        # Server stops printing on this command
+        start = time.time()
+        (output, _) = Filebot.run_command(
+            [self.filebot, 'hang', 'a.mkv'], server=True)
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(output.strip(), b'[COPY] From [a.mkv] to [oneshot]')
+        self.assertFalse(Filebot.get_server(self.filebot).is_alive())
+        # Server is restarted for the next command
+        (output, _) = Filebot.run_command(
+            [self.filebot, '-rename', 'b.mkv'], server=True)
+        self.assertEqual(output.strip(), b'[COPY] From [b.mkv] to [server]')
+
+    def test_iter_server(self):
+        lines = list(Filebot.iter_command(
+            [self.filebot, '-rename', 'a.mkv'], server=True))
+        self.assertListEqual(lines, [b'[COPY] From [a.mkv] to [server]\n'])
+
+    def test_iter_fallback(self):
+        # Restart is marked with None before the new output
+        lines = list(Filebot.iter_command(
+            [self.filebot, 'die', 'a.mkv'], server=True))
+        self.assertListEqual(
+            lines, [None, b'[COPY] From [a.mkv] to [oneshot]\n'])
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
@@ -20,6 +20,10 @@ import os
 import re
 import sys
 import shutil
+import zipfile
+import subprocess
+
+import mock
 
 import tests.common as common
 from tests.common import unittest
@@ -146,7 +150,7 @@ class RemoveFileTests(HandlerTestClass):
     def test_remove_extracted(self):
         self.tmp_file = common.make_tmp_file()
         # Adjust handler settings
-        self.handler.extracted = self.dir
+        self.handler.extracted = [self.dir]
         self.handler.single_file = True
         self.handler.general.keep_files = False
         # Run handler
@@ -155,6 +159,33 @@ class RemoveFileTests(HandlerTestClass):
         self.assertFalse(os.path.exists(self.tmp_file))
         self.assertFalse(os.path.exists(self.dir))
 
+    def test_remove_symlink_transfer(self):
+        self.tmp_file = common.make_tmp_file()
+        # Adjust handler settings
+        self.handler.extracted = [self.dir]
+        self.handler.stype = 'TV'
+        self.handler.tv.transfer = 'symlink'
+        self.handler.general.keep_files = False
+        # Run handler
+        self.handler._remove_files(self.tmp_file, False)
+        # Check that symlink targets were kept
+        self.assertTrue(os.path.exists(self.tmp_file))
+        self.assertTrue(os.path.exists(self.dir))
+
+    @mock.patch('mediahandler.util.cleanup.remove_later')
+    def test_remove_background(self, remove_later):
+        self.tmp_file = common.make_tmp_file()
+        # Adjust handler settings
+        self.handler.extracted = [self.dir]
+        self.handler.general.keep_files = False
+        self.handler.general.background_cleanup = True
+        # Run handler
+        self.handler._remove_files(self.tmp_file, False)
+        # Check that removal was queued, not done
+        remove_later.assert_called_once_with([self.dir, self.tmp_file])
+        self.assertTrue(os.path.exists(self.tmp_file))
+        self.assertTrue(os.path.exists(self.dir))
+
 
 class FileHandlerTests(HandlerTestClass):
 
@@ -228,6 +259,26 @@ class FileHandlerTests(HandlerTestClass):
             SystemExit, regex, self.handler._file_handler, self.dir)
 
 
+    def test_process_files_zipped_single_pass(self):
+        # Zipped and loose media in dummy folder
+        self.tmp_file = common.make_tmp_file('.mkv', self.dir)
+        zip_name = os.path.join(self.dir, 'extra.zip')
+        with zipfile.ZipFile(zip_name, 'w') as zip_file:
+            zip_file.write(self.tmp_file, 'extra.mkv')
+        results = ([self.tmp_file], [])
+        with mock.patch.object(self.handler, '_add_media_files',
+                               return_value=results) as add_files, \
+                mock.patch.object(self.handler, '_check_success') as check:
+            self.handler._file_handler(self.dir)
+        # Media is identified once, including the extracted files
+        add_files.assert_called_once_with(self.dir)
+        check.assert_called_once_with(self.dir, results)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.dir, 'extra', 'extra.mkv')))
+        self.assertEqual(self.handler.extracted,
+                         [os.path.join(self.dir, 'extra')])
+
+
 class CheckSuccessTests(HandlerTestClass):
 
     def test_results_none(self):
@@ -261,6 +312,31 @@ class CheckSuccessTests(HandlerTestClass):
         self.assertRegexpMatches(added, regex)
         self.assertTrue(os.path.exists(self.dir))
 
+    def test_remove_torrent_after_success(self):
+        self.handler.hash = 'hash'
+        self.handler.deluge.enabled = True
+        results = ([self.dir], [])
+        with mock.patch('mediahandler.util.torrent.get_client') as client:
+            self.handler._check_success(self.dir, results)
+        client.return_value.remove.assert_called_once_with(['hash'])
+
+    def test_keep_torrent_on_failure(self):
+        self.handler.hash = 'hash'
+        self.handler.deluge.enabled = True
+        results = ([], [])
+        with mock.patch('mediahandler.util.torrent.get_client') as client:
+            self.assertRaises(SystemExit, self.handler._check_success,
+                              self.dir, results)
+        self.assertFalse(client.called)
+
+    def test_keep_torrent_disabled(self):
+        self.handler.hash = 'hash'
+        self.handler.deluge.enabled = False
+        results = ([self.dir], [])
+        with mock.patch('mediahandler.util.torrent.get_client') as client:
+            self.handler._check_success(self.dir, results)
+        self.assertFalse(client.called)
+
 
 class FindZippedTests(HandlerTestClass):
 
@@ -342,6 +418,16 @@ class AddMediaTests(HandlerTestClass):
         self.assertRaisesRegexp(
             SystemExit, regex, MH.main)
 
+    def test_main_leaves_digest(self):
+        # Set up args
+        sys.argv[1:] = [self.dir, '--type', '1']
+        # Run test
+        with mock.patch.object(MH.MHandler, 'add_media'), \
+                mock.patch.object(Notify.MHPush, 'flush') as flush:
+            MH.main()
+        flush.assert_called_once_with(
+            Notify.MHPush.EXIT_TIMEOUT, leave_digest=True)
+
     def test_main_bad_path(self):
         # Set up args
         sys.argv[1:] = ['/path/tv/fake']
@@ -365,6 +451,86 @@ class AddMediaTests(HandlerTestClass):
         self.assertTrue(self.handler.no_push)
 
 
+class AddMediaManyTests(HandlerTestClass):
+
+    def test_many_results(self):
+        # Set up items
+        items = [
+            {'media': self.dir, 'type': 1},
+            '/path/tv/fake',
+            {'media': self.dir, 'type': 2},
+        ]
+        # Run test
+        results = self.handler.add_media_many(items, processes=2)
+        # Check results
+        self.assertEqual(len(results), 3)
+        self.assertListEqual(
+            [result['media'] for result in results],
+            [self.dir, '/path/tv/fake', self.dir])
+        for result in results:
+            self.assertIsNone(result['added'])
+        regex1 = r'No TV files found for: {0}'.format(
+            os.path.basename(self.dir))
+        regex2 = r'File or directory provided for media does not exist'
+        regex3 = r'No Movies files found for: {0}'.format(
+            os.path.basename(self.dir))
+        self.assertRegexpMatches(results[0]['error'], regex1)
+        self.assertRegexpMatches(results[1]['error'], regex2)
+        self.assertRegexpMatches(results[2]['error'], regex3)
+
+    @mock.patch('mediahandler.types.audiobooks.MHAudiobook')
+    def test_many_resolve_books(self, book):
+        self.handler.audiobooks.enabled = True
+        self.handler.audiobooks.cache_ttl = 60
+        jobs = [
+            {'media': self.dir, 'type': 4},
+            {'media': self.dir, 'type': 4, 'query': 'Voices Arnaldur'},
+            {'media': self.dir, 'type': 1},
+            {'media': '/path/books/fake', 'type': 4},
+        ]
+        book.return_value.resolve_many.return_value = [
+            None, {'short_title': 'Voices'}]
+        self.handler._resolve_books(jobs)
+        book.return_value.resolve_many.assert_called_once_with(
+            [(self.dir, None), (self.dir, 'Voices Arnaldur')])
+        self.assertFalse(self.handler.push.disable)
+        # Books found are passed to their jobs
+        self.assertNotIn('book_info', jobs[0])
+        self.assertDictEqual(jobs[1]['book_info'], {'short_title': 'Voices'})
+
+    @mock.patch('mediahandler.types.audiobooks.MHAudiobook')
+    def test_many_resolve_books_error(self, book):
+        self.handler.audiobooks.enabled = True
+        self.handler.audiobooks.cache_ttl = 60
+        book.return_value.resolve_many.side_effect = TypeError('bad')
+        # Items are left to look themselves up
+        self.handler._resolve_books([{'media': self.dir, 'type': 4}])
+        self.assertFalse(self.handler.push.disable)
+
+    @mock.patch('mediahandler.types.audiobooks.MHAudiobook')
+    def test_many_resolve_books_no_cache(self, book):
+        self.handler.audiobooks.enabled = True
+        self.handler.audiobooks.cache_ttl = 0
+        book.return_value.resolve_many.return_value = [{'short_title': 'A'}]
+        jobs = [{'media': self.dir, 'type': 4}]
+        self.handler._resolve_books(jobs)
+        self.assertDictEqual(jobs[0]['book_info'], {'short_title': 'A'})
+
+    @mock.patch('mediahandler.types.audiobooks.MHAudiobook')
+    def test_many_resolve_books_disabled(self, book):
+        self.handler.audiobooks.enabled = False
+        self.handler._resolve_books([{'media': self.dir, 'type': 4}])
+        self.assertFalse(book.called)
+
+    def test_book_info_arg(self):
+        # Passed on to the audiobooks type, for this job only
+        self.handler._parse_args_from_dict(
+            self.dir, type=4, book_info={'short_title': 'A'})
+        self.assertEqual(self.handler.book_info.short_title, 'A')
+        self.handler._parse_args_from_dict(self.dir, type=4)
+        self.assertIsNone(self.handler.book_info)
+
+
 class AddMediaFilesTests(HandlerTestClass):
 
     def setUp(self):
@@ -489,6 +655,23 @@ class AddMediaFilesTests(HandlerTestClass):
             self.handler._add_media_files, self.tmp_file)
 
 
+class LazyImportTests(unittest.TestCase):
+
+    def test_tv_imports(self):
+        # Run in a fresh interpreter so no modules are preloaded
+        code = '\n'.join([
+            'import sys',
+            'import mediahandler.handler as MH',
+            'import mediahandler.types.tv',
+            'MH.MHandler(sys.argv[1])',
+            'heavy = ("googleapiclient", "mutagen", "twisted", "deluge")',
+            'print(sorted(m for m in sys.modules if m.split(".")[0] in heavy))',
+        ])
+        output = subprocess.check_output(
+            [sys.executable, '-c', code, common.get_conf_file()])
+        self.assertEqual(output.decode('utf-8').strip(), '[]')
+
+
 def suite():
     s = MHTestSuite()
     tests = unittest.TestLoader().loadTestsFromName(__name__)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import shutil
+
+import mock
+
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.inventory as Inventory
+
+
+class GetKindTests(unittest.TestCase):
+
+    def test_kinds(self):
+        expected = {
+            'show.s01e01.mkv': ('video', 'mkv'),
+            'show.s01e01.sample.mkv': ('sample', 'mkv'),
+            'Sample.AVI': ('sample', 'AVI'),
+            'samples.mkv': ('video', 'mkv'),
+            'show.srt': ('subtitle', 'srt'),
+            'show.part01.rar': ('archive', 'rar'),
+            'show.r00': ('archive', 'r00'),
+            'show.tar.gz': ('archive', 'gz'),
+            'book.m4b': ('chaptered', 'm4b'),
+            'book.MP3': ('audio', 'MP3'),
+            'show.nfo': ('other', 'nfo'),
+        }
+        for (name, kind) in expected.items():
+            self.assertEqual(Inventory.get_kind(name), kind, name)
+
+
+class InventoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        # Nested media folder
+        for name in ['a.mkv', 'a.srt', os.path.join('sub', 'b.mkv'),
+                     os.path.join('sub', 'b.nfo')]:
+            file_path = os.path.join(self.folder, name)
+            if not os.path.exists(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+            with open(file_path, 'w') as file_io:
+                file_io.write('data')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_single_scan(self):
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir:
+            inventory = Inventory.MHInventory(self.folder)
+            top = inventory.list(self.folder)
+            nested = inventory.list(self.folder, recursive=True)
+            videos = inventory.list(self.folder, True, ['video'])
+        # One scandir call per folder, none for lookups
+        self.assertEqual(scandir.call_count, 2)
+        self.assertListEqual(
+            [entry.name for entry in top], ['a.mkv', 'a.srt', 'sub'])
+        self.assertListEqual(
+            [entry.name for entry in nested],
+            ['a.mkv', 'a.srt', 'sub', 'b.mkv', 'b.nfo'])
+        self.assertListEqual(
+            [entry.name for entry in videos], ['a.mkv', 'b.mkv'])
+        self.assertEqual(top[0].size, 4)
+
+    def test_discard_and_scan(self):
+        inventory = Inventory.MHInventory(self.folder)
+        sub = os.path.join(self.folder, 'sub')
+        inventory.discard(sub)
+        self.assertFalse(inventory.covers(os.path.join(sub, 'b.mkv')))
+        self.assertEqual(len(inventory), 3)
+        # Rescan new files
+        with open(os.path.join(sub, 'c.mkv'), 'w'):
+            pass
+        inventory.scan(sub)
+        self.assertListEqual(
+            [entry.name for entry in inventory.list(sub)],
+            ['b.mkv', 'b.nfo', 'c.mkv'])
+
+    def test_get_inventory(self):
+        inventory = Inventory.MHInventory(self.folder)
+        sub = os.path.join(self.folder, 'sub')
+        self.assertIs(Inventory.get_inventory(inventory, sub), inventory)
+        other_folder = tempfile.mkdtemp()
+        other = Inventory.get_inventory(inventory, other_folder)
+        os.rmdir(other_folder)
+        self.assertIsNot(other, inventory)
+        self.assertIsNot(Inventory.get_inventory(None, sub), inventory)
+
+    def test_single_file(self):
+        file_path = os.path.join(self.folder, 'a.mkv')
+        inventory = Inventory.MHInventory(file_path)
+        self.assertEqual(inventory.get(file_path).kind, 'video')
+        self.assertEqual(len(inventory), 1)
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
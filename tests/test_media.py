@@ -20,6 +20,8 @@ import os
 import shutil
 from re import search, escape
 
+import mock
+
 import tests.common as common
 from tests.common import unittest
 from tests.common import tempfile
@@ -134,6 +136,43 @@ Done ?(?????)?
         self.assertEqual(skipped, [])
         self.assertEqual(new_file, expected)
 
+    def test_transfer_modes(self):
+        expected = {
+            None: 'copy',
+            'move': 'move',
+            'hardlink': 'hardlink',
+            'reflink': 'clone',
+        }
+        for (transfer, action) in expected.items():
+            self.media.transfer = transfer
+            self.media._video_settings()
+            self.assertEqual(self.media.cmd.action, action)
+
+    def test_transfer_bad_mode(self):
+        self.media.transfer = 'teleport'
+        regex = r'Transfer mode not recognized for Media Type: teleport'
+        self.assertRaisesRegexp(
+            SystemExit, regex, self.media._video_settings)
+
+    def test_transfer_auto(self):
+        # Same device
+        same_file = common.make_tmp_file('.avi', self.folder)
+        self.assertEqual(
+            self.media._get_auto_action(same_file), 'duplicate')
+        # Different devices
+        stats = {self.tmp_file: 1, self.folder: 2}
+        with mock.patch('os.stat', lambda item: mock.Mock(
+                st_dev=stats[item])):
+            self.assertEqual(
+                self.media._get_auto_action(self.tmp_file), 'copy')
+
+    def test_process_output_any_action(self):
+        to = os.path.join(os.path.sep, 'media', 'TV', 'Show', 'Show.S01E01.mkv')
+        for action in ['COPY', 'HARDLINK', 'CLONE', 'DUPLICATE', 'MOVE']:
+            output = '[{0}] Rename [a.mkv] to [{1}]\n'.format(action, to)
+            (new_file, _) = self.media._process_output(output, self.tmp_file)
+            self.assertEqual(new_file, [to.split('.mkv')[0]])
+
     def test_process_output_skipped(self):
         fro = os.path.join(os.path.sep, 'Downloaded', 'TV', 'Downton.Abbey.5x03.720p.HDTV.x264.mkv')
         to = os.path.join(os.path.sep, 'Media', 'TV', 'Downton Abbey', 'Season 5', 'Downton.Abbey.S05E03.mkv')
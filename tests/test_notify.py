@@ -16,10 +16,15 @@
 # included in all copies or substantial portions of the Software.
 """Initialize module"""
 
+import time
+import shutil
+
+import mock
 import responses
 
 import tests.common as common
 from tests.common import unittest
+from tests.common import tempfile
 from tests.common import MHTestSuite
 
 import mediahandler.util.notify as Notify
@@ -28,6 +33,10 @@ import mediahandler.util.notify as Notify
 class PushObjectTests(unittest.TestCase):
 
     def setUp(self):
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
         # Testing name
         self.name = "push-{0}".format(common.get_test_id())
         # Settings
@@ -52,6 +61,11 @@ class PushObjectTests(unittest.TestCase):
         # Disable push
         self.push.disable = True
 
+    def tearDown(self):
+        self.push.flush()
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
     @responses.activate
     def test_bad_po_credentials(self):
         responses.add(responses.POST,
@@ -241,8 +255,20 @@ class PushObjectTests(unittest.TestCase):
         reg2 = r'Skipped files:\n\- {0}'.format(skips)
         regex = r'{0}\n\n{1}'.format(reg1, reg2)
         self.assertRegexpMatches(result, regex)
+        # Check delivery
+        self.assertTrue(self.push.flush(5))
+        self.assertEqual(len(responses.calls), 2)
 
+    @responses.activate
     def test_failure_normal(self):
+        responses.add(responses.POST,
+                      'https://api.pushbullet.com/v2/pushes',
+                      json={'iden': 'iden', 'title': 'title', 'body': 'body'},
+                      status=200)
+        responses.add(responses.POST,
+                      'https://api.pushover.net/1/messages.json',
+                      json={'status': 1},
+                      status=200)
         # Enable push
         self.push.disable = False
         # Set up test
@@ -250,6 +276,76 @@ class PushObjectTests(unittest.TestCase):
         # Run test
         self.assertRaisesRegexp(
             SystemExit, msg, self.push.failure, msg)
+        # Check delivery
+        self.assertTrue(self.push.flush(5))
+        self.assertEqual(len(responses.calls), 2)
+
+
+class CredentialsCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patcher = mock.patch('mediahandler.__mediacache__', self.cache)
+        self.patcher.start()
+        # Settings
+        self.args = {
+            'enabled': True,
+            'notify_name': '',
+            'cache_ttl': 60,
+            'pushover': {'api_key': None, 'user_key': None},
+            'pushbullet': common.get_pushbullet_api()
+        }
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def make_push(self):
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET,
+                     'https://api.pushbullet.com/v2/users/me',
+                     json={'iden': 'iden'},
+                     status=200)
+            return Notify.MHPush(self.args)
+
+    def test_cached_validation(self):
+        self.make_push()
+        # No requests are made while validation is cached
+        with responses.RequestsMock():
+            push = Notify.MHPush(self.args)
+        self.assertTrue(hasattr(push.pushbullet, 'session'))
+        # New credentials are validated
+        self.args['pushbullet'] = common.get_pushbullet_api()
+        self.make_push()
+
+    def test_cache_expired(self):
+        push = self.make_push()
+        self.assertTrue(push._is_validated('pushbullet'))
+        with mock.patch.object(Notify, 'time', return_value=time.time() + 61):
+            self.assertFalse(push._is_validated('pushbullet'))
+
+    def test_cache_disabled(self):
+        self.args['cache_ttl'] = 0
+        self.make_push()
+        self.make_push()
+
+    @responses.activate
+    def test_revalidate_on_auth_error(self):
+        push = self.make_push()
+        responses.add(responses.POST,
+                      'https://api.pushbullet.com/v2/pushes',
+                      json={'error': {'code': 'invalid_access_token',
+                                      'message': 'Access token revoked.'}},
+                      status=401)
+        responses.add(responses.GET,
+                      'https://api.pushbullet.com/v2/users/me',
+                      json={'error': {'message': 'Access token revoked.'}},
+                      status=401)
+        regex = r'Pushbullet: Access token revoked.'
+        self.assertRaisesRegexp(
+            SystemExit, regex, push._send_pushbullet, 'msg', 'title')
+        self.assertFalse(push._is_validated('pushbullet'))
 
 
 def suite():
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import json
+import time
+import shutil
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import mock
+
+import tests.common as common
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.notify as Notify
+import mediahandler.util.outbox as Outbox
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the Pushover and Pushbullet APIs.
+    """
+
+    def do_GET(self):
+        self.reply(200, {'iden': 'iden'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests.append(self.path)
+        # Fail the first message for each service
+        if self.server.requests.count(self.path) == 1 and \
+                not self.path.endswith('validate.json'):
+            self.reply(503, None)
+        else:
+            self.reply(200, {'status': 1, 'iden': 'iden'})
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8') if body else b'unavailable'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class OutboxTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def deliver(self, service, message, title):
+        self.sent.append((service, message, title))
+        return True
+
+    def test_put_and_wait(self):
+        outbox = Outbox.MHOutbox(self.deliver, self.folder)
+        outbox.put('msg', 'title', ['pushover', 'pushbullet'])
+        self.assertTrue(outbox.wait(5))
+        self.assertListEqual(sorted(self.sent), [
+            ('pushbullet', 'msg', 'title'), ('pushover', 'msg', 'title')])
+        self.assertListEqual(os.listdir(self.folder), [])
+
+    def test_does_not_block_exit(self):
+        outbox = Outbox.MHOutbox(
+            lambda *args: None, self.folder, retries=3, backoff=60)
+        outbox.put('msg', 'title', ['pushover'])
+        self.assertTrue(outbox.thread.daemon)
+        # Gives up waiting, and leaves the message for the next outbox
+        self.assertFalse(outbox.wait(0.5))
+        self.assertEqual(len(os.listdir(self.folder)), 1)
+
+    def test_give_up(self):
+        outbox = Outbox.MHOutbox(
+            lambda *args: None, self.folder, retries=3, backoff=0)
+        outbox.put('msg', 'title', ['pushover'])
+        self.assertTrue(outbox.wait(5))
+        self.assertListEqual(os.listdir(self.folder), [])
+
+    def test_leftover_messages(self):
+        entry = {'message': 'msg', 'title': 'title',
+                 'services': ['pushover'], 'attempts': 1}
+        # Unclaimed message, message claimed by a stopped process, and
+        # message claimed by a running process
+        for name in ['a.json', 'b.json.999999999',
+                     'c.json.{0}'.format(os.getppid())]:
+            with open(os.path.join(self.folder, name), 'w') as entry_io:
+                json.dump(entry, entry_io)
+        outbox = Outbox.MHOutbox(self.deliver, self.folder)
+        self.assertTrue(outbox.wait(5))
+        self.assertEqual(len(self.sent), 2)
+        self.assertListEqual(
+            os.listdir(self.folder), ['c.json.{0}'.format(os.getppid())])
+
+    def test_stale_partial_messages(self):
+        # Partial writes by a stopped and a running process, and a file
+        # with an unknown owner
+        running = 'b.json.{0}.tmp'.format(os.getppid())
+        for name in ['a.json.999999.tmp', running, 'c.json.backup']:
+            with open(os.path.join(self.folder, name), 'w') as entry_io:
+                entry_io.write('{')
+        outbox = Outbox.MHOutbox(self.deliver, self.folder)
+        self.assertTrue(outbox.wait(5))
+        self.assertListEqual(self.sent, [])
+        self.assertListEqual(
+            sorted(os.listdir(self.folder)), [running, 'c.json.backup'])
+
+
+    def test_load_later(self):
+        outbox = Outbox.MHOutbox(self.deliver, self.folder)
+        self.assertTrue(outbox.wait(5))
+        # Message left by a worker process which stopped since
+        entry = {'message': 'msg', 'title': 'title',
+                 'services': ['pushover'], 'attempts': 0}
+        with open(os.path.join(self.folder, 'a.json.999999999'), 'w') as entry_io:
+            json.dump(entry, entry_io)
+        outbox.load()
+        self.assertTrue(outbox.wait(5))
+        self.assertListEqual(self.sent, [('pushover', 'msg', 'title')])
+
+
+class PushOutboxTests(unittest.TestCase):
+
+    def setUp(self):
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patchers = [
+            mock.patch('mediahandler.__mediacache__', self.cache),
+            mock.patch.object(Notify.MHPush, '_validate_credentials'),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def get_push(self, token):
+        return Notify.MHPush({
+            'enabled': True,
+            'notify_name': '',
+            'pushover': {'api_key': None, 'user_key': None},
+            'pushbullet': {'token': token},
+        })
+
+    def test_outbox_per_credentials(self):
+        first = self.get_push('one')._get_outbox()
+        second = self.get_push('two')._get_outbox()
+        self.assertNotEqual(first.folder, second.folder)
+        self.assertEqual(first.folder, self.get_push('one')._get_outbox().folder)
+        self.assertNotIn('one', first.folder)
+
+    def test_flush_loads_leftovers(self):
+        push = self.get_push('one')
+        outbox = push._get_outbox()
+        with mock.patch.object(outbox, 'load') as load:
+            self.assertTrue(push.flush(5))
+        load.assert_called_once_with()
+
+
+class OutboxStandInTests(unittest.TestCase):
+
+    def setUp(self):
+        # Start local API stand-in
+        self.server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        # Use a temporary cache folder
+        self.cache = tempfile.mkdtemp()
+        self.patchers = [
+            mock.patch('mediahandler.__mediacache__', self.cache),
+            mock.patch.object(Notify.MHPush, 'PUSHOVER_API', url + '/1'),
+            mock.patch.object(Notify.MHPush, 'PUSHBULLET_API', url + '/v2'),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        # Push object
+        self.push = Notify.MHPush({
+            'enabled': True,
+            'notify_name': '',
+            'pushover': common.get_pushover_api(),
+            'pushbullet': common.get_pushbullet_api()
+        })
+
+    def tearDown(self):
+        self.push.flush()
+        self.server.shutdown()
+        self.server.server_close()
+        for patcher in self.patchers:
+            patcher.stop()
+        shutil.rmtree(self.cache)
+
+    def test_send_with_retry(self):
+        self.push.outbox = Outbox.MHOutbox(
+            self.push._deliver, os.path.join(self.cache, 'outbox'),
+            backoff=0.1)
+        # Returns before delivery
+        start = time.time()
+        self.push.send_message('msg', 'title')
+        self.assertLess(time.time() - start, 0.5)
+        # Delivered after one retry for each service
+        self.assertTrue(self.push.flush(10))
+        sent = [path for path in self.server.requests
+                if not path.endswith('validate.json')]
+        self.assertListEqual(sorted(sent), [
+            '/1/messages.json', '/1/messages.json',
+            '/v2/pushes', '/v2/pushes'])
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
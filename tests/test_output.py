@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import sys
+
+from tests.common import unittest
+from tests.common import MHTestSuite
+
+import mediahandler.util.output as Output
+
+
+# Beets album patterns
+ADDED = r"(Tagging|To)\:\n\s{1,4}(.*)\nURL\:\n\s{1,4}(.*)\n"
+SKIP = r"(^|\n).*\/(.*) \(\d+ items\)\nSkipping.\n"
+
+
+class OutputParserTests(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.parser = Output.MHOutputParser(
+            [('added', ADDED, 1), ('skipped', SKIP, 1)],
+            lambda event, value: self.events.append((event, value)))
+
+    def test_events_as_parsed(self):
+        lines = [
+            '/Music/One (1 items)\n',
+            'Skipping.\n',
+            '/Music/Two (13 items)\n',
+            'Tagging:\n',
+            '    Artist - Two\n',
+            'URL:\n',
+            '    http://musicbrainz.org/release/two\n',
+        ]
+        for (i, line) in enumerate(lines):
+            self.parser.feed(line.encode('utf-8'))
+            # Skip is reported as soon as its last line is read
+            if i == 1:
+                self.assertListEqual(self.events, [('skipped', 'One')])
+        self.assertListEqual(self.events, [
+            ('skipped', 'One'), ('added', 'Artist - Two')])
+        self.assertListEqual(self.parser.results('added'), ['Artist - Two'])
+
+    def test_bounded_window(self):
+        for i in range(1000):
+            self.parser.feed('line {0}\n'.format(i))
+        self.assertLess(len(self.parser.window), self.parser.size)
+        self.assertEqual(self.parser.size, 5)
+
+    def test_one_match_per_line(self):
+        parser = Output.MHOutputParser(
+            [('added', r'\[COPY\] From \[(.*)\] to \[(.*)\]', 1)])
+        parser.feed_text('[COPY] From [a] to [b]\n[COPY] From [c] to [d]')
+        self.assertListEqual(parser.results('added'), ['b', 'd'])
+
+    def test_reset(self):
+        self.parser.feed_text('/Music/One (1 items)\nSkipping.\n')
+        self.parser.reset()
+        self.assertListEqual(self.parser.results('skipped'), [])
+
+    def test_compiled_once(self):
+        self.assertIs(Output.get_pattern(ADDED), Output.get_pattern(ADDED))
+
+    def test_iter_lines(self):
+        cmd = [sys.executable, '-c',
+               'import sys; print("out"); sys.stderr.write("err\\n")']
+        self.assertListEqual(
+            sorted(Output.iter_lines(cmd)), [b'err\n', b'out\n'])
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)
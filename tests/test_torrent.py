@@ -19,6 +19,9 @@
 import os
 import sys
 import shutil
+import threading
+
+import mock
 
 import tests.common as common
 from tests.common import unittest
@@ -54,6 +57,7 @@ class DelugeTests(unittest.TestCase):
     def test_get_good_args(self):
         expected = {
             'media': self.tmp_file,
+            'hash': 'hash',
             'name': os.path.basename(self.tmp_file),
             'no_push': False,
             'single_track': False,
@@ -93,6 +97,53 @@ class RemoveTorrentTests(unittest.TestCase):
         Torrent.remove_deluge_torrent(self.settings, 'hash')
 
 
+class DelugeClientTests(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = {
+            'host': '127.0.0.1',
+            'port': 58846,
+            'user': 'user',
+            'pass': 'pass',
+        }
+
+    def test_get_client_shared(self):
+        client = Torrent.get_client(self.settings)
+        self.assertIs(Torrent.get_client(dict(self.settings)), client)
+        other = dict(self.settings, port=58847)
+        self.assertIsNot(Torrent.get_client(other), client)
+
+    def test_remove_batches(self):
+        client = Torrent.MHDeluge(self.settings)
+        batches = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def remove_batch(torrent_hashes):
+            batches.append(torrent_hashes)
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(client, '_remove_batch', remove_batch):
+            client.remove(['a'])
+            started.wait(5)
+            # Queued while the first batch is in flight
+            client.remove(['b', 'c', 'b'])
+            client.remove(['d'])
+            release.set()
+            self.assertTrue(client.wait(5))
+        self.assertListEqual(batches, [['a'], ['b', 'c', 'd']])
+
+    def test_remove_error_reconnects(self):
+        client = Torrent.MHDeluge(self.settings)
+        with mock.patch.object(client, '_remove_batch',
+                               side_effect=ValueError('error')), \
+                mock.patch.object(client, 'disconnect') as disconnect:
+            client.remove(['a'])
+            self.assertTrue(client.wait(5))
+        self.assertTrue(disconnect.called)
+
+
 def suite():
     s = MHTestSuite()
     tests = unittest.TestLoader().loadTestsFromName(__name__)
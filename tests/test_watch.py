@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#
+# This file is a part of EM Media Handler Testing Module
+# Copyright (c) 2014-2021 Erin Morelli
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+"""Initialize module"""
+
+import os
+import time
+import mock
+import shutil
+
+import tests.common as common
+from tests.common import unittest
+from tests.common import tempfile
+from tests.common import MHTestSuite
+
+import mediahandler.util.watch as Watch
+import mediahandler.util.daemon as Daemon
+
+
+class SettleTrackerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.item = os.path.join(self.folder, 'item')
+        os.makedirs(self.item)
+        self.write('a.mkv', 'data')
+        self.tracker = Watch.MHSettleTracker(10)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, data):
+        with open(os.path.join(self.item, name), 'a') as file_io:
+            file_io.write(data)
+
+    def test_item_state(self):
+        self.assertEqual(Watch.get_item_state(self.item)[:2], (1, 4))
+        self.assertIsNone(Watch.get_item_state(self.item + '-missing'))
+
+    def test_settle_window(self):
+        self.tracker.touch(self.item, now=0)
+        # Too soon after the last event
+        self.assertListEqual(self.tracker.ready(now=5), [])
+        # First check records the item's state
+        self.assertListEqual(self.tracker.ready(now=10), [])
+        # Unchanged for the whole window
+        self.assertListEqual(self.tracker.ready(now=20), [self.item])
+        self.assertEqual(len(self.tracker), 0)
+
+    def test_still_growing(self):
+        self.tracker.touch(self.item, now=0)
+        self.assertListEqual(self.tracker.ready(now=10), [])
+        self.write('a.mkv', 'more')
+        self.assertListEqual(self.tracker.ready(now=20), [])
+        self.assertListEqual(self.tracker.ready(now=30), [self.item])
+
+    def test_removed_item(self):
+        self.tracker.touch(self.item, now=0)
+        shutil.rmtree(self.item)
+        self.assertListEqual(self.tracker.ready(now=10), [])
+        self.assertEqual(len(self.tracker), 0)
+
+
+class WatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tv = os.path.join(self.folder, 'TV')
+        os.makedirs(self.tv)
+        os.makedirs(os.path.join(self.folder, 'Other'))
+        self.queue = Daemon.MHJobQueue(os.path.join(self.folder, '.queue'))
+        self.watcher = Watch.MHWatcher(self.folder, 0, self.queue)
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.folder)
+
+    def test_get_types(self):
+        self.assertListEqual(self.watcher.get_types(), [self.tv])
+
+    def test_get_item(self):
+        item = os.path.join(self.tv, 'Show.S01E01')
+        self.assertEqual(
+            self.watcher.get_item(os.path.join(item, 'a', 'b.mkv')), item)
+        self.assertIsNone(self.watcher.get_item(self.tv))
+        self.assertIsNone(self.watcher.get_item(
+            os.path.join(self.folder, 'Other', 'file.mkv')))
+        self.assertIsNone(self.watcher.get_item(
+            os.path.join(self.tv, '.partial')))
+
+    def test_check_queues_job(self):
+        item = os.path.join(self.tv, 'Show.S01E01.mkv')
+        open(item, 'w').close()
+        self.watcher.tracker.touch(item, now=0)
+        self.assertListEqual(self.watcher.check(now=1), [])
+        self.assertListEqual(self.watcher.check(now=2), [item])
+        (_, args) = self.queue.get(0)
+        self.assertEqual(args['media'], item)
+        self.assertEqual(args['type'], 1)
+
+    def dispatch(self, event_type, src_path, dest_path=None):
+        handler = Watch._MHEventHandler(self.watcher)
+        handler.dispatch(mock.Mock(
+            event_type=event_type, src_path=src_path, dest_path=dest_path))
+
+    def test_ignores_queued_items(self):
+        item = os.path.join(self.tv, 'Show.S01E03.zip')
+        open(item, 'w').close()
+        self.watcher.tracker.touch(item, now=0)
+        self.watcher.check(now=1)
+        self.assertListEqual(self.watcher.check(now=2), [item])
+        # Changes to the item and its extracted files are ignored
+        extracted = os.path.join(self.tv, 'Show.S01E03')
+        self.dispatch('modified', item)
+        self.dispatch('created', os.path.join(extracted, 'a.mkv'))
+        self.assertEqual(len(self.watcher.tracker), 0)
+        # Files moved out of the item are ignored
+        moved = os.path.join(self.tv, 'Show')
+        self.dispatch('created', moved)
+        self.dispatch('moved', item, os.path.join(moved, 'a.zip'))
+        self.assertTrue(self.watcher.is_queued(moved))
+        os.makedirs(moved)
+        self.assertListEqual(self.watcher.check(now=10), [])
+        self.assertEqual(len(self.queue), 1)
+        # Removed items are watched again
+        self.dispatch('deleted', item)
+        self.assertFalse(self.watcher.is_queued(item))
+        self.dispatch('created', item)
+        self.assertIn(item, self.watcher.tracker.items)
+
+    @common.skipUnlessHasMod('watchdog', 'observers')
+    def test_watch_events(self):
+        self.watcher.start()
+        time.sleep(0.5)
+        item = os.path.join(self.tv, 'Show.S01E02.mkv')
+        with open(item, 'w') as item_io:
+            item_io.write('data')
+        for _ in range(50):
+            if len(self.queue):
+                break
+            time.sleep(0.1)
+        (_, args) = self.queue.get(0)
+        self.assertEqual(args['media'], item)
+
+
+def suite():
+    s = MHTestSuite()
+    tests = unittest.TestLoader().loadTestsFromName(__name__)
+    s.addTest(tests)
+    return s
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite', verbosity=2)